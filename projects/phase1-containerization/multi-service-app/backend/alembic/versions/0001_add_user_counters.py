@@ -0,0 +1,97 @@
+"""add user_counters
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16 00:00:00
+
+建表后在同一事务中按现有任务和通知回填计数器（INSERT ... SELECT ... GROUP BY），
+升级后统计接口立即读到正确的值。滚动发布期间旧版本实例的写入不产生增量，
+由新版本启动时的对账任务修复。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (计数项, 条件)，与 counter_service 中的计数表达式一致；
+# 枚举列按小写文本比较，兼容按名称（PENDING）或按值（pending）存储的枚举
+TASK_COUNTERS = [
+    ("total_tasks", "true"),
+    ("pending_tasks", "lower(status::text) = 'pending'"),
+    ("in_progress_tasks", "lower(status::text) = 'in_progress'"),
+    ("completed_tasks", "lower(status::text) = 'completed'"),
+    ("cancelled_tasks", "lower(status::text) = 'cancelled'"),
+    ("archived_tasks", "is_archived"),
+    ("starred_tasks", "is_starred"),
+] + [
+    (f"{priority}_priority_tasks", f"lower(priority::text) = '{priority}'")
+    for priority in ("low", "medium", "high", "urgent")
+]
+
+NOTIFICATION_COUNTERS = [
+    ("total_notifications", "true"),
+    ("unread_notifications", "NOT is_read"),
+    ("archived_notifications", "is_archived"),
+    ("task_notifications", "lower(notification_type::text) IN "
+     "('task_created', 'task_updated', 'task_completed', 'task_overdue', 'task_due_soon')"),
+    ("system_notifications", "lower(notification_type::text) IN ('system_maintenance', 'system_update')"),
+    ("security_notifications", "lower(notification_type::text) = 'security_alert'"),
+] + [
+    (f"{status}_notifications", f"lower(status::text) = '{status}'")
+    for status in ("pending", "sent", "failed")
+] + [
+    (f"{priority}_priority", f"lower(priority::text) = '{priority}'")
+    for priority in ("low", "medium", "high", "urgent")
+]
+
+
+def _backfill_sql(table: str, owner_column: str, counters) -> str:
+    """按用户分组计算各计数项，再展开为 (user_id, counter, value) 行写入"""
+    columns = ",\n        ".join(
+        f"COUNT(*) FILTER (WHERE {condition}) AS {name}" for name, condition in counters
+    )
+    values = ", ".join(f"('{name}', grouped.{name})" for name, _ in counters)
+    return f"""
+    INSERT INTO user_counters (user_id, counter, value)
+    SELECT grouped.owner_id, item.counter, item.value
+    FROM (
+        SELECT {owner_column} AS owner_id,
+        {columns}
+        FROM {table}
+        WHERE is_deleted = false
+        GROUP BY {owner_column}
+    ) AS grouped
+    CROSS JOIN LATERAL (VALUES {values}) AS item(counter, value)
+    WHERE item.value > 0
+    """
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_counters",
+        sa.Column("user_id", sa.Integer(), nullable=False, comment="用户ID"),
+        sa.Column("counter", sa.String(length=50), nullable=False, comment="计数项名称"),
+        sa.Column("value", sa.BigInteger(), nullable=False, server_default="0", comment="计数值"),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+            comment="更新时间",
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "counter"),
+    )
+    op.execute(_backfill_sql("tasks", "owner_id", TASK_COUNTERS))
+    op.execute(_backfill_sql("notifications", "user_id", NOTIFICATION_COUNTERS))
+
+
+def downgrade() -> None:
+    op.drop_table("user_counters")
@@ -0,0 +1,51 @@
+"""add search_vector columns with GIN indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16 00:00:00
+
+新增列按与 app.core.search 相同的字段权重回填，之后由应用在写入时维护。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("tasks", sa.Column("search_vector", postgresql.TSVECTOR(), nullable=True, comment="全文搜索向量"))
+    op.add_column("notifications", sa.Column("search_vector", postgresql.TSVECTOR(), nullable=True, comment="全文搜索向量"))
+
+    op.execute(
+        """
+        UPDATE tasks SET search_vector =
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(description, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(notes, '')), 'C')
+        """
+    )
+    op.execute(
+        """
+        UPDATE notifications SET search_vector =
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(message, '')), 'B')
+        """
+    )
+
+    op.create_index("idx_tasks_search_vector", "tasks", ["search_vector"], postgresql_using="gin")
+    op.create_index("idx_notifications_search_vector", "notifications", ["search_vector"], postgresql_using="gin")
+
+
+def downgrade() -> None:
+    op.drop_index("idx_notifications_search_vector", table_name="notifications")
+    op.drop_index("idx_tasks_search_vector", table_name="tasks")
+    op.drop_column("notifications", "search_vector")
+    op.drop_column("tasks", "search_vector")
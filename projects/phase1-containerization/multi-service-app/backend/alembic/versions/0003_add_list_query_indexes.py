@@ -0,0 +1,58 @@
+"""add composite partial indexes for task and notification lists
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16 00:00:00
+
+索引列顺序与服务层的列表查询一致：先按所属用户过滤（只包含未删除的记录），
+再按 keyset 分页的排序 (排序列, id) 扫描，查询无需额外排序。索引为普通升序：
+升序查询（ASC NULLS LAST）正向扫描，降序查询（DESC NULLS FIRST）反向扫描。
+使用 CREATE INDEX CONCURRENTLY 创建，不阻塞线上写入。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (索引名, 表名, 索引列, 部分索引条件)
+INDEXES = [
+    ("idx_tasks_owner_created", "tasks",
+     ["owner_id", "created_at", "id"], "is_deleted = false"),
+    ("idx_tasks_owner_updated", "tasks",
+     ["owner_id", "updated_at", "id"], "is_deleted = false"),
+    ("idx_tasks_owner_due_date_active", "tasks",
+     ["owner_id", "due_date", "id"], "is_deleted = false"),
+    ("idx_tasks_owner_priority", "tasks",
+     ["owner_id", "priority", "id"], "is_deleted = false"),
+    ("idx_notifications_user_created", "notifications",
+     ["user_id", "created_at", "id"], "is_deleted = false"),
+    ("idx_notifications_user_unread", "notifications",
+     ["user_id", "created_at", "id"], "is_deleted = false AND is_read = false"),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name,
+                table,
+                [sa.text(column) for column in columns],
+                postgresql_where=sa.text(where),
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,77 @@
+"""replace search_vector columns with pg_trgm indexes
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16 00:00:00
+
+'simple' 配置的 tsvector 把连续的中文当作一个词，搜索"报告"无法命中"完成项目报告"。
+搜索改回 ILIKE 子串匹配，由 gin_trgm_ops 三元组索引加速，不再需要 search_vector 列。
+索引使用 CREATE INDEX CONCURRENTLY 创建，不阻塞线上写入。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (索引名, 表名, 搜索字段)，与 app.core.search 中注册的字段一致
+INDEXES = [
+    ("idx_tasks_search_trgm", "tasks", ["title", "description", "notes"]),
+    ("idx_notifications_search_trgm", "notifications", ["title", "message"]),
+]
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    op.drop_index("idx_notifications_search_vector", table_name="notifications", if_exists=True)
+    op.drop_index("idx_tasks_search_vector", table_name="tasks", if_exists=True)
+    op.drop_column("notifications", "search_vector")
+    op.drop_column("tasks", "search_vector")
+
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops" for column in columns},
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+    # 恢复 0002 的 search_vector 列（按相同的字段权重回填）
+    op.add_column("tasks", sa.Column("search_vector", postgresql.TSVECTOR(), nullable=True, comment="全文搜索向量"))
+    op.add_column("notifications", sa.Column("search_vector", postgresql.TSVECTOR(), nullable=True, comment="全文搜索向量"))
+    op.execute(
+        """
+        UPDATE tasks SET search_vector =
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(description, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(notes, '')), 'C')
+        """
+    )
+    op.execute(
+        """
+        UPDATE notifications SET search_vector =
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(message, '')), 'B')
+        """
+    )
+    op.create_index("idx_tasks_search_vector", "tasks", ["search_vector"], postgresql_using="gin")
+    op.create_index("idx_notifications_search_vector", "notifications", ["search_vector"], postgresql_using="gin")
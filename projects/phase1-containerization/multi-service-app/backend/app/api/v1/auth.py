@@ -9,11 +9,11 @@ from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
-from app.core.dependencies import get_current_user, get_client_ip, get_user_agent, rate_limit_auth
+from app.core.dependencies import get_current_user, get_current_superuser, get_client_ip, get_user_agent, rate_limit_auth
 from app.services.auth_service import auth_service
 from app.schemas.user import (
     UserCreate, UserLogin, TokenResponse, UserResponse,
-    PasswordChange, PasswordReset, PasswordResetConfirm
+    PasswordChange, PasswordReset, PasswordResetConfirm, SessionRevoke
 )
 from app.utils.logger import setup_logger
 
@@ -148,6 +148,28 @@ async def logout_user(
         )
 
 
+@router.post("/sessions/revoke", tags=["认证"])
+async def revoke_sessions(
+    revoke_data: SessionRevoke,
+    current_user = Depends(get_current_superuser),
+    db: AsyncSession = Depends(get_db)
+):
+    """批量禁用指定用户的所有会话（需要超级用户权限）"""
+    try:
+        revoked = await auth_service.revoke_sessions(revoke_data.user_ids, db)
+        logger.info(f"管理员 {current_user.username} 禁用了 {revoked} 个会话")
+        return {"revoked_count": revoked, "message": f"成功禁用 {revoked} 个会话"}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"批量禁用会话失败: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="批量禁用会话失败"
+        )
+
+
 @router.post("/change-password", tags=["认证"])
 async def change_password(
     password_data: PasswordChange,
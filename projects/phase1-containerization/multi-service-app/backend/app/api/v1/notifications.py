@@ -36,8 +36,10 @@ async def get_notifications(
     search: Optional[str] = Query(None, description="搜索关键词"),
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(20, ge=1, le=100, description="每页数量"),
-    sort_by: Optional[str] = Query("created_at", description="排序字段"),
+    sort_by: Optional[str] = Query("created_at", description="排序字段（搜索时可用 relevance 按相关度排序）"),
     sort_order: Optional[str] = Query("desc", pattern="^(asc|desc)$", description="排序方向"),
+    cursor: Optional[str] = Query(None, description="分页游标，取自上一页的 next_cursor"),
+    include_total: bool = Query(True, description="是否返回精确总数（关闭可省去COUNT查询）"),
     current_user = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
     _: bool = Depends(rate_limit_standard)
@@ -56,7 +58,9 @@ async def get_notifications(
             page=page,
             page_size=page_size,
             sort_by=sort_by,
-            sort_order=sort_order
+            sort_order=sort_order,
+            cursor=cursor,
+            include_total=include_total
         )
         
         result = await notification_service.get_user_notifications(current_user, params, db)
@@ -69,6 +73,8 @@ async def get_notifications(
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取通知列表失败: {e}")
         raise HTTPException(
@@ -212,7 +218,7 @@ async def send_notification(
     try:
         result = await notification_service.send_notification(send_request, current_user, db)
         
-        logger.info(f"发送通知: {current_user.username}, 成功数量: {result['sent_count']}")
+        logger.info(f"发送通知: {current_user.username}, 受理数量: {result['accepted_count']}, 任务: {result['job_id']}")
         
         return result
         
@@ -226,6 +232,15 @@ async def send_notification(
         )
 
 
+@router.get("/send/jobs/{job_id}", response_model=Dict[str, Any], tags=["通知系统"])
+async def get_send_job(
+    job_id: str,
+    current_user = Depends(get_current_user)
+):
+    """查询批量发送任务的投递进度"""
+    return await notification_service.get_send_job(job_id, current_user)
+
+
 @router.get("/stats/summary", response_model=NotificationStats, tags=["通知系统"])
 async def get_notification_stats(
     current_user = Depends(get_current_user),
@@ -35,8 +35,10 @@ async def get_tasks(
     search: Optional[str] = Query(None, description="搜索关键词"),
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(20, ge=1, le=100, description="每页数量"),
-    sort_by: Optional[str] = Query("created_at", description="排序字段"),
+    sort_by: Optional[str] = Query("created_at", description="排序字段（搜索时可用 relevance 按相关度排序）"),
     sort_order: Optional[str] = Query("desc", pattern="^(asc|desc)$", description="排序方向"),
+    cursor: Optional[str] = Query(None, description="分页游标，取自上一页的 next_cursor"),
+    include_total: bool = Query(True, description="是否返回精确总数（关闭可省去COUNT查询）"),
     current_user = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
     _: bool = Depends(rate_limit_standard)
@@ -55,19 +57,19 @@ async def get_tasks(
             page=page,
             page_size=page_size,
             sort_by=sort_by,
-            sort_order=sort_order
+            sort_order=sort_order,
+            cursor=cursor,
+            include_total=include_total
         )
         
         result = await task_service.get_user_tasks(current_user, params, db)
         
-        # 转换任务为字典格式
-        tasks_data = [task.to_dict(include_owner=False) for task in result["tasks"]]
-        result["tasks"] = tasks_data
-        
         logger.info(f"获取任务列表: {current_user.username}, 数量: {result['total']}")
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取任务列表失败: {e}")
         raise HTTPException(
@@ -7,9 +7,13 @@ from datetime import datetime
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, EmailStr
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.database import get_db
 from app.core.dependencies import get_current_user
 from app.models.user import User
+from app.services.auth_service import auth_service
+from app.services.counter_service import counter_service
 from app.utils.logger import setup_logger
 
 # 日志
@@ -42,16 +46,15 @@ class UserStats(BaseModel):
     unread_notifications: int
 
 
-# 模拟用户统计数据
-def get_user_stats(username: str) -> UserStats:
-    """获取用户统计信息"""
-    # 这里应该从数据库查询真实数据
+async def get_user_stats(user: User, db: AsyncSession) -> UserStats:
+    """获取用户统计信息（读取增量维护的计数器）"""
+    counters = await counter_service.get_counters(user.id, db)
     return UserStats(
-        total_tasks=10,
-        completed_tasks=5,
-        pending_tasks=5,
-        total_notifications=3,
-        unread_notifications=1
+        total_tasks=counters.get("total_tasks", 0),
+        completed_tasks=counters.get("completed_tasks", 0),
+        pending_tasks=counters.get("pending_tasks", 0),
+        total_notifications=counters.get("total_notifications", 0),
+        unread_notifications=counters.get("unread_notifications", 0)
     )
 
 
@@ -105,6 +108,9 @@ async def update_user_profile(
         if user_update.full_name:
             user["full_name"] = user_update.full_name
         
+        # 使已缓存的认证信息失效
+        await auth_service.invalidate_principal(current_user.id)
+        
         logger.info(f"更新用户资料: {current_user.username}")
         
         return UserProfile(
@@ -127,10 +133,13 @@ async def update_user_profile(
 
 
 @router.get("/stats", response_model=UserStats, tags=["用户管理"])
-async def get_user_statistics(current_user: User = Depends(get_current_user)):
+async def get_user_statistics(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
     """获取用户统计信息"""
     try:
-        stats = get_user_stats(current_user.username)
+        stats = await get_user_stats(current_user, db)
         
         logger.info(f"获取用户统计信息: {current_user.username}")
         
@@ -155,6 +164,7 @@ async def delete_user_account(current_user: User = Depends(get_current_user)):
         
         if current_user.username in fake_users_db:
             del fake_users_db[current_user.username]
+            await auth_service.invalidate_principal(current_user.id)
             logger.info(f"删除用户账户: {current_user.username}")
             return {"message": "账户已成功删除"}
         else:
@@ -0,0 +1,154 @@
+"""
+缓冲写入器
+将日志类数据（活动记录、登录日志等）放入异步队列，由后台任务按批量批次写入数据库，
+避免在请求路径上为每条记录单独提交事务
+
+- 批次按数量（batch_size）或时间（flush_interval）触发写入，先到者为准
+- 队列有上限，写满时调用方等待（背压），不会无限占用内存
+- 未启动（同步模式，用于测试或脚本）时直接写入调用方的会话
+- 停止时写完队列中的剩余数据
+"""
+
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Type
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.metrics import metrics
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 停止信号（排在队列末尾，保证之前的数据都被写入）
+_STOP = object()
+
+
+class BufferedWriter:
+    """按批次写入模型行的后台写入器"""
+
+    def __init__(
+        self,
+        name: str,
+        model: Type,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_queue_size: int = 10000
+    ):
+        self.name = name
+        self.model = model
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._session_factory: Optional[Callable[[], AsyncSession]] = None
+        self._stopping = False
+
+        metrics.register_gauge("buffered_writer_queue_depth", self.queue_depth, writer=name)
+
+    @property
+    def running(self) -> bool:
+        """是否处于缓冲模式"""
+        return self._task is not None and not self._task.done() and not self._stopping
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self, session_factory: Callable[[], AsyncSession]) -> None:
+        """启动后台写入任务"""
+        if self.running:
+            return
+        self._session_factory = session_factory
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"缓冲写入器 {self.name} 已启动")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """停止写入器并写完剩余数据"""
+        if self._task is None:
+            return
+        self._stopping = True
+        try:
+            await self._queue.put(_STOP)
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"缓冲写入器 {self.name} 停止超时，丢弃 {self.queue_depth()} 条记录")
+            self._task.cancel()
+        finally:
+            self._task = None
+        logger.info(f"缓冲写入器 {self.name} 已停止")
+
+    async def write(self, row: Dict[str, Any], db: Optional[AsyncSession] = None) -> None:
+        """写入一行
+
+        缓冲模式下放入队列（队列满时等待）；同步模式下立即写入 db 并提交。
+        """
+        if self.running:
+            if self._queue.full():
+                metrics.inc("buffered_writer_backpressure_total", writer=self.name)
+            await self._queue.put(row)
+            return
+
+        if db is None:
+            logger.warning(f"缓冲写入器 {self.name} 未启动且没有可用会话，丢弃记录")
+            metrics.inc("buffered_writer_rows_total", writer=self.name, outcome="dropped")
+            return
+
+        await db.execute(insert(self.model), [row])
+        await db.commit()
+        metrics.inc("buffered_writer_rows_total", writer=self.name, outcome="written")
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+
+            batch = [item]
+            stop = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        """批量写入一个批次，失败时逐行重试并跳过无法写入的行"""
+        try:
+            async with self._session_factory() as session:
+                try:
+                    await session.execute(insert(self.model), batch)
+                    await session.commit()
+                    metrics.inc("buffered_writer_rows_total", len(batch), writer=self.name, outcome="written")
+                    return
+                except Exception as e:
+                    await session.rollback()
+                    logger.warning(f"缓冲写入器 {self.name} 批量写入失败，逐行重试: {e}")
+
+                for row in batch:
+                    try:
+                        await session.execute(insert(self.model), [row])
+                        await session.commit()
+                        metrics.inc("buffered_writer_rows_total", writer=self.name, outcome="written")
+                    except Exception as e:
+                        await session.rollback()
+                        logger.error(f"缓冲写入器 {self.name} 丢弃记录 {row}: {e}")
+                        metrics.inc("buffered_writer_rows_total", writer=self.name, outcome="failed")
+        except Exception as e:
+            logger.error(f"缓冲写入器 {self.name} 写入失败，丢弃 {len(batch)} 条记录: {e}")
+            metrics.inc("buffered_writer_rows_total", len(batch), writer=self.name, outcome="failed")
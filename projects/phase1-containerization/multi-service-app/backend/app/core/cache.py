@@ -1,20 +1,220 @@
 """
 Redis缓存管理
 提供缓存和会话存储功能
+
+缓存分为两层：进程内LRU本地缓存 + Redis共享缓存。
+本地层只缓存 CACHE_LOCAL_PREFIXES 中声明的热点键，写入/删除时通过
+Redis pub/sub 广播失效消息，各副本收到后清除本地副本。
 """
 
-from typing import Optional, Any, Union
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Optional, Any, Union, Callable, Awaitable, Dict, List, Tuple
 import json
+import sys
+import math
+import time
+import uuid
+import random
 import asyncio
+import inspect
+import functools
 from datetime import timedelta
 import redis.asyncio as redis
 
+from app.core.codec import value_codec, CodecError
 from app.core.config import get_settings
+from app.core.metrics import metrics
 from app.utils.logger import setup_logger
 
 settings = get_settings()
 logger = setup_logger(__name__)
 
+# 仅当锁令牌匹配时才删除锁，避免误删其他持有者的锁
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# GCRA（通用信元速率算法）令牌桶：一次往返内原子地完成检查和更新
+# KEYS[1]: 限流键  ARGV[1]: 两次请求的理论间隔（毫秒）  ARGV[2]: 突发容量
+# 返回 {是否允许, 剩余次数, 需等待的毫秒数}
+_GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval
+local allow_at = new_tat - interval * burst
+local diff = now - allow_at
+if diff < 0 then
+    return {0, 0, allow_at - now}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return {1, math.floor(diff / interval), 0}
+"""
+
+
+class LocalCache:
+    """进程内LRU缓存（同时限制条目数、内存占用和存活时间）"""
+
+    # 每个条目的估算固定开销（字节）
+    ENTRY_OVERHEAD = 96
+
+    def __init__(self, max_items: int, max_bytes: int, default_ttl: int, tier: str = "local"):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        # 指标中的缓存层名称
+        self.tier = tier
+        # key -> (value, expires_at, size)
+        self._data: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+
+    @staticmethod
+    def _estimate_size(key: str, value: Any) -> int:
+        """估算条目占用的内存"""
+        return sys.getsizeof(key) + sys.getsizeof(value) + LocalCache.ENTRY_OVERHEAD
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """获取缓存值，返回 (是否命中, 值)"""
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            metrics.inc("cache_evictions_total", tier=self.tier, reason="expired")
+            return False, None
+
+        self._data.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """设置缓存值，超出容量时按LRU顺序淘汰"""
+        size = self._estimate_size(key, value)
+        if size > self.max_bytes:
+            # 单个值超过内存上限，不进入本地层
+            return
+
+        if key in self._data:
+            self._remove(key)
+
+        ttl = self.default_ttl if ttl is None else min(ttl, self.default_ttl)
+        self._data[key] = (value, time.monotonic() + ttl, size)
+        self._bytes += size
+
+        while len(self._data) > self.max_items or self._bytes > self.max_bytes:
+            oldest_key = next(iter(self._data))
+            self._remove(oldest_key)
+            metrics.inc("cache_evictions_total", tier=self.tier, reason="capacity")
+
+    def delete(self, key: str) -> bool:
+        """删除缓存值"""
+        if key in self._data:
+            self._remove(key)
+            return True
+        return False
+
+    def clear(self) -> None:
+        """清空本地缓存"""
+        self._data.clear()
+        self._bytes = 0
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def size_bytes(self) -> int:
+        """当前估算内存占用"""
+        return self._bytes
+
+
+class CachePipeline:
+    """缓存命令管道
+    
+    在内存中排队命令，execute 时通过一次Redis往返发送。
+    管道中的读命令直接访问Redis，不经过本地缓存层。
+    """
+    
+    def __init__(self, manager: "CacheManager"):
+        self._manager = manager
+        self.commands: List[Tuple[str, tuple, dict]] = []
+        self.written_keys: List[str] = []
+        self.results: List[Any] = []
+    
+    def get(self, key: str) -> "CachePipeline":
+        self.commands.append(("get", (key,), {}))
+        return self
+    
+    def set(
+        self,
+        key: str,
+        value: Union[str, int, float, dict, list],
+        expire: Optional[int] = None
+    ) -> "CachePipeline":
+        if expire is None:
+            expire = getattr(settings, 'REDIS_TTL', 3600)
+        self.commands.append(("set", (key, CacheManager._serialize(value)), {"ex": expire}))
+        self.written_keys.append(key)
+        return self
+    
+    def delete(self, *keys: str) -> "CachePipeline":
+        if keys:
+            self.commands.append(("delete", keys, {}))
+            self.written_keys.extend(keys)
+        return self
+    
+    def incr(self, key: str, amount: int = 1) -> "CachePipeline":
+        self.commands.append(("incrby", (key, amount), {}))
+        self.written_keys.append(key)
+        return self
+    
+    def expire(self, key: str, seconds: int) -> "CachePipeline":
+        self.commands.append(("expire", (key, seconds), {}))
+        return self
+    
+    def sadd(self, key: str, *members: str) -> "CachePipeline":
+        if members:
+            self.commands.append(("sadd", (key, *members), {}))
+            self.written_keys.append(key)
+        return self
+    
+    def zadd(self, key: str, mapping: Dict[str, float]) -> "CachePipeline":
+        self.commands.append(("zadd", (key, mapping), {}))
+        self.written_keys.append(key)
+        return self
+    
+    def zrem(self, key: str, *members: str) -> "CachePipeline":
+        if members:
+            self.commands.append(("zrem", (key, *members), {}))
+            self.written_keys.append(key)
+        return self
+    
+    def zremrangebyscore(self, key: str, min_score: float, max_score: float) -> "CachePipeline":
+        self.commands.append(("zremrangebyscore", (key, min_score, max_score), {}))
+        self.written_keys.append(key)
+        return self
+    
+    async def execute(self) -> List[Any]:
+        """发送排队的命令并返回结果"""
+        self.results = await self._manager._execute_pipeline(self)
+        self.commands = []
+        self.written_keys = []
+        return self.results
+
 
 class CacheManager:
     """Redis缓存管理器"""
@@ -22,6 +222,33 @@ class CacheManager:
     def __init__(self):
         self._redis: Optional[redis.Redis] = None
         self._connected = False
+        
+        # 本地缓存层
+        self._local: Optional[LocalCache] = None
+        if settings.CACHE_LOCAL_ENABLED:
+            self._local = LocalCache(
+                max_items=settings.CACHE_LOCAL_MAX_ITEMS,
+                max_bytes=settings.CACHE_LOCAL_MAX_BYTES,
+                default_ttl=settings.CACHE_LOCAL_TTL
+            )
+        self._local_prefixes = tuple(settings.cache_local_prefixes_list)
+        
+        # pub/sub 订阅（频道 -> 处理函数）
+        self._instance_id = uuid.uuid4().hex
+        self._subscriptions: Dict[str, Callable[[str], Any]] = {
+            settings.CACHE_INVALIDATION_CHANNEL: self._handle_invalidation
+        }
+        self._pubsub = None
+        self._listener_task: Optional[asyncio.Task] = None
+        # pub/sub 断线重连后调用（补上断线期间错过的广播）
+        self._reconnect_hooks: List[Callable[[], Awaitable[Any]]] = []
+        
+        # 已注册的Lua脚本（通过EVALSHA执行）
+        self._gcra_script = None
+        
+        if self._local is not None:
+            metrics.register_gauge("cache_local_items", lambda: len(self._local))
+            metrics.register_gauge("cache_local_bytes", lambda: self._local.size_bytes)
     
     async def connect(self):
         """连接Redis"""
@@ -36,8 +263,8 @@ class CacheManager:
             # 创建Redis连接
             self._redis = redis.from_url(
                 redis_url,
-                encoding="utf-8",
-                decode_responses=True,
+                # 值以原始字节读取，由 value_codec 负责解码
+                decode_responses=False,
                 socket_connect_timeout=5,
                 socket_timeout=5,
                 retry_on_timeout=True,
@@ -50,6 +277,9 @@ class CacheManager:
             self._connected = True
             logger.info(f"✅ Redis连接成功: {redis_host}")
             
+            # 启动pub/sub监听（用于本地缓存失效广播等）
+            self._listener_task = asyncio.create_task(self._listen())
+            
         except Exception as e:
             logger.error(f"❌ Redis连接失败: {e}")
             self._connected = False
@@ -58,22 +288,66 @@ class CacheManager:
     
     async def disconnect(self):
         """断开Redis连接"""
+        if self._listener_task:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+        
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+            self._pubsub = None
+        
+        if self._local is not None:
+            self._local.clear()
+        
+        self._gcra_script = None
+        
         if self._redis:
-            await self._redis.close()
+            await self._redis.aclose()
             self._connected = False
             logger.info("Redis连接已关闭")
     
-    async def get(self, key: str) -> Optional[str]:
-        """获取缓存值"""
+    def _is_local_key(self, key: str) -> bool:
+        """判断键是否允许进入本地缓存层"""
+        return self._local is not None and key.startswith(self._local_prefixes)
+    
+    async def get(self, key: str) -> Optional[Any]:
+        """获取缓存值（先查本地层，再查Redis）
+        
+        普通字符串值返回 str，结构化值返回解码后的对象。
+        """
         if not self._connected or not self._redis:
             logger.warning("Redis未连接，无法获取缓存")
             return None
         
+        use_local = self._is_local_key(key)
+        if use_local:
+            found, value = self._local.get(key)
+            if found:
+                metrics.inc("cache_hits_total", tier="local")
+                return self._decode(key, value)
+            metrics.inc("cache_misses_total", tier="local")
+        
         try:
-            return await self._redis.get(key)
+            value = await self._redis.get(key)
         except Exception as e:
             logger.error(f"Redis GET失败: {e}")
             return None
+        
+        if value is None:
+            metrics.inc("cache_misses_total", tier="redis")
+        else:
+            metrics.inc("cache_hits_total", tier="redis")
+            if use_local:
+                self._local.set(key, value)
+        
+        return self._decode(key, value)
     
     async def set(
         self, 
@@ -87,15 +361,15 @@ class CacheManager:
             return False
         
         try:
-            # 如果值是字典或列表，转换为JSON
-            if isinstance(value, (dict, list)):
-                value = json.dumps(value, ensure_ascii=False)
+            # 如果值是字典或列表，使用配置的编码器序列化
+            value = self._serialize(value)
             
             # 设置过期时间
             if expire is None:
                 expire = getattr(settings, 'REDIS_TTL', 3600)
             
             result = await self._redis.set(key, value, ex=expire)
+            await self._invalidate_local([key])
             return bool(result)
             
         except Exception as e:
@@ -110,11 +384,147 @@ class CacheManager:
         
         try:
             result = await self._redis.delete(key)
+            await self._invalidate_local([key])
             return bool(result)
         except Exception as e:
             logger.error(f"Redis DELETE失败: {e}")
             return False
     
+    async def get_many(self, keys: List[str]) -> Dict[str, Optional[Any]]:
+        """批量获取缓存值（本地层未命中的键合并为一次MGET）"""
+        result: Dict[str, Optional[Any]] = {key: None for key in keys}
+        if not keys:
+            return result
+        
+        if not self._connected or not self._redis:
+            logger.warning("Redis未连接，无法获取缓存")
+            return result
+        
+        missing: List[str] = []
+        for key in dict.fromkeys(keys):
+            if self._is_local_key(key):
+                found, value = self._local.get(key)
+                if found:
+                    metrics.inc("cache_hits_total", tier="local")
+                    result[key] = self._decode(key, value)
+                    continue
+                metrics.inc("cache_misses_total", tier="local")
+            missing.append(key)
+        
+        if not missing:
+            return result
+        
+        try:
+            values = await self._redis.mget(missing)
+        except Exception as e:
+            logger.error(f"Redis MGET失败: {e}")
+            return result
+        
+        for key, value in zip(missing, values):
+            if value is None:
+                metrics.inc("cache_misses_total", tier="redis")
+                continue
+            metrics.inc("cache_hits_total", tier="redis")
+            result[key] = self._decode(key, value)
+            if self._is_local_key(key):
+                self._local.set(key, value)
+        
+        return result
+    
+    async def set_many(
+        self,
+        mapping: Dict[str, Union[str, int, float, dict, list]],
+        expire: Optional[int] = None
+    ) -> bool:
+        """批量设置缓存值（一次往返）"""
+        if not mapping:
+            return True
+        
+        async with self.pipeline() as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, expire=expire)
+        
+        return bool(pipe.results) and all(pipe.results)
+    
+    async def delete_many(self, keys: List[str]) -> int:
+        """批量删除缓存值（单条DEL命令），返回删除的键数量"""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return 0
+        
+        if not self._connected or not self._redis:
+            logger.warning("Redis未连接，无法删除缓存")
+            return 0
+        
+        try:
+            result = await self._redis.delete(*keys)
+            await self._invalidate_local(keys)
+            return int(result)
+        except Exception as e:
+            logger.error(f"Redis DELETE失败: {e}")
+            return 0
+    
+    @asynccontextmanager
+    async def pipeline(self):
+        """命令管道上下文：块内排队的命令在退出时一次性发送
+        
+        用法:
+            async with cache_manager.pipeline() as pipe:
+                pipe.set("a", 1)
+                pipe.delete("b")
+            pipe.results  # 各命令的返回值
+        """
+        pipe = CachePipeline(self)
+        yield pipe
+        await pipe.execute()
+    
+    async def _execute_pipeline(self, pipe: "CachePipeline") -> List[Any]:
+        """执行管道中的命令"""
+        if not pipe.commands:
+            return []
+        
+        if not self._connected or not self._redis:
+            logger.warning("Redis未连接，无法执行缓存管道")
+            return [None] * len(pipe.commands)
+        
+        try:
+            async with self._redis.pipeline(transaction=False) as redis_pipe:
+                for command, args, kwargs in pipe.commands:
+                    getattr(redis_pipe, command)(*args, **kwargs)
+                results = await redis_pipe.execute(raise_on_error=False)
+        except Exception as e:
+            logger.error(f"Redis管道执行失败: {e}")
+            return [None] * len(pipe.commands)
+        
+        await self._invalidate_local(pipe.written_keys)
+        
+        decoded = []
+        for (command, args, _), r in zip(pipe.commands, results):
+            if isinstance(r, Exception):
+                r = None
+            elif command == "get" and r is not None:
+                r = self._decode(args[0], r)
+            decoded.append(r)
+        return decoded
+    
+    @staticmethod
+    def _serialize(value: Union[str, int, float, dict, list]) -> Union[str, int, float, bytes]:
+        """序列化缓存值：字典和列表使用 value_codec 编码（带版本标记）"""
+        if isinstance(value, (dict, list)):
+            return value_codec.encode(value)
+        return value
+    
+    @staticmethod
+    def _decode(key: str, raw: Optional[bytes]) -> Optional[Any]:
+        """解码Redis原始值，无法解码时视为未命中"""
+        if raw is None:
+            return None
+        try:
+            return value_codec.decode(raw)
+        except (CodecError, UnicodeDecodeError) as e:
+            logger.error(f"缓存值解码失败 {key}: {e}")
+            return None
+    
     async def exists(self, key: str) -> bool:
         """检查键是否存在"""
         if not self._connected or not self._redis:
@@ -139,15 +549,96 @@ class CacheManager:
             logger.error(f"Redis EXPIRE失败: {e}")
             return False
     
+    async def smembers(self, key: str) -> List[str]:
+        """读取集合的全部成员"""
+        if not self._connected or not self._redis:
+            return []
+        
+        try:
+            members = await self._redis.smembers(key)
+            return [m.decode("utf-8") if isinstance(m, bytes) else m for m in members]
+        except Exception as e:
+            logger.error(f"Redis SMEMBERS失败: {e}")
+            return []
+    
+    async def spop(self, key: str, count: int) -> List[str]:
+        """从集合中随机弹出最多count个成员"""
+        if not self._connected or not self._redis:
+            return []
+        
+        try:
+            members = await self._redis.spop(key, count)
+            return [m.decode("utf-8") if isinstance(m, bytes) else m for m in members or []]
+        except Exception as e:
+            logger.error(f"Redis SPOP失败: {e}")
+            return []
+    
+    async def zrangebyscore(self, key: str, min_score: float, max_score: float) -> Optional[List[str]]:
+        """读取有序集合中分值在范围内的成员，Redis不可用时返回None"""
+        if not self._connected or not self._redis:
+            return None
+        
+        try:
+            members = await self._redis.zrangebyscore(key, min_score, max_score)
+            return [m.decode("utf-8") if isinstance(m, bytes) else m for m in members]
+        except Exception as e:
+            logger.error(f"Redis ZRANGEBYSCORE失败: {e}")
+            return None
+    
+    async def acquire_lock(self, name: str, expire: int) -> Optional[str]:
+        """获取分布式锁（SET NX），成功返回锁令牌"""
+        if not self._connected or not self._redis:
+            return None
+        
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self._redis.set(f"lock:{name}", token, nx=True, ex=expire)
+            return token if acquired else None
+        except Exception as e:
+            logger.error(f"Redis获取锁失败: {e}")
+            return None
+    
+    async def release_lock(self, name: str, token: str) -> bool:
+        """释放分布式锁（仅当令牌匹配时删除）"""
+        if not self._connected or not self._redis:
+            return False
+        
+        try:
+            result = await self._redis.eval(_RELEASE_LOCK_SCRIPT, 1, f"lock:{name}", token)
+            return bool(result)
+        except Exception as e:
+            logger.error(f"Redis释放锁失败: {e}")
+            return False
+    
+    async def rate_limit(self, key: str, limit: int, period: int) -> Optional[Tuple[bool, int, float]]:
+        """GCRA速率限制：period秒内最多limit次请求
+        
+        返回 (是否允许, 剩余次数, 需等待秒数)，Redis不可用时返回None
+        """
+        if not self._connected or not self._redis:
+            return None
+        
+        try:
+            if self._gcra_script is None:
+                self._gcra_script = self._redis.register_script(_GCRA_SCRIPT)
+            interval = max(period * 1000 // limit, 1)
+            allowed, remaining, retry_after_ms = await self._gcra_script(keys=[key], args=[interval, limit])
+            return bool(allowed), int(remaining), int(retry_after_ms) / 1000
+        except Exception as e:
+            logger.error(f"Redis速率限制检查失败 {key}: {e}")
+            return None
+    
     async def get_json(self, key: str) -> Optional[dict]:
-        """获取JSON格式的缓存值"""
+        """获取JSON格式的缓存值（兼容旧版本写入的JSON文本）"""
         value = await self.get(key)
-        if value:
+        if isinstance(value, str) and value:
             try:
                 return json.loads(value)
             except json.JSONDecodeError as e:
                 logger.error(f"JSON解析失败: {e}")
-        return None
+                return None
+        # 命中的空字典/空列表原样返回，不能当作未命中
+        return value
     
     async def set_json(self, key: str, value: dict, expire: Optional[int] = None) -> bool:
         """设置JSON格式的缓存值"""
@@ -165,10 +656,169 @@ class CacheManager:
         
         try:
             result = await self._redis.ping()
-            return result == "PONG"
+            return bool(result)
         except Exception as e:
             logger.error(f"Redis PING失败: {e}")
             return False
+    
+    async def publish(self, channel: str, message: str) -> bool:
+        """向频道发布消息"""
+        if not self._connected or not self._redis:
+            return False
+        
+        try:
+            await self._redis.publish(channel, message)
+            return True
+        except Exception as e:
+            logger.error(f"Redis PUBLISH失败: {e}")
+            return False
+    
+    async def subscribe(self, channel: str, handler: Callable[[str], Any]) -> None:
+        """订阅频道，handler 接收消息字符串（可以是协程函数）"""
+        self._subscriptions[channel] = handler
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.subscribe(channel)
+            except Exception as e:
+                logger.error(f"Redis SUBSCRIBE失败: {e}")
+    
+    def add_reconnect_hook(self, hook: Callable[[], Awaitable[Any]]) -> None:
+        """注册 pub/sub 重连钩子：断线重连并恢复订阅后、处理新消息之前调用"""
+        if hook not in self._reconnect_hooks:
+            self._reconnect_hooks.append(hook)
+    
+    def remove_reconnect_hook(self, hook: Callable[[], Awaitable[Any]]) -> None:
+        if hook in self._reconnect_hooks:
+            self._reconnect_hooks.remove(hook)
+    
+    async def unsubscribe(self, channel: str) -> None:
+        """取消订阅频道"""
+        self._subscriptions.pop(channel, None)
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.unsubscribe(channel)
+            except Exception as e:
+                logger.error(f"Redis UNSUBSCRIBE失败: {e}")
+    
+    async def _invalidate_local(self, keys: List[str]) -> None:
+        """清除本地副本并广播失效消息给其他副本"""
+        local_keys = [key for key in keys if self._is_local_key(key)]
+        if not local_keys:
+            return
+        
+        for key in local_keys:
+            if self._local.delete(key):
+                metrics.inc("cache_evictions_total", tier="local", reason="invalidated")
+        
+        await self.publish(
+            settings.CACHE_INVALIDATION_CHANNEL,
+            json.dumps({"origin": self._instance_id, "keys": local_keys})
+        )
+    
+    def _handle_invalidation(self, message: str) -> None:
+        """处理其他副本广播的失效消息"""
+        try:
+            payload = json.loads(message)
+        except json.JSONDecodeError:
+            logger.warning(f"无法解析缓存失效消息: {message}")
+            return
+        
+        # 本副本发出的消息在写入时已处理
+        if payload.get("origin") == self._instance_id or self._local is None:
+            return
+        
+        for key in payload.get("keys", []):
+            if self._local.delete(key):
+                metrics.inc("cache_evictions_total", tier="local", reason="invalidated")
+    
+    async def _listen(self):
+        """pub/sub监听循环，断线后自动重连"""
+        reconnecting = False
+        current = asyncio.current_task()
+        while True:
+            # 取消可能被客户端吞掉（内部 wait_for 与读取同时完成时），
+            # 或表现为连接错误（客户端在取消时关闭连接），每轮都检查一次
+            if current is not None and current.cancelling():
+                raise asyncio.CancelledError()
+            try:
+                if self._pubsub is None:
+                    self._pubsub = self._redis.pubsub()
+                    await self._pubsub.subscribe(*self._subscriptions.keys())
+                    # 断线期间可能错过失效消息，重新订阅后清空本地层
+                    if self._local is not None:
+                        self._local.clear()
+                    if reconnecting:
+                        await self._run_reconnect_hooks()
+                        reconnecting = False
+                
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=1.0
+                )
+                if not message or message.get("type") != "message":
+                    continue
+                
+                channel = message["channel"]
+                if isinstance(channel, bytes):
+                    channel = channel.decode("utf-8")
+                handler = self._subscriptions.get(channel)
+                if handler is None:
+                    continue
+                
+                data = message["data"]
+                if isinstance(data, bytes):
+                    data = data.decode("utf-8")
+                result = handler(data)
+                if inspect.isawaitable(result):
+                    await result
+                    
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if current is not None and current.cancelling():
+                    raise asyncio.CancelledError() from e
+                logger.error(f"Redis pub/sub监听异常: {e}")
+                reconnecting = True
+                if self._pubsub is not None:
+                    try:
+                        await self._pubsub.aclose()
+                    except Exception:
+                        pass
+                    self._pubsub = None
+                await asyncio.sleep(1)
+    
+    async def _run_reconnect_hooks(self):
+        for hook in self._reconnect_hooks:
+            try:
+                await hook()
+            except Exception as e:
+                logger.error(f"pub/sub重连钩子执行失败: {e}")
+    
+    def get_stats(self) -> dict:
+        """获取各缓存层的命中/未命中/淘汰统计"""
+        stats = {}
+        for tier in ("local", "redis"):
+            hits = metrics.get_counter("cache_hits_total", tier=tier)
+            misses = metrics.get_counter("cache_misses_total", tier=tier)
+            total = hits + misses
+            stats[tier] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": round(hits / total, 4) if total else 0.0,
+            }
+        
+        stats["local"].update({
+            "enabled": self._local is not None,
+            "items": len(self._local) if self._local is not None else 0,
+            "bytes": self._local.size_bytes if self._local is not None else 0,
+            "max_items": settings.CACHE_LOCAL_MAX_ITEMS,
+            "max_bytes": settings.CACHE_LOCAL_MAX_BYTES,
+            "evictions": {
+                reason: metrics.get_counter("cache_evictions_total", tier="local", reason=reason)
+                for reason in ("capacity", "expired", "invalidated")
+            },
+        })
+        return stats
 
 
 # 全局缓存管理器实例
@@ -176,7 +826,7 @@ cache_manager = CacheManager()
 
 
 # 便捷函数
-async def get_cache(key: str) -> Optional[str]:
+async def get_cache(key: str) -> Optional[Any]:
     """获取缓存值"""
     return await cache_manager.get(key)
 
@@ -233,6 +883,195 @@ async def get_redis_status() -> str:
         return "error"
 
 
+# 防击穿加载
+class _LoaderCancelled(Exception):
+    """执行加载的协程被取消，等待者需要重新发起加载"""
+
+
+class SingleFlight:
+    """进程内单飞：同一个键同一时刻只有一个协程执行加载，其余协程等待其结果"""
+    
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+    
+    def in_flight(self, key: str) -> bool:
+        """键是否正在加载"""
+        return key in self._calls
+    
+    async def do(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """执行加载；若已有协程在加载同一个键，则等待其结果"""
+        while key in self._calls:
+            try:
+                return await asyncio.shield(self._calls[key])
+            except _LoaderCancelled:
+                # 加载者被取消（例如客户端断开），由等待者重新加载
+                continue
+        
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await loader()
+        except asyncio.CancelledError:
+            # 不取消共享的 future，否则没有被取消的等待者也会收到 CancelledError
+            future.set_exception(_LoaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 标记异常已被获取，避免无等待者时输出告警
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._calls.pop(key, None)
+
+
+single_flight = SingleFlight()
+
+# 当前是否在计算要写入缓存的值
+_filling_cache: ContextVar[bool] = ContextVar("cache_filling", default=False)
+
+
+@contextmanager
+def filling_cache():
+    """标记其中计算的结果会写入缓存
+
+    缓存值会在有效期内一直返回，期间的数据库读取只使用几乎没有复制延迟的副本，否则走主库
+    （见 db_routing），避免把只读副本上尚未同步的旧数据缓存下来。
+    """
+    token = _filling_cache.set(True)
+    try:
+        yield
+    finally:
+        _filling_cache.reset(token)
+
+
+def is_filling_cache() -> bool:
+    return _filling_cache.get()
+
+
+def cached(
+    key: Callable[..., str],
+    ttl: int,
+    stale_ttl: int = 0,
+    early_refresh_beta: float = 0.0,
+    dump: Callable[[Any], Any] = lambda value: value,
+    load: Callable[[Any], Any] = lambda value: value,
+    lock_timeout: int = 30,
+):
+    """异步方法缓存装饰器（防击穿 + 过期后返回旧值 + 提前概率刷新）
+    
+    - key: 根据被装饰方法的参数生成缓存键
+    - ttl: 新鲜期（秒），期内直接返回缓存值
+    - stale_ttl: 新鲜期过后仍可返回旧值的时间（秒），期间只有一个协程重新计算
+    - early_refresh_beta: 大于0时启用XFetch提前刷新，值越大越早刷新
+    - dump/load: 缓存值与返回值之间的转换（例如Pydantic模型与字典）
+    
+    同一进程内通过 SingleFlight 合并并发加载，多副本之间通过 Redis 锁
+    保证只有一个副本在刷新旧值。
+    
+    用法:
+        @cached(key=lambda self, user, db: f"task_stats:{user.id}", ttl=300, stale_ttl=60)
+        async def get_task_stats(self, user, db): ...
+    """
+    def decorator(func):
+        name = func.__qualname__
+        
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs)
+            
+            async def compute():
+                start = time.monotonic()
+                with filling_cache():
+                    value = await func(*args, **kwargs)
+                envelope = {
+                    "v": dump(value),
+                    "t": time.time(),
+                    "d": time.monotonic() - start,
+                }
+                await cache_manager.set_json(cache_key, envelope, expire=ttl + stale_ttl)
+                return value
+            
+            envelope = await cache_manager.get_json(cache_key)
+            if not isinstance(envelope, dict) or "t" not in envelope:
+                # 缓存未命中：进程内合并加载，跨副本尽量等待持锁者的结果
+                metrics.inc("cached_loader_total", loader=name, outcome="miss")
+                return await single_flight.do(
+                    cache_key,
+                    lambda: _compute_with_lock(cache_key, compute, load, lock_timeout)
+                )
+            
+            now = time.time()
+            fresh_until = envelope["t"] + ttl
+            if now < fresh_until:
+                if early_refresh_beta <= 0 or not _should_refresh_early(envelope, fresh_until, now, early_refresh_beta):
+                    metrics.inc("cached_loader_total", loader=name, outcome="fresh")
+                    return load(envelope["v"])
+                outcome = "early_refresh"
+            else:
+                outcome = "stale"
+            
+            # 已有协程或其他副本在刷新时直接返回旧值
+            if single_flight.in_flight(cache_key):
+                metrics.inc("cached_loader_total", loader=name, outcome=f"{outcome}_served")
+                return load(envelope["v"])
+            
+            token = await cache_manager.acquire_lock(cache_key, lock_timeout)
+            if token is None and cache_manager.is_connected:
+                metrics.inc("cached_loader_total", loader=name, outcome=f"{outcome}_served")
+                return load(envelope["v"])
+            
+            metrics.inc("cached_loader_total", loader=name, outcome=outcome)
+            try:
+                return await single_flight.do(cache_key, compute)
+            except Exception as e:
+                # 刷新失败时退回旧值
+                logger.warning(f"刷新缓存 {cache_key} 失败，返回旧值: {e}")
+                return load(envelope["v"])
+            finally:
+                if token:
+                    await cache_manager.release_lock(cache_key, token)
+        
+        return wrapper
+    
+    return decorator
+
+
+def _should_refresh_early(envelope: dict, fresh_until: float, now: float, beta: float) -> bool:
+    """XFetch算法：计算耗时越长、越接近过期，越可能提前刷新"""
+    delta = max(float(envelope.get("d", 0.0)), 0.001)
+    return now - delta * beta * math.log(1.0 - random.random()) >= fresh_until
+
+
+async def _compute_with_lock(
+    cache_key: str,
+    compute: Callable[[], Awaitable[Any]],
+    load: Callable[[Any], Any],
+    lock_timeout: int,
+    wait_timeout: float = 2.0,
+    poll_interval: float = 0.05,
+) -> Any:
+    """缓存未命中时获取跨副本锁；锁被占用则短暂等待持锁副本写入结果"""
+    token = await cache_manager.acquire_lock(cache_key, lock_timeout)
+    if token is None and cache_manager.is_connected:
+        deadline = time.monotonic() + wait_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(poll_interval)
+            envelope = await cache_manager.get_json(cache_key)
+            if isinstance(envelope, dict) and "t" in envelope:
+                return load(envelope["v"])
+        # 等待超时，自行计算
+    
+    try:
+        return await compute()
+    finally:
+        if token:
+            await cache_manager.release_lock(cache_key, token)
+
+
 # 会话管理
 class SessionManager:
     """会话管理器"""
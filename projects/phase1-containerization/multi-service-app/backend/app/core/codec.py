@@ -0,0 +1,234 @@
+"""
+缓存值编解码
+为结构化缓存值（字典、列表）提供可插拔的序列化和压缩
+
+编码后的值格式：
+    MAGIC(1字节) + 格式版本(1字节) + 编码器ID(1字节) + 压缩算法ID(1字节) + 数据
+
+MAGIC 字节 0xC1 不可能出现在合法UTF-8文本的开头，因此没有标记的值
+（旧版本写入的JSON文本或普通字符串）仍能被识别并按原方式读取。
+
+旧版本无法读取带标记的值，滚动发布时先以 legacy 编码（写入无标记的JSON文本）
+发布，所有副本升级后再切换到带标记的编码。
+"""
+
+import json
+import zlib
+from typing import Any, Dict, Optional
+
+from app.core.config import get_settings
+from app.utils.logger import setup_logger
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - 可选依赖
+    msgpack = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover - 可选依赖
+    lz4_frame = None
+
+settings = get_settings()
+logger = setup_logger(__name__)
+
+MAGIC = b"\xc1"
+FORMAT_VERSION = 1
+HEADER_SIZE = 4
+# 写入旧版本格式（无标记JSON文本）的编码器名称
+LEGACY_CODEC = "legacy"
+
+
+class CodecError(Exception):
+    """缓存值编解码失败"""
+
+
+class Codec:
+    """序列化编码器基类"""
+
+    codec_id: int = 0
+    name: str = ""
+
+    def encode(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    """标准库JSON编码（与旧版本缓存格式相同）"""
+
+    codec_id = 0
+    name = "json"
+
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(Codec):
+    """orjson编码（更快，输出更紧凑）"""
+
+    codec_id = 1
+    name = "orjson"
+
+    def encode(self, value: Any) -> bytes:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+    def decode(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackCodec(Codec):
+    """msgpack二进制编码"""
+
+    codec_id = 2
+    name = "msgpack"
+
+    def encode(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def decode(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+class Compressor:
+    """压缩算法基类"""
+
+    compression_id: int = 0
+    name: str = "none"
+
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def decompress(self, data: bytes) -> bytes:
+        return data
+
+
+class ZlibCompressor(Compressor):
+    compression_id = 1
+    name = "zlib"
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, 6)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class Lz4Compressor(Compressor):
+    compression_id = 2
+    name = "lz4"
+
+    def compress(self, data: bytes) -> bytes:
+        return lz4_frame.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return lz4_frame.decompress(data)
+
+
+# 已注册的编码器和压缩算法（按ID索引，用于解码）
+_CODECS: Dict[int, Codec] = {}
+_COMPRESSORS: Dict[int, Compressor] = {0: Compressor()}
+
+_CODECS[JsonCodec.codec_id] = JsonCodec()
+if orjson is not None:
+    _CODECS[OrjsonCodec.codec_id] = OrjsonCodec()
+if msgpack is not None:
+    _CODECS[MsgpackCodec.codec_id] = MsgpackCodec()
+
+_COMPRESSORS[ZlibCompressor.compression_id] = ZlibCompressor()
+if lz4_frame is not None:
+    _COMPRESSORS[Lz4Compressor.compression_id] = Lz4Compressor()
+
+
+def _find_by_name(registry: Dict[int, Any], name: str) -> Optional[Any]:
+    for item in registry.values():
+        if item.name == name:
+            return item
+    return None
+
+
+class ValueCodec:
+    """缓存值编解码器：写入时使用配置的编码和压缩，读取时根据标记自动识别"""
+
+    def __init__(self, codec: str = "json", compression: str = "none", compression_threshold: int = 1024):
+        self.legacy = codec == LEGACY_CODEC
+        self.codec = _CODECS[JsonCodec.codec_id] if self.legacy else _find_by_name(_CODECS, codec)
+        if self.codec is None:
+            logger.warning(f"缓存编码器 {codec} 不可用，回退到 json")
+            self.codec = _CODECS[JsonCodec.codec_id]
+
+        self.compressor = _find_by_name(_COMPRESSORS, compression)
+        if self.compressor is None:
+            logger.warning(f"缓存压缩算法 {compression} 不可用，不启用压缩")
+            self.compressor = _COMPRESSORS[0]
+
+        self.compression_threshold = compression_threshold
+
+    def encode(self, value: Any) -> bytes:
+        """编码结构化值，超过阈值时压缩"""
+        data = self.codec.encode(value)
+        if self.legacy:
+            return data
+        compressor = _COMPRESSORS[0]
+        if self.compressor.compression_id and len(data) >= self.compression_threshold:
+            compressed = self.compressor.compress(data)
+            # 压缩无收益时保留原始数据
+            if len(compressed) < len(data):
+                data = compressed
+                compressor = self.compressor
+
+        header = MAGIC + bytes([FORMAT_VERSION, self.codec.codec_id, compressor.compression_id])
+        return header + data
+
+    @staticmethod
+    def is_encoded(raw: bytes) -> bool:
+        """是否为带版本标记的编码值"""
+        return len(raw) >= HEADER_SIZE and raw[:1] == MAGIC
+
+    def decode(self, raw: bytes) -> Any:
+        """解码Redis中的原始值
+
+        - 带标记的值：按标记中的编码器和压缩算法解码
+        - 无标记的值：JSON对象/数组文本解析为结构化值（旧版本或 legacy 编码写入），
+          其余按UTF-8文本返回
+        """
+        if not self.is_encoded(raw):
+            text = raw.decode("utf-8")
+            if text[:1] in ("{", "["):
+                try:
+                    return json.loads(text)
+                except ValueError:
+                    pass
+            return text
+
+        version, codec_id, compression_id = raw[1], raw[2], raw[3]
+        if version != FORMAT_VERSION:
+            raise CodecError(f"不支持的缓存格式版本: {version}")
+
+        codec = _CODECS.get(codec_id)
+        compressor = _COMPRESSORS.get(compression_id)
+        if codec is None or compressor is None:
+            raise CodecError(f"缺少解码器: codec={codec_id}, compression={compression_id}")
+
+        try:
+            return codec.decode(compressor.decompress(raw[HEADER_SIZE:]))
+        except Exception as e:
+            raise CodecError(f"缓存值解码失败: {e}") from e
+
+
+# 全局编解码器实例
+value_codec = ValueCodec(
+    codec=settings.CACHE_CODEC,
+    compression=settings.CACHE_COMPRESSION,
+    compression_threshold=settings.CACHE_COMPRESSION_THRESHOLD
+)
@@ -7,10 +7,16 @@ from typing import AsyncGenerator, Optional
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import text
+from sqlalchemy import event, exc, text
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 import asyncio
+import time
+import uuid
 
 from app.core.config import get_settings
+from app.core.db_routing import RoutingAsyncSession, replica_set
+from app.core.metrics import metrics
+from app.core.query_stats import record_query
 from app.utils.logger import setup_logger
 
 settings = get_settings()
@@ -21,6 +27,83 @@ class Base(DeclarativeBase):
     pass
 
 
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """记录获取连接等待时间的连接池"""
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            connection = super()._do_get()
+            outcome = "ok"
+            return connection
+        except exc.TimeoutError:
+            outcome = "timeout"
+            raise
+        finally:
+            # 超时的等待单独计数，不计入成功获取的连接数和平均等待时间
+            metrics.inc("db_pool_checkouts_total", outcome=outcome)
+            metrics.inc("db_pool_wait_seconds_total", time.perf_counter() - start, outcome=outcome)
+
+
+def _average_pool_wait() -> float:
+    checkouts = metrics.get_counter("db_pool_checkouts_total", outcome="ok")
+    if not checkouts:
+        return 0.0
+    return round(metrics.get_counter("db_pool_wait_seconds_total", outcome="ok") / checkouts, 6)
+
+
+def _engine_options(database_url: str) -> dict:
+    """根据配置生成引擎参数（连接池和驱动参数）"""
+    if database_url.startswith("sqlite"):
+        # SQLite（测试环境）使用默认连接池
+        return {}
+    
+    options = {
+        "poolclass": TimedQueuePool,
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+    
+    if "+asyncpg" in database_url:
+        if settings.DATABASE_PGBOUNCER:
+            # PgBouncer事务池模式下同一会话的语句可能落在不同的服务端连接上，
+            # 不能复用预编译语句：关闭两级语句缓存，并为每条语句使用唯一名称
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4().hex}__",
+            }
+        else:
+            options["connect_args"] = {
+                "prepared_statement_cache_size": settings.DATABASE_STATEMENT_CACHE_SIZE,
+            }
+    
+    return options
+
+
+def _register_query_events(engine) -> None:
+    """统计引擎执行的每条语句（语句数、耗时、慢查询）"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        record_query(statement, time.perf_counter() - conn.info["query_start"].pop(), parameters)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
+
+
 class DatabaseManager:
     """数据库管理器"""
     
@@ -41,14 +124,23 @@ class DatabaseManager:
             self._engine = create_async_engine(
                 settings.DATABASE_URL,
                 echo=settings.DATABASE_ECHO if hasattr(settings, 'DATABASE_ECHO') else False,
-                pool_pre_ping=True,
-                pool_recycle=3600,
+                **_engine_options(settings.DATABASE_URL)
             )
+            self._register_pool_metrics()
+            _register_query_events(self._engine)
             
-            # 创建会话工厂
+            # 只读副本
+            for replica_url in settings.database_replica_urls:
+                replica_engine = create_async_engine(replica_url, **_engine_options(replica_url))
+                _register_query_events(replica_engine)
+                replica_set.add(replica_engine)
+            if replica_set.enabled:
+                logger.info(f"已配置 {len(replica_set.replicas)} 个只读副本")
+            
+            # 创建会话工厂（按语句类型路由到主库或只读副本）
             self._session_factory = async_sessionmaker(
                 bind=self._engine,
-                class_=AsyncSession,
+                class_=RoutingAsyncSession,
                 expire_on_commit=False
             )
             
@@ -66,11 +158,23 @@ class DatabaseManager:
     
     async def disconnect(self):
         """断开数据库连接"""
+        await replica_set.dispose()
         if self._engine:
             await self._engine.dispose()
             self._connected = False
             logger.info("数据库连接已关闭")
     
+    def _register_pool_metrics(self):
+        """注册连接池仪表盘指标（导出时读取连接池的实时状态）"""
+        pool = self._engine.pool
+        if not isinstance(pool, QueuePool):
+            return
+        metrics.register_gauge("db_pool_size", pool.size)
+        metrics.register_gauge("db_pool_checked_out", pool.checkedout)
+        metrics.register_gauge("db_pool_checked_in", pool.checkedin)
+        metrics.register_gauge("db_pool_overflow", lambda: max(pool.overflow(), 0))
+        metrics.register_gauge("db_pool_wait_seconds_avg", _average_pool_wait)
+    
     def get_session(self) -> AsyncSession:
         """获取数据库会话"""
         if not self._connected or not self._session_factory:
@@ -0,0 +1,220 @@
+"""
+读写分离路由
+可选的只读副本（DATABASE_REPLICA_URLS）上执行只读查询，其余语句都在主库执行：
+
+- 只有通过 @read_replica 标记的只读服务方法中的 SELECT 会发往副本
+- 事务中已有写操作、SELECT ... FOR UPDATE、刷新（flush）时一律使用主库
+- 用户提交写操作后的一段时间内（DATABASE_READ_STICKY_SECONDS），其读请求固定走主库，
+  保证能读到自己刚写入的数据（粘滞标记保存在Redis中，各进程共享；进程内另有一级本地缓存）
+- 计算要写入缓存的值时（见 cache.filling_cache）结果会被缓存一整个有效期，只使用复制延迟不超过
+  DATABASE_REPLICA_CACHE_FILL_MAX_LAG 的副本，否则读主库；用户自己刚写入时按粘滞规则读主库。
+  延迟只在健康检查时测量，其他请求或后台任务的写入仍可能在一个检查周期内被副本上的旧值覆盖进缓存
+- 后台任务定期检查副本的复制延迟，延迟超过阈值或无法连接的副本不再接收查询，
+  没有可用副本时回退到主库
+"""
+
+import asyncio
+import functools
+import itertools
+from contextvars import ContextVar
+from typing import Any, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from app.core.cache import LocalCache, cache_manager, is_filling_cache
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.utils.logger import setup_logger
+
+settings = get_settings()
+logger = setup_logger(__name__)
+
+# 当前调用是否允许读副本（由 @read_replica 设置）
+_use_replica: ContextVar[bool] = ContextVar("db_use_replica", default=False)
+# 当前请求的用户ID（由认证依赖设置，用于读己之写的粘滞）
+_request_user_id: ContextVar[Optional[int]] = ContextVar("db_request_user_id", default=None)
+
+# 复制延迟（秒）；与主库WAL位置一致时视为无延迟
+_REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class Replica:
+    """只读副本"""
+
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        self.lag = 0.0
+
+
+class ReplicaSet:
+    """只读副本集合（轮询选择健康的副本）"""
+
+    def __init__(self):
+        self.replicas: List[Replica] = []
+        self._cycle = None
+        self.sticky_ttl = max(1, int(settings.DATABASE_READ_STICKY_SECONDS))
+        # 本进程中最近提交过写操作的用户（user_id -> True，过期即解除粘滞），Redis中的标记为准
+        self._sticky = LocalCache(
+            max_items=100000,
+            max_bytes=64 * 1024 * 1024,
+            default_ttl=self.sticky_ttl,
+            tier="db_sticky"
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def add(self, engine: AsyncEngine) -> None:
+        replica = Replica(f"replica{len(self.replicas)}", engine)
+        self.replicas.append(replica)
+        self._cycle = itertools.cycle(self.replicas)
+        metrics.register_gauge("db_replica_lag_seconds", lambda: replica.lag, replica=replica.name)
+        metrics.register_gauge("db_replica_healthy", lambda: int(replica.healthy), replica=replica.name)
+
+    def choose(self, max_lag: Optional[float] = None) -> Optional[Replica]:
+        """选择一个健康（且延迟不超过 max_lag）的副本，全部不可用时返回None"""
+        for _ in range(len(self.replicas)):
+            replica = next(self._cycle)
+            if replica.healthy and (max_lag is None or replica.lag <= max_lag):
+                return replica
+        return None
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+        self.replicas = []
+        self._cycle = None
+
+    @staticmethod
+    def sticky_key(user_id: int) -> str:
+        return f"db_sticky:{user_id}"
+
+    async def mark_sticky(self, user_id: int) -> None:
+        self._sticky.set(str(user_id), True)
+        await cache_manager.set(self.sticky_key(user_id), 1, expire=self.sticky_ttl)
+
+    async def is_sticky(self, user_id: Optional[int]) -> bool:
+        """用户最近是否提交过写操作（任意进程）"""
+        if user_id is None:
+            return False
+        found, _ = self._sticky.get(str(user_id))
+        return found or await cache_manager.exists(self.sticky_key(user_id))
+
+    async def check(self, replica: Replica) -> None:
+        """检查副本的连通性和复制延迟"""
+        try:
+            async with replica.engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    replica.lag = float((await conn.execute(_REPLICA_LAG_SQL)).scalar() or 0)
+                else:
+                    await conn.execute(text("SELECT 1"))
+                    replica.lag = 0.0
+            healthy = replica.lag <= settings.DATABASE_REPLICA_MAX_LAG
+        except Exception as e:
+            logger.warning(f"只读副本 {replica.name} 检查失败: {e}")
+            healthy = False
+
+        if healthy != replica.healthy:
+            logger.warning(f"只读副本 {replica.name} {'恢复' if healthy else '停用'}（延迟 {replica.lag:.1f}s）")
+        replica.healthy = healthy
+
+    async def run_health_checks(self, interval: int):
+        """定期检查所有副本"""
+        while True:
+            await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+            await asyncio.sleep(interval)
+
+
+# 全局副本集合
+replica_set = ReplicaSet()
+
+
+def set_request_user(user_id: Optional[int]) -> None:
+    """记录当前请求的用户（认证依赖中调用）"""
+    _request_user_id.set(user_id)
+
+
+def read_replica(func):
+    """标记只读服务方法：其中的查询可以在只读副本上执行"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if not replica_set.enabled:
+            return await func(*args, **kwargs)
+
+        if await replica_set.is_sticky(_request_user_id.get()):
+            metrics.inc("db_replica_routing_total", outcome="sticky")
+            return await func(*args, **kwargs)
+
+        token = _use_replica.set(True)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
+
+
+class RoutingSession(Session):
+    """按语句类型在主库和只读副本之间路由的会话"""
+
+    def get_bind(self, mapper=None, clause=None, **kw) -> Any:
+        if (
+            _use_replica.get()
+            and replica_set.enabled
+            and not self._flushing
+            and not self.info.get("has_writes")
+            and isinstance(clause, Select)
+            and clause._for_update_arg is None
+        ):
+            filling = is_filling_cache()
+            replica = replica_set.choose(settings.DATABASE_REPLICA_CACHE_FILL_MAX_LAG if filling else None)
+            if replica is not None:
+                metrics.inc("db_replica_routing_total", outcome="cache_fill_replica" if filling else "replica")
+                return replica.engine.sync_engine
+            metrics.inc("db_replica_routing_total", outcome="cache_fill" if filling else "fallback")
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+class RoutingAsyncSession(AsyncSession):
+    """使用 RoutingSession 的异步会话，提交后在Redis中记录读己之写的粘滞标记"""
+
+    sync_session_class = RoutingSession
+
+    async def commit(self) -> None:
+        await super().commit()
+        user_id = self.sync_session.info.pop("sticky_user_id", None)
+        if user_id is not None:
+            await replica_set.mark_sticky(user_id)
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _track_orm_writes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _track_flush_writes(session, flush_context):
+    session.info["has_writes"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _mark_sticky_after_commit(session):
+    # 事件中不能等待Redis，记下用户后由 RoutingAsyncSession.commit 写入粘滞标记
+    if session.info.pop("has_writes", False) and replica_set.enabled:
+        user_id = _request_user_id.get()
+        if user_id is not None:
+            session.info["sticky_user_id"] = user_id
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _reset_writes_after_rollback(session):
+    session.info.pop("has_writes", None)
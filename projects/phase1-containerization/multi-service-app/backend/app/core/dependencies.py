@@ -3,13 +3,17 @@
 提供FastAPI依赖注入函数
 """
 
-from typing import AsyncGenerator, Optional
-from fastapi import Depends, HTTPException, status, Request
+import math
+import time
+from typing import AsyncGenerator, Dict, Optional
+from fastapi import Depends, HTTPException, status, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
+from app.core.db_routing import set_request_user
 from app.core.cache import cache_manager
+from app.core.metrics import metrics
 from app.models.user import User
 from app.services.auth_service import auth_service
 from app.utils.logger import setup_logger
@@ -33,20 +37,15 @@ async def get_current_user(
         )
     
     try:
-        # 检查令牌是否在黑名单中
-        blacklisted = await cache_manager.get(f"blacklist_token:{credentials.credentials}")
-        if blacklisted:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="令牌已失效",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        # 获取当前用户
+        # 获取当前用户（黑名单检查与认证缓存在同一次Redis往返中完成）
         user = await auth_service.get_current_user(credentials.credentials, db)
+        # 记录请求用户，写入后的读请求固定走主库
+        set_request_user(user.id)
         return user
         
-    except HTTPException:
+    except HTTPException as e:
+        if e.status_code == status.HTTP_401_UNAUTHORIZED and not e.headers:
+            e.headers = {"WWW-Authenticate": "Bearer"}
         raise
     except Exception as e:
         logger.error(f"认证失败: {e}")
@@ -97,12 +96,7 @@ def get_optional_current_user():
             return None
         
         try:
-            # 检查令牌是否在黑名单中
-            blacklisted = await cache_manager.get(f"blacklist_token:{credentials.credentials}")
-            if blacklisted:
-                return None
-            
-            # 获取当前用户
+            # 获取当前用户（已失效的令牌会抛出异常）
             user = await auth_service.get_current_user(credentials.credentials, db)
             return user
             
@@ -133,42 +127,65 @@ async def get_user_agent(request: Request) -> str:
 
 
 class RateLimit:
-    """速率限制依赖"""
+    """速率限制依赖（GCRA令牌桶，window秒内最多requests次）"""
+    
+    # 本地拒绝记录的最大条目数
+    MAX_LOCAL_BLOCKS = 10000
     
     def __init__(self, requests: int, window: int):
         self.requests = requests
         self.window = window
+        # 本地拒绝记录：限流键 -> 允许再次请求的时间（monotonic）
+        self._blocked_until: Dict[str, float] = {}
+    
+    def _reject(self, retry_after: float):
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="请求过于频繁，请稍后再试",
+            headers={"Retry-After": str(max(math.ceil(retry_after), 1))}
+        )
     
-    async def __call__(self, request: Request, client_ip: str = Depends(get_client_ip)):
+    def _block_locally(self, key: str, retry_after: float):
+        """记录被拒绝的客户端，在等待期内直接拒绝而不访问Redis"""
+        now = time.monotonic()
+        if len(self._blocked_until) >= self.MAX_LOCAL_BLOCKS:
+            self._blocked_until = {
+                k: until for k, until in self._blocked_until.items() if until > now
+            }
+            if len(self._blocked_until) >= self.MAX_LOCAL_BLOCKS:
+                return
+        self._blocked_until[key] = now + retry_after
+    
+    async def __call__(self, request: Request, response: Response, client_ip: str = Depends(get_client_ip)):
         """执行速率限制检查"""
-        try:
-            # 使用Redis实现滑动窗口速率限制
-            key = f"rate_limit:{client_ip}:{request.url.path}"
-            
-            # 获取当前请求次数
-            current_requests = await cache_manager.get(key)
-            
-            if current_requests is None:
-                # 第一次请求
-                await cache_manager.set(key, "1", expire=self.window)
-                return True
-            
-            if int(current_requests) >= self.requests:
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail="请求过于频繁，请稍后再试"
-                )
-            
-            # 增加请求计数
-            await cache_manager.set(key, str(int(current_requests) + 1), expire=self.window)
-            return True
-            
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.error(f"速率限制检查失败: {e}")
+        key = f"rate_limit:{client_ip}:{request.url.path}"
+        
+        # 本地预检：等待期内的客户端一定仍处于限流状态
+        blocked_until = self._blocked_until.get(key)
+        if blocked_until is not None:
+            remaining_wait = blocked_until - time.monotonic()
+            if remaining_wait > 0:
+                metrics.inc("rate_limit_total", outcome="rejected_local")
+                raise self._reject(remaining_wait)
+            self._blocked_until.pop(key, None)
+        
+        # 检查与更新在一次Redis往返中原子完成
+        result = await cache_manager.rate_limit(key, self.requests, self.window)
+        if result is None:
             # 速率限制失败时允许请求通过
+            metrics.inc("rate_limit_total", outcome="skipped")
             return True
+        
+        allowed, remaining, retry_after = result
+        if not allowed:
+            self._block_locally(key, retry_after)
+            metrics.inc("rate_limit_total", outcome="rejected")
+            raise self._reject(retry_after)
+        
+        metrics.inc("rate_limit_total", outcome="allowed")
+        response.headers["X-RateLimit-Limit"] = str(self.requests)
+        response.headers["X-RateLimit-Remaining"] = str(remaining)
+        return True
 
 
 # 常用的速率限制实例
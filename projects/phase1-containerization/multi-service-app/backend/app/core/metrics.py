@@ -0,0 +1,112 @@
+"""
+应用指标收集
+提供进程内的计数器、仪表盘和直方图指标，通过 /metrics 端点导出
+"""
+
+import bisect
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Sequence, Union
+
+Number = Union[int, float]
+
+# 直方图默认分桶（适用于以秒为单位的耗时）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _metric_key(name: str, labels: Dict[str, str]) -> str:
+    """生成带标签的指标键，例如 cache_hits_total{tier="local"}"""
+    if not labels:
+        return name
+    label_str = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{label_str}}}"
+
+
+class MetricsRegistry:
+    """进程内指标注册表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Number] = defaultdict(int)
+        self._gauges: Dict[str, Number] = {}
+        self._gauge_callbacks: Dict[str, Callable[[], Number]] = {}
+        self._histograms: Dict[str, dict] = {}
+
+    def inc(self, name: str, value: Number = 1, **labels) -> None:
+        """增加计数器"""
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def set_gauge(self, name: str, value: Number, **labels) -> None:
+        """设置仪表盘指标"""
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def register_gauge(self, name: str, callback: Callable[[], Number], **labels) -> None:
+        """注册回调式仪表盘指标（导出时实时计算）"""
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._gauge_callbacks[key] = callback
+
+    def observe(self, name: str, value: Number, buckets: Sequence[Number] = DEFAULT_BUCKETS, **labels) -> None:
+        """记录直方图观测值（分桶为累计计数，同一指标首次记录时确定分桶）"""
+        key = _metric_key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    "buckets": tuple(buckets),
+                    "counts": [0] * len(buckets),
+                    "sum": 0,
+                    "count": 0,
+                }
+            index = bisect.bisect_left(histogram["buckets"], value)
+            if index < len(histogram["counts"]):
+                histogram["counts"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def get_counter(self, name: str, **labels) -> Number:
+        """获取计数器当前值"""
+        with self._lock:
+            return self._counters.get(_metric_key(name, labels), 0)
+
+    def snapshot(self) -> dict:
+        """导出所有指标"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            callbacks = dict(self._gauge_callbacks)
+            histograms = {}
+            for key, histogram in self._histograms.items():
+                cumulative, buckets = 0, {}
+                for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                    cumulative += count
+                    buckets[str(bound)] = cumulative
+                buckets["+Inf"] = histogram["count"]
+                histograms[key] = {"buckets": buckets, "sum": histogram["sum"], "count": histogram["count"]}
+
+        for key, callback in callbacks.items():
+            try:
+                gauges[key] = callback()
+            except Exception:
+                gauges[key] = None
+
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms,
+        }
+
+    def reset(self) -> None:
+        """清空所有指标（用于测试）"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+# 全局指标注册表
+metrics = MetricsRegistry()
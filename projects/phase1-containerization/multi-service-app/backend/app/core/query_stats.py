@@ -0,0 +1,121 @@
+"""
+SQL查询统计
+数据库引擎事件（见 app.core.database）为每条语句调用 record_query：
+
+- 全局：语句数和耗时直方图，超过阈值的慢查询记录日志
+- 请求级：请求日志中间件通过 track_request 开启统计，请求结束时输出语句数、数据库耗时和慢查询，
+  同一条（归一化后的）语句在一个请求中执行次数过多时告警（疑似N+1查询）
+- capture_statements：记录执行的原始语句及参数，用于检查服务实际发出的查询的执行计划
+"""
+
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.utils.logger import setup_logger
+
+settings = get_settings()
+logger = setup_logger(__name__)
+
+# 每个请求最多保留的慢查询条数
+MAX_SLOW_QUERIES = 10
+# 请求级语句数直方图分桶
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.$])-?\d+(?:\.\d+)?\b")
+_BIND_PARAM = re.compile(r"\$\d+|%\(\w+\)s|%s|(?<![:\w]):\w+|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """归一化SQL：参数和字面量替换为 ?，合并IN列表和空白"""
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _BIND_PARAM.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _IN_LIST.sub("(?)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+class QueryStats:
+    """单个请求的查询统计"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slow: List[Tuple[str, float]] = []
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, duration: float, slow: bool) -> None:
+        self.count += 1
+        self.duration += duration
+        normalized = normalize_sql(statement)
+        self.statements[normalized] += 1
+        if slow and len(self.slow) < MAX_SLOW_QUERIES:
+            self.slow.append((normalized, duration))
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """执行次数超过阈值的语句"""
+        return [(statement, count) for statement, count in self.statements.most_common() if count > threshold]
+
+
+_request_stats: ContextVar[Optional[QueryStats]] = ContextVar("db_query_stats", default=None)
+_captured: ContextVar[Optional[List[Tuple[str, Any]]]] = ContextVar("db_captured_statements", default=None)
+
+
+def record_query(statement: str, duration: float, parameters: Any = None) -> None:
+    """记录一条已执行的语句（引擎事件中调用）"""
+    captured = _captured.get()
+    if captured is not None:
+        captured.append((statement, parameters))
+
+    slow = duration >= settings.DATABASE_SLOW_QUERY_THRESHOLD
+    metrics.inc("db_queries_total")
+    metrics.observe("db_query_duration_seconds", duration)
+    if slow:
+        metrics.inc("db_slow_queries_total")
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.record(statement, duration, slow)
+    elif slow:
+        # 请求中的慢查询随请求日志输出，这里只记录后台任务中的
+        logger.warning(f"慢查询 {duration:.3f}s: {normalize_sql(statement)[:500]}")
+
+
+@contextmanager
+def capture_statements() -> Iterator[List[Tuple[str, Any]]]:
+    """记录当前上下文中执行的原始语句及其参数（驱动层形式，可原样再次执行）"""
+    captured: List[Tuple[str, Any]] = []
+    token = _captured.set(captured)
+    try:
+        yield captured
+    finally:
+        _captured.reset(token)
+
+
+@contextmanager
+def track_request(method: str, path: str) -> Iterator[QueryStats]:
+    """统计当前请求中执行的语句（请求日志中间件中使用）"""
+    stats = QueryStats()
+    token = _request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_stats.reset(token)
+        finish_request(stats, method, path)
+
+
+def finish_request(stats: QueryStats, method: str, path: str) -> None:
+    """导出请求级指标并检查N+1查询"""
+    metrics.observe("http_request_db_queries", stats.count, buckets=QUERY_COUNT_BUCKETS)
+    metrics.observe("http_request_db_seconds", stats.duration)
+
+    for statement, count in stats.repeated(settings.DATABASE_N_PLUS_ONE_THRESHOLD):
+        metrics.inc("db_n_plus_one_total")
+        logger.warning(f"疑似N+1查询: {method} {path} 中同一语句执行了 {count} 次: {statement[:500]}")
@@ -0,0 +1,173 @@
+"""
+令牌吊销列表
+已吊销令牌的 jti 保存在Redis中，每个进程维护一个布隆过滤器副本：
+
+- 布隆过滤器判定"不存在"时令牌一定未被吊销，无需访问Redis
+- 判定"可能存在"时再读取Redis中的 revoked_token:{jti} 确认（排除误判）
+- 吊销时写入Redis并通过pub/sub广播，其他进程收到后加入本地过滤器
+- 定期以及 pub/sub 断线重连后从Redis有序集合重建过滤器，补上断线期间错过的消息并移除已过期的令牌
+"""
+
+import asyncio
+import hashlib
+import math
+import time
+from typing import Callable, Iterable, List, Optional
+
+from app.core.cache import cache_manager
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.utils.logger import setup_logger
+
+settings = get_settings()
+logger = setup_logger(__name__)
+
+# 已吊销令牌集合（成员为jti，分值为令牌过期时间戳）
+REVOKED_SET_KEY = "revoked_tokens"
+
+
+class BloomFilter:
+    """布隆过滤器（双重哈希生成k个位置）"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class TokenRevocationList:
+    """令牌吊销列表（Redis为准，本地布隆过滤器过滤绝大多数未吊销的令牌）"""
+
+    def __init__(self):
+        self._bloom = self._new_filter(0)
+        # 过滤器是否已与Redis同步；未同步时每次都需要检查Redis
+        self._synced = False
+        self._pending: Optional[set] = None
+        self._task: Optional[asyncio.Task] = None
+        # 令牌被吊销时调用（本进程吊销或收到广播，参数为jti）
+        self._listeners: List[Callable[[str], None]] = []
+
+    @staticmethod
+    def _new_filter(expected: int) -> BloomFilter:
+        capacity = max(settings.TOKEN_REVOCATION_BLOOM_CAPACITY, expected * 2)
+        return BloomFilter(capacity, settings.TOKEN_REVOCATION_BLOOM_ERROR_RATE)
+
+    @staticmethod
+    def revoked_key(jti: str) -> str:
+        return f"revoked_token:{jti}"
+
+    def add_listener(self, listener: Callable[[str], None]) -> None:
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    async def start(self) -> None:
+        """加载已吊销令牌并订阅吊销广播"""
+        await cache_manager.subscribe(settings.TOKEN_REVOCATION_CHANNEL, self._handle_revoked)
+        # 重连期间错过的吊销广播不会重发，恢复订阅后立即重建过滤器
+        cache_manager.add_reconnect_hook(self.sync)
+        await self.sync()
+        if self._task is None and settings.TOKEN_REVOCATION_RESYNC_INTERVAL > 0:
+            self._task = asyncio.create_task(self._resync_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        cache_manager.remove_reconnect_hook(self.sync)
+        await cache_manager.unsubscribe(settings.TOKEN_REVOCATION_CHANNEL)
+        self._synced = False
+
+    async def sync(self) -> None:
+        """从Redis重建本地过滤器"""
+        now = time.time()
+        # 记录读取期间收到的吊销消息，它们可能不在读取结果中
+        self._pending = set()
+        try:
+            async with cache_manager.pipeline() as pipe:
+                pipe.zremrangebyscore(REVOKED_SET_KEY, "-inf", now)
+            members = await cache_manager.zrangebyscore(REVOKED_SET_KEY, now, "+inf")
+            pending = self._pending
+        finally:
+            self._pending = None
+
+        if members is None:
+            self._synced = False
+            return
+
+        bloom = self._new_filter(len(members))
+        for jti in (*members, *pending):
+            bloom.add(jti)
+        self._bloom = bloom
+        self._synced = True
+        metrics.set_gauge("token_revocation_entries", len(members))
+
+    async def _resync_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.TOKEN_REVOCATION_RESYNC_INTERVAL)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"同步令牌吊销列表失败: {e}")
+
+    def _handle_revoked(self, jti: str) -> None:
+        """处理其他进程广播的吊销消息"""
+        self._bloom.add(jti)
+        if self._pending is not None:
+            self._pending.add(jti)
+        for listener in self._listeners:
+            try:
+                listener(jti)
+            except Exception as e:
+                logger.error(f"令牌吊销监听函数执行失败: {e}")
+
+    async def revoke(self, jti: str, expires_at: float) -> None:
+        """吊销令牌，expires_at 为令牌的过期时间戳（过期后记录自动清除）"""
+        ttl = int(expires_at - time.time())
+        if ttl <= 0:
+            return
+
+        self._handle_revoked(jti)
+        async with cache_manager.pipeline() as pipe:
+            pipe.set(self.revoked_key(jti), "1", expire=ttl)
+            pipe.zadd(REVOKED_SET_KEY, {jti: expires_at})
+        await cache_manager.publish(settings.TOKEN_REVOCATION_CHANNEL, jti)
+
+    def check_key(self, jti: str) -> Optional[str]:
+        """返回需要在Redis中确认的键；过滤器判定一定未吊销时返回None"""
+        if not self._synced:
+            metrics.inc("token_revocation_filter_total", outcome="unsynced")
+            return self.revoked_key(jti)
+        if jti in self._bloom:
+            metrics.inc("token_revocation_filter_total", outcome="positive")
+            return self.revoked_key(jti)
+        metrics.inc("token_revocation_filter_total", outcome="negative")
+        return None
+
+
+# 全局令牌吊销列表实例
+token_revocation = TokenRevocationList()
@@ -0,0 +1,220 @@
+"""
+搜索
+为模型提供可插拔的搜索后端，匹配语义与 ILIKE '%搜索词%' 相同：
+不区分大小写的子串匹配，中文等不以空格分词的文本也能按任意片段命中。
+
+- postgres: 各字段的 ILIKE 条件，由 pg_trgm 的 GIN 三元组索引（gin_trgm_ops）加速
+- memory: 进程内三元组倒排索引，候选集再按子串复核（与 pg_trgm 索引扫描 + 复核的方式相同），
+  用于 SQLite 等测试环境
+
+相关度为包含搜索词的字段的权重分值之和，两种后端计算方式相同。
+模型通过 register_searchable 注册需要搜索的字段及权重。
+"""
+
+import functools
+import operator
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Type
+
+from sqlalchemy import case, event, false, literal, or_
+
+from app.core.config import get_settings
+from app.utils.logger import setup_logger
+
+settings = get_settings()
+logger = setup_logger(__name__)
+
+# 权重对应的相关度分值
+WEIGHT_SCORES = {"A": 1.0, "B": 0.4, "C": 0.2, "D": 0.1}
+
+# 已注册的可搜索模型：模型 -> {字段: 权重}
+_searchable: Dict[Type, Dict[str, str]] = {}
+
+
+def trigrams(text: Optional[str]) -> Set[str]:
+    """文本（小写）中所有连续3个字符的片段，不足3个字符时为空"""
+    if not text:
+        return set()
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchBackend:
+    """搜索后端基类"""
+
+    name = ""
+
+    def condition(self, model: Type, term: str):
+        """返回匹配搜索词的查询条件"""
+        raise NotImplementedError
+
+    def rank(self, model: Type, term: str):
+        """返回相关度表达式（越大越相关）"""
+        raise NotImplementedError
+
+    def on_persisted(self, model: Type, target: Any) -> None:
+        """实例写入后调用"""
+
+    def on_bulk_persisted(self, model: Type, doc_ids: List[int], values: Dict[str, Optional[str]]) -> None:
+        """绕过ORM批量插入（所有行的搜索字段相同）后调用"""
+
+    def on_delete(self, model: Type, target: Any) -> None:
+        """实例删除后调用"""
+
+
+class PostgresSearchBackend(SearchBackend):
+    """基于 ILIKE + pg_trgm GIN 索引的搜索"""
+
+    name = "postgres"
+
+    @staticmethod
+    def _matches(model: Type, term: str) -> Dict[str, Any]:
+        # autoescape 转义搜索词中的 % 和 _，按字面子串匹配
+        return {
+            field: getattr(model, field).icontains(term, autoescape=True)
+            for field in _searchable[model]
+        }
+
+    def condition(self, model: Type, term: str):
+        return or_(*self._matches(model, term).values())
+
+    def rank(self, model: Type, term: str):
+        fields = _searchable[model]
+        scores = [
+            case((matched, WEIGHT_SCORES[fields[field]]), else_=0.0)
+            for field, matched in self._matches(model, term).items()
+        ]
+        return functools.reduce(operator.add, scores)
+
+
+class TrigramIndexSearchBackend(SearchBackend):
+    """进程内三元组倒排索引（写入后更新，只适用于单进程测试环境）"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 模型名 -> 三元组 -> {id}
+        self._postings: Dict[str, Dict[str, Set[int]]] = defaultdict(lambda: defaultdict(set))
+        # 模型名 -> id -> {字段: 小写文本}（用于复核、更新和删除）
+        self._documents: Dict[str, Dict[int, Dict[str, str]]] = defaultdict(dict)
+
+    def _remove(self, name: str, doc_id: int) -> None:
+        postings = self._postings[name]
+        document = self._documents[name].pop(doc_id, None)
+        if document is None:
+            return
+        for gram in set().union(*(trigrams(text) for text in document.values())):
+            postings[gram].discard(doc_id)
+            if not postings[gram]:
+                del postings[gram]
+
+    def index(self, model: Type, doc_id: int, values: Dict[str, Optional[str]]) -> None:
+        """建立或更新一个实例的索引"""
+        name = model.__name__
+        document = {field: (values.get(field) or "").lower() for field in _searchable[model]}
+
+        with self._lock:
+            self._remove(name, doc_id)
+            postings = self._postings[name]
+            for gram in set().union(*(trigrams(text) for text in document.values())):
+                postings[gram].add(doc_id)
+            self._documents[name][doc_id] = document
+
+    def remove(self, model: Type, doc_id: int) -> None:
+        with self._lock:
+            self._remove(model.__name__, doc_id)
+
+    def search(self, model: Type, term: str) -> Dict[int, float]:
+        """返回任一字段包含搜索词的实例及其分值"""
+        term = term.lower()
+        if not term:
+            return {}
+        fields = _searchable[model]
+
+        with self._lock:
+            name = model.__name__
+            documents = self._documents[name]
+            grams = trigrams(term)
+            if grams:
+                # 候选集：包含搜索词所有三元组的实例
+                postings = self._postings[name]
+                candidates = set.intersection(*(postings.get(gram, set()) for gram in grams))
+            else:
+                # 不足3个字符的搜索词无法使用索引，逐个复核
+                candidates = set(documents)
+
+            matched: Dict[int, float] = {}
+            for doc_id in candidates:
+                document = documents[doc_id]
+                score = sum(WEIGHT_SCORES[weight] for field, weight in fields.items() if term in document[field])
+                if score:
+                    matched[doc_id] = score
+            return matched
+
+    def condition(self, model: Type, term: str):
+        matched = self.search(model, term)
+        if not matched:
+            return false()
+        return model.id.in_(list(matched))
+
+    def rank(self, model: Type, term: str):
+        matched = self.search(model, term)
+        if not matched:
+            return literal(0.0)
+        return case(matched, value=model.id, else_=0.0)
+
+    def on_persisted(self, model: Type, target: Any) -> None:
+        if getattr(target, "is_deleted", False):
+            self.remove(model, target.id)
+            return
+        self.index(model, target.id, {field: getattr(target, field) for field in _searchable[model]})
+
+    def on_delete(self, model: Type, target: Any) -> None:
+        self.remove(model, target.id)
+
+    def on_bulk_persisted(self, model: Type, doc_ids: List[int], values: Dict[str, Optional[str]]) -> None:
+        fields = {field: values.get(field) for field in _searchable[model]}
+        for doc_id in doc_ids:
+            self.index(model, doc_id, fields)
+
+
+def _create_backend() -> SearchBackend:
+    backend = settings.SEARCH_BACKEND.lower()
+    if backend == "auto":
+        backend = "postgres" if settings.DATABASE_URL.startswith("postgresql") else "memory"
+
+    if backend == "postgres":
+        return PostgresSearchBackend()
+    if backend == "memory":
+        return TrigramIndexSearchBackend()
+
+    logger.warning(f"未知的搜索后端 {backend}，使用 postgres")
+    return PostgresSearchBackend()
+
+
+# 全局搜索后端实例
+search_backend = _create_backend()
+
+
+def register_searchable(model: Type, fields: Dict[str, str]) -> None:
+    """注册可搜索模型
+
+    fields 为 {字段名: 权重}，权重取 A/B/C/D。PostgreSQL 中需要为这些字段建立 gin_trgm_ops 索引。
+    """
+    if any(weight not in WEIGHT_SCORES for weight in fields.values()):
+        raise ValueError(f"无效的搜索权重: {fields}")
+    _searchable[model] = dict(fields)
+
+    @event.listens_for(model, "after_insert")
+    def _after_insert(mapper, connection, target):
+        search_backend.on_persisted(model, target)
+
+    @event.listens_for(model, "after_update")
+    def _after_update(mapper, connection, target):
+        search_backend.on_persisted(model, target)
+
+    @event.listens_for(model, "after_delete")
+    def _after_delete(mapper, connection, target):
+        search_backend.on_delete(model, target)
@@ -0,0 +1,83 @@
+"""
+密码哈希
+bcrypt 每次计算需要上百毫秒，在事件循环中直接调用会阻塞所有请求。
+这里把哈希计算放到专用线程池中执行（bcrypt 计算期间释放GIL），
+并限制排队数量：超过上限时直接拒绝，避免登录风暴拖垮其他接口。
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.utils.logger import setup_logger
+
+settings = get_settings()
+logger = setup_logger(__name__)
+
+# 密码加密上下文
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordHasher:
+    """在线程池中执行密码哈希和校验"""
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # 已提交但尚未完成的任务数（包括执行中和排队中）
+        self._pending = 0
+
+        metrics.register_gauge("password_hash_pending", lambda: self._pending)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def _run(self, operation: str, func: Callable[..., Any], *args) -> Any:
+        if self._pending >= self.max_pending:
+            metrics.inc("password_hash_total", operation=operation, outcome="rejected")
+            logger.warning(f"密码哈希队列已满（{self._pending}），拒绝请求")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="服务繁忙，请稍后重试",
+                headers={"Retry-After": "1"}
+            )
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_executor(), func, *args)
+            metrics.inc("password_hash_total", operation=operation, outcome="ok")
+            return result
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """计算密码哈希"""
+        return await self._run("hash", pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: Optional[str]) -> bool:
+        """校验密码"""
+        if not hashed_password:
+            return False
+        return await self._run("verify", pwd_context.verify, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        """关闭线程池（等待执行中的任务完成）"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+# 全局密码哈希实例
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
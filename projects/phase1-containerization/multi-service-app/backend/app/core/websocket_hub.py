@@ -0,0 +1,271 @@
+"""
+WebSocket实时推送
+每个进程维护本进程的连接表（user_id -> 连接），跨进程通过Redis pub/sub分发：
+
+- 每个用户一个频道（ws:user:{user_id}），进程中有该用户的连接时才订阅
+- 推送消息发布到用户频道，持有连接的进程收到后放入各连接的发送队列；没有Redis时只投递本进程的连接
+- 每个连接的发送队列有上限，客户端太慢时丢弃最旧的消息，并在下一条消息前发送
+  {"type": "dropped", "count": n}，客户端据此重新拉取通知列表；发送超时的连接直接关闭
+- 空闲时服务端每隔 WEBSOCKET_HEARTBEAT_INTERVAL 秒发送 {"type": "ping"}，
+  客户端需回复 "pong"（或任意消息），两个心跳周期内没有收到消息的连接被关闭
+- 令牌只在建立连接时校验：令牌被吊销（登出）时关闭使用该令牌的连接，用户的会话被禁用时
+  （WEBSOCKET_USER_REVOKED_CHANNEL 广播）关闭该用户的所有连接，关闭码均为 1008
+- 同一用户的频道订阅和取消订阅串行执行，连接快速断开重连时不会留下没有订阅的连接
+"""
+
+import asyncio
+import functools
+import json
+from collections import deque
+from typing import Any, Dict, Iterable, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect, status
+
+from app.core.cache import cache_manager
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.core.revocation import token_revocation
+from app.utils.logger import setup_logger
+
+settings = get_settings()
+logger = setup_logger(__name__)
+
+_PING = json.dumps({"type": "ping"})
+_PONG = json.dumps({"type": "pong"})
+
+
+class Connection:
+    """单个WebSocket连接及其发送队列"""
+
+    __slots__ = ("websocket", "user_id", "token_id", "pending", "ready", "dropped", "last_seen", "closing")
+
+    def __init__(self, websocket: WebSocket, user_id: int, queue_size: int, token_id: Optional[str] = None):
+        self.websocket = websocket
+        self.user_id = user_id
+        # 建立连接时使用的访问令牌ID（jti），令牌被吊销时关闭连接
+        self.token_id = token_id
+        self.pending: deque = deque(maxlen=queue_size)
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.last_seen = asyncio.get_running_loop().time()
+        # 服务端要求关闭的原因（shutdown/revoked），None 表示正常服务
+        self.closing: Optional[str] = None
+
+    def close(self, reason: str) -> None:
+        """通知发送循环结束并关闭连接"""
+        if self.closing is None:
+            self.closing = reason
+            self.ready.set()
+
+    def offer(self, message: str) -> None:
+        """放入发送队列，队列已满时丢弃最旧的消息"""
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+            metrics.inc("websocket_messages_total", outcome="dropped")
+        self.pending.append(message)
+        self.ready.set()
+
+
+class WebSocketHub:
+    """WebSocket连接注册表和消息分发"""
+
+    def __init__(self):
+        self._connections: Dict[int, Set[Connection]] = {}
+        self._count = 0
+        # 已订阅用户频道的用户
+        self._subscribed: Set[int] = set()
+        # 正在变更订阅的用户：user_id -> [锁, 使用者数]（没有使用者时删除）
+        self._subscription_locks: Dict[int, list] = {}
+
+        metrics.register_gauge("websocket_connections", lambda: self._count)
+        metrics.register_gauge("websocket_users", lambda: len(self._connections))
+
+    @staticmethod
+    def channel(user_id: int) -> str:
+        return f"{settings.WEBSOCKET_CHANNEL_PREFIX}{user_id}"
+
+    @property
+    def connection_count(self) -> int:
+        return self._count
+
+    async def start(self) -> None:
+        """订阅令牌和会话的吊销广播"""
+        token_revocation.add_listener(self._revoke_token)
+        await cache_manager.subscribe(settings.WEBSOCKET_USER_REVOKED_CHANNEL, self._handle_users_revoked)
+
+    async def stop(self) -> None:
+        token_revocation.remove_listener(self._revoke_token)
+        await cache_manager.unsubscribe(settings.WEBSOCKET_USER_REVOKED_CHANNEL)
+
+    async def revoke_users(self, user_ids: Iterable[int]) -> None:
+        """关闭用户在所有进程中的连接（会话被禁用时调用）"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        self.close_user_connections(user_ids)
+        await cache_manager.publish(settings.WEBSOCKET_USER_REVOKED_CHANNEL, ",".join(map(str, user_ids)))
+
+    def close_user_connections(self, user_ids: Iterable[int]) -> None:
+        """关闭本进程中这些用户的连接"""
+        for user_id in user_ids:
+            for connection in self._connections.get(user_id, ()):
+                connection.close("revoked")
+
+    def _handle_users_revoked(self, message: str) -> None:
+        """处理会话禁用广播（消息为逗号分隔的用户ID）"""
+        try:
+            user_ids = [int(user_id) for user_id in message.split(",") if user_id]
+        except ValueError:
+            logger.warning(f"无法解析会话禁用消息: {message}")
+            return
+        self.close_user_connections(user_ids)
+
+    def _revoke_token(self, token_id: str) -> None:
+        """令牌被吊销（吊销列表的监听函数）"""
+        for connections in self._connections.values():
+            for connection in connections:
+                if connection.token_id == token_id:
+                    connection.close("revoked")
+
+    async def publish(self, user_id: int, message: Dict[str, Any]) -> None:
+        """向用户的所有连接（任意进程）推送消息"""
+        payload = json.dumps(message, ensure_ascii=False, default=str)
+        if not cache_manager.is_connected:
+            # 没有Redis时只能投递给本进程的连接
+            self._deliver(user_id, payload)
+            return
+        if not await cache_manager.publish(self.channel(user_id), payload):
+            raise RuntimeError("WebSocket消息发布失败")
+
+    def _deliver(self, user_id: int, payload: str) -> None:
+        """投递给本进程中该用户的连接（pub/sub消息处理函数）"""
+        for connection in self._connections.get(user_id, ()):
+            connection.offer(payload)
+
+    async def _register(self, connection: Connection) -> None:
+        connections = self._connections.setdefault(connection.user_id, set())
+        connections.add(connection)
+        self._count += 1
+        if len(connections) == 1:
+            await self._sync_subscription(connection.user_id)
+
+    async def _unregister(self, connection: Connection) -> None:
+        connections = self._connections.get(connection.user_id)
+        if not connections or connection not in connections:
+            return
+        connections.discard(connection)
+        self._count -= 1
+        if not connections:
+            del self._connections[connection.user_id]
+            await self._sync_subscription(connection.user_id)
+
+    async def _sync_subscription(self, user_id: int) -> None:
+        """使用户频道的订阅与当前连接表一致
+
+        订阅和取消订阅都要等待Redis，同一用户的变更加锁串行执行，并在锁内按最新的连接表决定，
+        避免先发起的取消订阅晚于新连接的订阅到达Redis。
+        """
+        entry = self._subscription_locks.get(user_id)
+        if entry is None:
+            entry = self._subscription_locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                wanted = user_id in self._connections
+                if wanted and user_id not in self._subscribed:
+                    self._subscribed.add(user_id)
+                    await cache_manager.subscribe(self.channel(user_id), functools.partial(self._deliver, user_id))
+                elif not wanted and user_id in self._subscribed:
+                    self._subscribed.discard(user_id)
+                    await cache_manager.unsubscribe(self.channel(user_id))
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._subscription_locks[user_id]
+
+    async def serve(self, websocket: WebSocket, user_id: int, token_id: Optional[str] = None) -> None:
+        """接受连接并推送消息，直到连接断开（token_id 为认证所用令牌的jti）"""
+        if self._count >= settings.WEBSOCKET_MAX_CONNECTIONS:
+            metrics.inc("websocket_disconnects_total", reason="rejected")
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            return
+
+        await websocket.accept()
+        connection = Connection(websocket, user_id, settings.WEBSOCKET_SEND_QUEUE_SIZE, token_id)
+        await self._register(connection)
+
+        receiver = asyncio.create_task(self._receive_loop(connection))
+        sender = asyncio.create_task(self._send_loop(connection))
+        try:
+            done, _ = await asyncio.wait({receiver, sender}, return_when=asyncio.FIRST_COMPLETED)
+            reason = done.pop().result()
+        except Exception as e:
+            logger.warning(f"WebSocket连接异常（用户 {user_id}）: {e}")
+            reason = "error"
+        finally:
+            for task in (receiver, sender):
+                task.cancel()
+            await asyncio.gather(receiver, sender, return_exceptions=True)
+            await self._unregister(connection)
+
+        metrics.inc("websocket_disconnects_total", reason=reason)
+        if reason != "client":
+            try:
+                await websocket.close(code=status.WS_1001_GOING_AWAY if reason == "shutdown"
+                                      else status.WS_1008_POLICY_VIOLATION)
+            except Exception:
+                pass
+
+    async def _receive_loop(self, connection: Connection) -> str:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                message = await connection.websocket.receive_text()
+                connection.last_seen = loop.time()
+                if message == "ping":
+                    connection.offer(_PONG)
+        except WebSocketDisconnect:
+            return "client"
+
+    async def _send_loop(self, connection: Connection) -> str:
+        loop = asyncio.get_running_loop()
+        interval = settings.WEBSOCKET_HEARTBEAT_INTERVAL
+        while connection.closing is None:
+            if not connection.pending:
+                connection.ready.clear()
+                try:
+                    # asyncio.timeout 不像 wait_for 那样为每次等待创建任务，空闲连接更省内存
+                    async with asyncio.timeout(interval):
+                        await connection.ready.wait()
+                except TimeoutError:
+                    if loop.time() - connection.last_seen > interval * 2:
+                        return "heartbeat"
+                    connection.offer(_PING)
+                continue
+
+            if connection.dropped:
+                message = json.dumps({"type": "dropped", "count": connection.dropped})
+                connection.dropped = 0
+            else:
+                message = connection.pending.popleft()
+
+            try:
+                await asyncio.wait_for(connection.websocket.send_text(message), settings.WEBSOCKET_SEND_TIMEOUT)
+            except asyncio.TimeoutError:
+                return "slow"
+            except Exception:
+                # 连接已断开，由接收循环或调用方清理
+                return "client"
+            if message is not _PING:
+                metrics.inc("websocket_messages_total", outcome="sent")
+        return connection.closing
+
+    def close_all(self) -> None:
+        """通知所有连接关闭（服务停止时调用）"""
+        for connections in self._connections.values():
+            for connection in connections:
+                connection.close("shutdown")
+
+
+# 全局WebSocket连接中心
+websocket_hub = WebSocketHub()
@@ -5,7 +5,7 @@ Todo List Plus FastAPI主应用
 
 import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI, Request, Response, WebSocket, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
@@ -76,7 +76,7 @@ async def close_redis():
     """关闭Redis连接"""
     try:
         from app.core.cache import cache_manager
-        await cache_manager.close()
+        await cache_manager.disconnect()
         logger.info("Redis连接已关闭")
     except Exception as e:
         logger.error(f"关闭Redis连接失败: {e}")
@@ -87,16 +87,65 @@ async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时初始化
     logger.info("🚀 启动 Todo List Plus 后端服务...")
+    background_tasks = []
     
     try:
         # 初始化Redis连接
         logger.info("初始化Redis连接...")
         await init_redis()
         
+        # 加载令牌吊销列表
+        from app.core.revocation import token_revocation
+        await token_revocation.start()
+        
+        # 令牌或会话被吊销时关闭对应的WebSocket连接
+        if settings.WEBSOCKET_ENABLED:
+            from app.core.websocket_hub import websocket_hub
+            await websocket_hub.start()
+        
         # 初始化数据库
         logger.info("初始化数据库连接...")
         await init_database()
         
+        # 启动只读副本健康检查
+        from app.core.db_routing import replica_set
+        if replica_set.enabled:
+            background_tasks.append(asyncio.create_task(
+                replica_set.run_health_checks(settings.DATABASE_REPLICA_CHECK_INTERVAL)
+            ))
+        
+        # 启动计数器对账任务
+        if settings.COUNTER_RECONCILE_INTERVAL > 0:
+            from app.core.database import db_manager
+            from app.services.counter_service import counter_service
+            background_tasks.append(asyncio.create_task(
+                counter_service.run_reconciliation(db_manager.get_session, settings.COUNTER_RECONCILE_INTERVAL)
+            ))
+        
+        # 启动活动日志和登录日志缓冲写入
+        if settings.ACTIVITY_LOG_BUFFERED:
+            from app.core.database import db_manager
+            from app.services.auth_service import login_log_writer
+            from app.services.task_service import activity_writer
+            if db_manager.is_connected:
+                activity_writer.start(db_manager.get_session)
+                login_log_writer.start(db_manager.get_session)
+        
+        # 启动通知投递工作池
+        if settings.NOTIFICATION_DELIVERY_WORKERS > 0:
+            from app.core.database import db_manager
+            from app.services.notification_dispatcher import notification_dispatcher
+            if db_manager.is_connected:
+                notification_dispatcher.start(db_manager.get_session)
+        
+        # 启动用户会话写回任务
+        if settings.SESSION_WRITE_BEHIND_INTERVAL > 0:
+            from app.core.database import db_manager
+            from app.services.session_service import session_service
+            background_tasks.append(asyncio.create_task(
+                session_service.run_write_behind(db_manager.get_session, settings.SESSION_WRITE_BEHIND_INTERVAL)
+            ))
+        
         logger.info("✅ 服务初始化完成")
         
     except Exception as e:
@@ -108,6 +157,40 @@ async def lifespan(app: FastAPI):
     # 关闭时清理资源
     logger.info("🔄 关闭服务，清理资源...")
     
+    # 关闭WebSocket连接
+    from app.core.websocket_hub import websocket_hub
+    websocket_hub.close_all()
+    
+    # 写完缓冲中的活动日志和登录日志
+    from app.services.auth_service import login_log_writer
+    from app.services.task_service import activity_writer
+    await activity_writer.stop()
+    await login_log_writer.stop()
+    
+    # 投递完队列中的通知
+    from app.services.notification_dispatcher import notification_dispatcher
+    await notification_dispatcher.stop()
+    
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    
+    # 写回Redis中尚未同步的用户会话
+    try:
+        from app.core.database import db_manager
+        from app.services.session_service import session_service
+        if db_manager.is_connected:
+            await session_service.flush(db_manager.get_session)
+    except Exception as e:
+        logger.error(f"会话写回失败: {e}")
+    
+    await websocket_hub.stop()
+    from app.core.revocation import token_revocation
+    await token_revocation.stop()
+    
+    from app.core.security import password_hasher
+    password_hasher.shutdown()
+    
     try:
         await close_redis()
         logger.info("✅ 资源清理完成")
@@ -146,25 +229,33 @@ app.add_middleware(
 # 简化的请求日志中间件
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """记录请求日志和性能指标"""
+    """记录请求日志和性能指标（包括请求中执行的SQL语句数和数据库耗时）"""
+    from app.core.query_stats import track_request
+    
     start_time = time.time()
     
-    try:
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        
-        # 简化的日志记录
-        logger.info(f"{request.method} {request.url.path} - {response.status_code} - {process_time:.4f}s")
-        
-        # 添加性能头
-        response.headers["X-Process-Time"] = str(process_time)
-        
-        return response
-        
-    except Exception as e:
-        process_time = time.time() - start_time
-        logger.error(f"请求处理异常: {e}")
-        raise
+    with track_request(request.method, request.url.path) as query_stats:
+        try:
+            response = await call_next(request)
+            process_time = time.time() - start_time
+            
+            # 简化的日志记录
+            logger.info(
+                f"{request.method} {request.url.path} - {response.status_code} - {process_time:.4f}s"
+                f" - db: {query_stats.count} queries {query_stats.duration:.4f}s"
+            )
+            for statement, duration in query_stats.slow:
+                logger.warning(f"慢查询 {duration:.3f}s: {statement[:500]}")
+            
+            # 添加性能头
+            response.headers["X-Process-Time"] = str(process_time)
+            
+            return response
+            
+        except Exception as e:
+            process_time = time.time() - start_time
+            logger.error(f"请求处理异常: {e}")
+            raise
 
 
 # 全局异常处理器
@@ -330,6 +421,53 @@ async def app_info():
     }
 
 
+# 指标端点
+@app.get("/metrics", tags=["系统信息"])
+async def app_metrics():
+    """获取应用运行指标"""
+    if not settings.METRICS_ENABLED:
+        return JSONResponse(
+            content={"error": True, "message": "指标收集未启用", "status_code": 404},
+            status_code=404
+        )
+    
+    from app.core.cache import cache_manager
+    from app.core.metrics import metrics
+    
+    return {
+        "cache": cache_manager.get_stats(),
+        **metrics.snapshot(),
+        "timestamp": time.time()
+    }
+
+
+# 实时通知推送
+if settings.WEBSOCKET_ENABLED:
+    @app.websocket("/ws/notifications")
+    async def notifications_websocket(websocket: WebSocket, token: str = None):
+        """实时通知推送（浏览器无法设置请求头，通过查询参数 token 传递访问令牌）"""
+        from app.core.database import db_manager
+        from app.core.websocket_hub import websocket_hub
+        from app.services.auth_service import auth_service
+        
+        if not token:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        
+        try:
+            # 只在认证时占用数据库会话，不随连接长期持有
+            async with db_manager.get_session() as db:
+                user = await auth_service.get_current_user(token, db)
+            token_id = auth_service.token_id(auth_service.verify_token(token), token)
+        except Exception as e:
+            logger.warning(f"WebSocket认证失败: {e}")
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        
+        # 令牌吊销或会话禁用时连接以 1008 关闭
+        await websocket_hub.serve(websocket, user.id, token_id)
+
+
 # 开发服务器启动
 if __name__ == "__main__":
     uvicorn.run(
@@ -26,6 +26,8 @@ from app.models.notification import (
     NotificationStatus,
 )
 
+from app.models.counter import UserCounter
+
 # 导出所有模型类
 __all__ = [
     # 用户相关模型
@@ -47,4 +49,7 @@ __all__ = [
     "NotificationType",
     "NotificationPriority",
     "NotificationStatus",
+    
+    # 计数器模型
+    "UserCounter",
 ]
\ No newline at end of file
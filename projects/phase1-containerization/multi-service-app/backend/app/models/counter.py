@@ -0,0 +1,48 @@
+"""
+用户计数器数据模型
+"""
+
+from sqlalchemy import String, DateTime, Integer, BigInteger, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+from datetime import datetime
+
+from app.core.database import Base
+
+
+class UserCounter(Base):
+    """用户计数器模型（每个用户每个计数项一行，随任务和通知的变更增量维护）"""
+
+    __tablename__ = "user_counters"
+
+    # 联合主键
+    user_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+        comment="用户ID"
+    )
+    counter: Mapped[str] = mapped_column(
+        String(50),
+        primary_key=True,
+        comment="计数项名称"
+    )
+
+    # 计数值
+    value: Mapped[int] = mapped_column(
+        BigInteger,
+        default=0,
+        nullable=False,
+        comment="计数值"
+    )
+
+    # 时间戳
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        comment="更新时间"
+    )
+
+    def __repr__(self):
+        return f"<UserCounter(user_id={self.user_id}, counter='{self.counter}', value={self.value})>"
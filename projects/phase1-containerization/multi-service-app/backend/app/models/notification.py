@@ -2,7 +2,7 @@
 通知数据模型
 """
 
-from sqlalchemy import String, Boolean, DateTime, Integer, Text, ForeignKey, Enum
+from sqlalchemy import String, Boolean, DateTime, Integer, Text, ForeignKey, Enum, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -10,6 +10,7 @@ from typing import Optional, TYPE_CHECKING
 import enum
 
 from app.core.database import Base
+from app.core.search import register_searchable
 
 if TYPE_CHECKING:
     from app.models.user import User
@@ -53,6 +54,16 @@ class Notification(Base):
     """通知模型"""
     
     __tablename__ = "notifications"
+    __table_args__ = (
+        # 搜索：ILIKE 子串匹配使用的三元组索引（仅PostgreSQL，需要 pg_trgm 扩展，见迁移 0004）
+        Index("idx_notifications_search_trgm", "title", "message", postgresql_using="gin",
+              postgresql_ops={"title": "gin_trgm_ops", "message": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        # 列表查询：按用户过滤未删除的通知，按创建时间倒序扫描（仅PostgreSQL，见迁移 0003）
+        Index("idx_notifications_user_created", "user_id", "created_at", "id",
+              postgresql_where=text("is_deleted = false")).ddl_if(dialect="postgresql"),
+        Index("idx_notifications_user_unread", "user_id", "created_at", "id",
+              postgresql_where=text("is_deleted = false AND is_read = false")).ddl_if(dialect="postgresql"),
+    )
     
     # 主键
     id: Mapped[int] = mapped_column(
@@ -566,4 +577,8 @@ class NotificationSetting(Base):
             "websocket_enabled": self.websocket_enabled,
             "quiet_hours_start": self.quiet_hours_start,
             "quiet_hours_end": self.quiet_hours_end,
-        }
\ No newline at end of file
+        }
+
+
+# 注册搜索字段及权重
+register_searchable(Notification, {"title": "A", "message": "B"})
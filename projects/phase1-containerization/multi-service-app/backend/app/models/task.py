@@ -2,7 +2,7 @@
 任务数据模型
 """
 
-from sqlalchemy import String, Boolean, DateTime, Integer, Text, ForeignKey, Enum
+from sqlalchemy import String, Boolean, DateTime, Integer, Text, ForeignKey, Enum, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -10,6 +10,7 @@ from typing import Optional, TYPE_CHECKING
 import enum
 
 from app.core.database import Base
+from app.core.search import register_searchable
 
 if TYPE_CHECKING:
     from app.models.user import User
@@ -36,6 +37,21 @@ class Task(Base):
     """任务模型"""
     
     __tablename__ = "tasks"
+    __table_args__ = (
+        # 搜索：ILIKE 子串匹配使用的三元组索引（仅PostgreSQL，需要 pg_trgm 扩展，见迁移 0004）
+        Index("idx_tasks_search_trgm", "title", "description", "notes", postgresql_using="gin",
+              postgresql_ops={"title": "gin_trgm_ops", "description": "gin_trgm_ops", "notes": "gin_trgm_ops"}
+              ).ddl_if(dialect="postgresql"),
+        # 列表查询：按所有者过滤未删除的任务，按 keyset 分页的排序扫描（仅PostgreSQL，见迁移 0003）
+        Index("idx_tasks_owner_created", "owner_id", "created_at", "id",
+              postgresql_where=text("is_deleted = false")).ddl_if(dialect="postgresql"),
+        Index("idx_tasks_owner_updated", "owner_id", "updated_at", "id",
+              postgresql_where=text("is_deleted = false")).ddl_if(dialect="postgresql"),
+        Index("idx_tasks_owner_due_date_active", "owner_id", "due_date", "id",
+              postgresql_where=text("is_deleted = false")).ddl_if(dialect="postgresql"),
+        Index("idx_tasks_owner_priority", "owner_id", "priority", "id",
+              postgresql_where=text("is_deleted = false")).ddl_if(dialect="postgresql"),
+    )
     
     # 主键
     id: Mapped[int] = mapped_column(
@@ -476,4 +492,8 @@ class TaskActivity(Base):
             "new_value": self.new_value,
             "metadata": self.meta_data,
             "created_at": self.created_at.isoformat() if self.created_at else None,
-        }
\ No newline at end of file
+        }
+
+
+# 注册搜索字段及权重
+register_searchable(Task, {"title": "A", "description": "B", "notes": "C"})
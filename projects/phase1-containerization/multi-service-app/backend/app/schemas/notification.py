@@ -149,6 +149,8 @@ class NotificationListParams(BaseModel):
     page_size: int = Field(20, ge=1, le=100, description="每页数量")
     sort_by: Optional[str] = Field("created_at", description="排序字段")
     sort_order: Optional[str] = Field("desc", pattern="^(asc|desc)$", description="排序方向")
+    cursor: Optional[str] = Field(None, description="分页游标（传入时使用游标分页，忽略页码）")
+    include_total: bool = Field(True, description="是否返回精确总数")
 
 
 # 通知模板模型
@@ -121,6 +121,11 @@ class PasswordChange(BaseModel):
         return v
 
 
+class SessionRevoke(BaseModel):
+    """批量禁用会话模式"""
+    user_ids: List[int] = Field(..., min_items=1, max_items=1000, description="用户ID列表")
+
+
 class UserProfile(BaseModel):
     """用户资料模式"""
     username: str
@@ -3,25 +3,47 @@
 处理用户认证、注册、登录相关业务逻辑
 """
 
+import hashlib
+import time
+import uuid
 import jwt
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from fastapi import HTTPException, status
-from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, or_
 
+from app.core.buffered_writer import BufferedWriter
 from app.core.config import get_settings
-from app.core.cache import cache_manager
-from app.models.user import User, UserSession, UserLoginLog
+from app.core.cache import cache_manager, LocalCache
+from app.core.metrics import metrics
+from app.core.revocation import token_revocation
+from app.core.security import password_hasher
+from app.models.user import User, UserLoginLog
 from app.schemas.user import UserCreate, UserLogin, UserResponse, TokenResponse
+from app.services.session_service import session_service
 from app.utils.logger import setup_logger
 
 settings = get_settings()
 logger = setup_logger(__name__)
 
-# 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 登录日志写入器（由应用生命周期启动；未启动时同步写入）
+login_log_writer = BufferedWriter(
+    "user_login_log",
+    UserLoginLog,
+    batch_size=settings.ACTIVITY_LOG_BATCH_SIZE,
+    flush_interval=settings.ACTIVITY_LOG_FLUSH_INTERVAL,
+    max_queue_size=settings.ACTIVITY_LOG_QUEUE_SIZE
+)
+
+# 认证缓存时间（秒）
+PRINCIPAL_CACHE_TTL = 3600
+# 用户版本号的存活时间，需大于认证缓存时间
+PRINCIPAL_VERSION_TTL = 86400
+# 认证缓存中需要还原为 datetime 的字段
+PRINCIPAL_DATETIME_FIELDS = (
+    "last_login", "created_at", "updated_at", "locked_until", "password_changed_at", "email_verified_at"
+)
 
 
 class AuthService:
@@ -29,14 +51,23 @@ class AuthService:
     
     def __init__(self):
         self.settings = settings
+        # 已验证令牌的解码缓存（令牌摘要 -> 声明），黑名单仍在每次请求时检查
+        self._token_cache: Optional[LocalCache] = None
+        if settings.JWT_DECODE_CACHE_SIZE > 0:
+            self._token_cache = LocalCache(
+                max_items=settings.JWT_DECODE_CACHE_SIZE,
+                max_bytes=settings.JWT_DECODE_CACHE_SIZE * 2048,
+                default_ttl=settings.JWT_DECODE_CACHE_TTL,
+                tier="jwt"
+            )
         
-    def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        """验证密码"""
-        return pwd_context.verify(plain_password, hashed_password)
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        """验证密码（在密码哈希线程池中执行）"""
+        return await password_hasher.verify(plain_password, hashed_password)
     
-    def get_password_hash(self, password: str) -> str:
-        """获取密码哈希"""
-        return pwd_context.hash(password)
+    async def get_password_hash(self, password: str) -> str:
+        """获取密码哈希（在密码哈希线程池中执行）"""
+        return await password_hasher.hash(password)
     
     def create_access_token(self, data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
         """创建访问令牌"""
@@ -46,7 +77,7 @@ class AuthService:
         else:
             expire = datetime.utcnow() + timedelta(minutes=self.settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         
-        to_encode.update({"exp": expire, "type": "access"})
+        to_encode.update({"exp": expire, "type": "access", "jti": uuid.uuid4().hex})
         encoded_jwt = jwt.encode(to_encode, self.settings.SECRET_KEY, algorithm=self.settings.ALGORITHM)
         return encoded_jwt
     
@@ -54,14 +85,43 @@ class AuthService:
         """创建刷新令牌"""
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(days=self.settings.REFRESH_TOKEN_EXPIRE_DAYS)
-        to_encode.update({"exp": expire, "type": "refresh"})
+        to_encode.update({"exp": expire, "type": "refresh", "jti": uuid.uuid4().hex})
         encoded_jwt = jwt.encode(to_encode, self.settings.SECRET_KEY, algorithm=self.settings.ALGORITHM)
         return encoded_jwt
     
+    def _decode_token(self, token: str) -> Dict[str, Any]:
+        """解码并校验令牌签名，结果按令牌摘要缓存到过期时间（或缓存上限时间）"""
+        digest = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        if self._token_cache is not None:
+            found, payload = self._token_cache.get(digest)
+            if found:
+                metrics.inc("jwt_decode_cache_total", outcome="hit")
+                return payload
+            metrics.inc("jwt_decode_cache_total", outcome="miss")
+        
+        payload = jwt.decode(token, self.settings.SECRET_KEY, algorithms=[self.settings.ALGORITHM])
+        
+        exp = payload.get("exp")
+        if self._token_cache is not None and exp:
+            ttl = int(exp - time.time())
+            if ttl > 0:
+                self._token_cache.set(digest, payload, ttl=ttl)
+        return payload
+    
+    @staticmethod
+    def token_id(payload: Dict[str, Any], token: str) -> str:
+        """令牌ID（jti）；旧令牌没有jti时使用令牌摘要"""
+        return payload.get("jti") or hashlib.sha256(token.encode("utf-8")).hexdigest()
+    
+    def forget_token(self, token: str):
+        """从解码缓存中移除令牌（登出时调用）"""
+        if self._token_cache is not None:
+            self._token_cache.delete(hashlib.sha256(token.encode("utf-8")).hexdigest())
+    
     def verify_token(self, token: str, token_type: str = "access") -> Dict[str, Any]:
         """验证令牌"""
         try:
-            payload = jwt.decode(token, self.settings.SECRET_KEY, algorithms=[self.settings.ALGORITHM])
+            payload = self._decode_token(token)
             
             # 检查令牌类型
             if payload.get("type") != token_type:
@@ -103,7 +163,7 @@ class AuthService:
                 )
             
             # 创建新用户
-            hashed_password = self.get_password_hash(user_data.password)
+            hashed_password = await self.get_password_hash(user_data.password)
             new_user = User(
                 username=user_data.username,
                 email=user_data.email,
@@ -170,7 +230,7 @@ class AuthService:
                 )
             
             # 验证密码
-            if not self.verify_password(login_data.password, user.hashed_password):
+            if not await self.verify_password(login_data.password, user.hashed_password):
                 # 增加失败登录次数
                 user.failed_login_attempts += 1
                 
@@ -191,7 +251,7 @@ class AuthService:
             user.failed_login_attempts = 0
             user.locked_until = None
             user.last_login = datetime.utcnow()
-            await db.commit()
+            # 由请求结束时的 get_db 统一提交，不在登录路径上单独提交
             
             return user
             
@@ -216,28 +276,23 @@ class AuthService:
             access_token = self.create_access_token(token_data)
             refresh_token = self.create_refresh_token(token_data)
             
-            # 记录登录日志
-            login_log = UserLoginLog(
-                user_id=user.id,
-                username=user.username,
-                email=user.email,
-                login_successful=True,
-                ip_address=ip_address,
-                user_agent=user_agent
-            )
-            db.add(login_log)
-            
-            # 创建用户会话
-            session = UserSession(
-                session_id=f"session_{user.id}_{datetime.utcnow().timestamp()}",
-                user_id=user.id,
-                ip_address=ip_address,
-                user_agent=user_agent,
-                expires_at=datetime.utcnow() + timedelta(days=self.settings.REFRESH_TOKEN_EXPIRE_DAYS)
+            # 记录登录日志（缓冲批量写入）
+            await login_log_writer.write(
+                {
+                    "user_id": user.id,
+                    "username": user.username,
+                    "email": user.email,
+                    "login_successful": True,
+                    "ip_address": ip_address,
+                    "user_agent": user_agent
+                },
+                db=db
             )
-            db.add(session)
             
-            await db.commit()
+            # 创建用户会话（保存在Redis中，定期写回数据库）
+            await session_service.create_session(
+                user.id, db, ip_address=ip_address, user_agent=user_agent
+            )
             
             # 缓存用户信息
             await cache_manager.set_json(
@@ -259,15 +314,16 @@ class AuthService:
         except HTTPException:
             # 记录失败的登录尝试
             try:
-                login_log = UserLoginLog(
-                    username=login_data.username,
-                    login_successful=False,
-                    failure_reason="Invalid credentials",
-                    ip_address=ip_address,
-                    user_agent=user_agent
+                await login_log_writer.write(
+                    {
+                        "username": login_data.username,
+                        "login_successful": False,
+                        "failure_reason": "Invalid credentials",
+                        "ip_address": ip_address,
+                        "user_agent": user_agent
+                    },
+                    db=db
                 )
-                db.add(login_log)
-                await db.commit()
             except:
                 pass
             raise
@@ -318,21 +374,72 @@ class AuthService:
                 detail="刷新令牌失败"
             )
     
+    @staticmethod
+    def _principal_key(user_id: int) -> str:
+        return f"principal:{user_id}"
+    
+    @staticmethod
+    def _version_key(user_id: int) -> str:
+        return f"user_ver:{user_id}"
+    
+    @staticmethod
+    def _principal_to_cache(user: User, version: int) -> Dict[str, Any]:
+        """已认证用户的缓存形式（不包含密码哈希）"""
+        return {"ver": version, "user": user.to_dict(include_sensitive=True)}
+    
+    @staticmethod
+    def _principal_from_cache(data: Dict[str, Any]) -> User:
+        """从缓存重建用户对象（游离状态，不属于任何会话，只用于读取）"""
+        fields = dict(data)
+        for name in PRINCIPAL_DATETIME_FIELDS:
+            if fields.get(name):
+                fields[name] = datetime.fromisoformat(fields[name])
+        return User(**fields)
+    
+    async def invalidate_principal(self, user_id: int):
+        """递增用户版本号，使已缓存的认证信息失效
+        
+        用户资料变更、禁用、修改密码和登出时调用。
+        """
+        try:
+            async with cache_manager.pipeline() as pipe:
+                pipe.incr(self._version_key(user_id))
+                pipe.expire(self._version_key(user_id), PRINCIPAL_VERSION_TTL)
+        except Exception as e:
+            logger.error(f"使认证缓存失效失败: {e}")
+    
     async def get_current_user(self, token: str, db: AsyncSession) -> User:
-        """根据令牌获取当前用户"""
+        """根据令牌获取当前用户
+        
+        认证缓存、用户版本号和令牌黑名单通过一次MGET读取；
+        缓存的版本号与当前版本号一致时直接返回，不查询数据库。
+        """
         try:
             # 验证令牌
             payload = self.verify_token(token)
             user_id = int(payload.get("sub"))
             
-            # 先从缓存获取用户信息
-            cached_user = await cache_manager.get_json(f"user:{user_id}")
-            if cached_user:
-                # 从数据库获取最新用户信息以确保准确性
-                user_query = await db.execute(select(User).where(User.id == user_id))
-                user = user_query.scalar_one_or_none()
-                if user and user.is_active:
-                    return user
+            principal_key = self._principal_key(user_id)
+            version_key = self._version_key(user_id)
+            keys = [principal_key, version_key]
+            # 布隆过滤器判定可能已吊销时才需要在Redis中确认
+            revoked_key = token_revocation.check_key(self.token_id(payload, token))
+            if revoked_key:
+                keys.append(revoked_key)
+            cached = await cache_manager.get_many(keys)
+            
+            if revoked_key and cached[revoked_key]:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="令牌已失效"
+                )
+            
+            version = int(cached[version_key] or 0)
+            principal = cached[principal_key]
+            if isinstance(principal, dict) and principal.get("ver") == version:
+                metrics.inc("principal_cache_total", outcome="hit")
+                return self._principal_from_cache(principal["user"])
+            metrics.inc("principal_cache_total", outcome="miss")
             
             # 从数据库获取用户信息
             user_query = await db.execute(select(User).where(User.id == user_id))
@@ -350,11 +457,11 @@ class AuthService:
                     detail="用户已被禁用"
                 )
             
-            # 更新缓存
+            # 按读取到的版本号写入缓存，期间发生的失效会使该缓存在下次读取时被丢弃
             await cache_manager.set_json(
-                f"user:{user.id}",
-                user.to_dict(),
-                expire=3600
+                principal_key,
+                self._principal_to_cache(user, version),
+                expire=PRINCIPAL_CACHE_TTL
             )
             
             return user
@@ -374,35 +481,19 @@ class AuthService:
             # 获取当前用户
             user = await self.get_current_user(token, db)
             
-            # 将令牌加入黑名单（使用Redis缓存）
+            # 吊销令牌（记录保留到令牌过期）
             payload = self.verify_token(token)
             exp = payload.get("exp")
             if exp:
-                # 计算令牌剩余有效时间
-                remaining_time = datetime.fromtimestamp(exp) - datetime.utcnow()
-                if remaining_time.total_seconds() > 0:
-                    await cache_manager.set(
-                        f"blacklist_token:{token}",
-                        "true",
-                        expire=int(remaining_time.total_seconds())
-                    )
+                await token_revocation.revoke(self.token_id(payload, token), exp)
             
             # 清除用户缓存
             await cache_manager.delete(f"user:{user.id}")
+            await self.invalidate_principal(user.id)
+            self.forget_token(token)
             
-            # 禁用相关会话
-            await db.execute(
-                select(UserSession).where(
-                    and_(UserSession.user_id == user.id, UserSession.is_active == True)
-                )
-            )
-            sessions = await db.execute(
-                select(UserSession).where(
-                    and_(UserSession.user_id == user.id, UserSession.is_active == True)
-                )
-            )
-            for session in sessions.scalars():
-                session.is_active = False
+            # 禁用相关会话（Redis中尚未写回的会话和数据库中的会话）
+            await session_service.revoke_user_sessions([user.id], db)
             
             await db.commit()
             
@@ -413,25 +504,50 @@ class AuthService:
             logger.error(f"用户登出失败: {e}")
             return False
     
+    async def revoke_sessions(self, user_ids: List[int], db: AsyncSession) -> int:
+        """批量禁用用户的所有会话（管理员操作）"""
+        try:
+            revoked = await session_service.revoke_user_sessions(user_ids, db)
+            await db.commit()
+            
+            # 使这些用户已缓存的认证信息失效
+            for user_id in set(user_ids):
+                await self.invalidate_principal(user_id)
+            
+            logger.info(f"禁用 {len(set(user_ids))} 个用户的 {revoked} 个会话")
+            return revoked
+            
+        except Exception as e:
+            logger.error(f"批量禁用会话失败: {e}")
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="批量禁用会话失败"
+            )
+    
     async def change_password(self, user: User, current_password: str, 
                             new_password: str, db: AsyncSession) -> bool:
         """修改密码"""
         try:
+            # 当前用户可能来自认证缓存（不含密码哈希），需在本会话中加载
+            db_user = await db.get(User, user.id)
+            
             # 验证当前密码
-            if not self.verify_password(current_password, user.hashed_password):
+            if not db_user or not await self.verify_password(current_password, db_user.hashed_password):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="当前密码错误"
                 )
             
             # 更新密码
-            user.hashed_password = self.get_password_hash(new_password)
-            user.password_changed_at = datetime.utcnow()
+            db_user.hashed_password = await self.get_password_hash(new_password)
+            db_user.password_changed_at = datetime.utcnow()
             
             await db.commit()
             
             # 清除用户缓存
             await cache_manager.delete(f"user:{user.id}")
+            await self.invalidate_principal(user.id)
             
             logger.info(f"用户 {user.username} 修改密码成功")
             return True
@@ -0,0 +1,337 @@
+"""
+用户计数器服务
+在任务和通知变更时增量维护 user_counters，统计接口只需读取计数器
+
+增量在 Session 的 after_flush 事件中根据属性变更历史计算，并在同一事务中写入，
+因此覆盖所有写入路径（创建、单个/批量更新、软删除、永久删除、状态流转）。
+依赖当前时间的统计（过期、即将到期）无法增量维护，仍在查询时计算。
+对账任务定期按实际数据重算计数器，修复异常路径导致的漂移。
+"""
+
+import asyncio
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, event, func, inspect, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.cache import cache_manager
+from app.core.metrics import metrics
+from app.models.counter import UserCounter
+from app.models.notification import Notification, NotificationPriority, NotificationStatus, NotificationType
+from app.models.task import Task, TaskPriority, TaskStatus
+from app.models.user import User
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 按类型分组的通知
+TASK_NOTIFICATION_TYPES = (
+    NotificationType.TASK_CREATED,
+    NotificationType.TASK_UPDATED,
+    NotificationType.TASK_COMPLETED,
+    NotificationType.TASK_OVERDUE,
+    NotificationType.TASK_DUE_SOON,
+)
+SYSTEM_NOTIFICATION_TYPES = (
+    NotificationType.SYSTEM_MAINTENANCE,
+    NotificationType.SYSTEM_UPDATE,
+)
+# 单独计数的通知状态
+COUNTED_NOTIFICATION_STATUSES = (
+    NotificationStatus.PENDING,
+    NotificationStatus.SENT,
+    NotificationStatus.FAILED,
+)
+
+# 参与计数的字段（变更这些字段才会影响计数器）
+_TASK_FIELDS = ("owner_id", "status", "priority", "is_starred", "is_archived", "is_deleted")
+_NOTIFICATION_FIELDS = ("user_id", "status", "priority", "notification_type", "is_read", "is_archived", "is_deleted")
+
+
+# 单行数据对计数器的贡献（增量维护使用）
+# 与下方的 SQL 计数表达式（对账使用）一一对应，修改时需同步
+def task_contribution(values: Dict[str, Any]) -> Dict[str, int]:
+    """一个任务对其所有者计数器的贡献"""
+    if values.get("is_deleted"):
+        return {}
+
+    status = TaskStatus(values.get("status") or TaskStatus.PENDING)
+    priority = TaskPriority(values.get("priority") or TaskPriority.MEDIUM)
+    result = {"total_tasks": 1, f"{priority.value}_priority_tasks": 1}
+    # 归档按 is_archived 标记统计
+    if status != TaskStatus.ARCHIVED:
+        result[f"{status.value}_tasks"] = 1
+    if values.get("is_archived"):
+        result["archived_tasks"] = 1
+    if values.get("is_starred"):
+        result["starred_tasks"] = 1
+    return result
+
+
+def notification_contribution(values: Dict[str, Any]) -> Dict[str, int]:
+    """一条通知对其接收者计数器的贡献"""
+    if values.get("is_deleted"):
+        return {}
+
+    status = NotificationStatus(values.get("status") or NotificationStatus.PENDING)
+    priority = NotificationPriority(values.get("priority") or NotificationPriority.MEDIUM)
+    notification_type = values.get("notification_type")
+    result = {"total_notifications": 1, f"{priority.value}_priority": 1}
+    if not values.get("is_read"):
+        result["unread_notifications"] = 1
+    if values.get("is_archived"):
+        result["archived_notifications"] = 1
+    if status in COUNTED_NOTIFICATION_STATUSES:
+        result[f"{status.value}_notifications"] = 1
+    if notification_type in TASK_NOTIFICATION_TYPES:
+        result["task_notifications"] = 1
+    elif notification_type in SYSTEM_NOTIFICATION_TYPES:
+        result["system_notifications"] = 1
+    elif notification_type == NotificationType.SECURITY_ALERT:
+        result["security_notifications"] = 1
+    return result
+
+
+def task_count_columns() -> Dict[str, Any]:
+    """任务计数项的SQL条件聚合表达式"""
+    columns = {
+        "total_tasks": func.count(),
+        "pending_tasks": func.count().filter(Task.status == TaskStatus.PENDING),
+        "in_progress_tasks": func.count().filter(Task.status == TaskStatus.IN_PROGRESS),
+        "completed_tasks": func.count().filter(Task.status == TaskStatus.COMPLETED),
+        "cancelled_tasks": func.count().filter(Task.status == TaskStatus.CANCELLED),
+        "archived_tasks": func.count().filter(Task.is_archived == True),
+        "starred_tasks": func.count().filter(Task.is_starred == True),
+    }
+    for priority in TaskPriority:
+        columns[f"{priority.value}_priority_tasks"] = func.count().filter(Task.priority == priority)
+    return columns
+
+
+def notification_count_columns() -> Dict[str, Any]:
+    """通知计数项的SQL条件聚合表达式"""
+    columns = {
+        "total_notifications": func.count(),
+        "unread_notifications": func.count().filter(Notification.is_read == False),
+        "archived_notifications": func.count().filter(Notification.is_archived == True),
+        "task_notifications": func.count().filter(Notification.notification_type.in_(TASK_NOTIFICATION_TYPES)),
+        "system_notifications": func.count().filter(Notification.notification_type.in_(SYSTEM_NOTIFICATION_TYPES)),
+        "security_notifications": func.count().filter(
+            Notification.notification_type == NotificationType.SECURITY_ALERT
+        ),
+    }
+    for notification_status in COUNTED_NOTIFICATION_STATUSES:
+        columns[f"{notification_status.value}_notifications"] = func.count().filter(
+            Notification.status == notification_status
+        )
+    for priority in NotificationPriority:
+        columns[f"{priority.value}_priority"] = func.count().filter(Notification.priority == priority)
+    return columns
+
+
+TASK_COUNTERS = tuple(task_count_columns())
+NOTIFICATION_COUNTERS = tuple(notification_count_columns())
+
+
+def _current_values(obj, fields: Iterable[str]) -> Dict[str, Any]:
+    # 直接读取实例字典，避免在flush事件中触发延迟加载
+    state = inspect(obj)
+    return {key: state.dict.get(key) for key in fields}
+
+
+def _previous_values(obj, fields: Iterable[str]) -> Optional[Dict[str, Any]]:
+    """flush前的字段值；变更前的值未加载时返回None（交由对账修复）"""
+    state = inspect(obj)
+    values = {}
+    for key in fields:
+        history = state.attrs[key].history
+        if history.deleted:
+            values[key] = history.deleted[0]
+        elif history.added:
+            return None
+        else:
+            values[key] = state.dict.get(key)
+    return values
+
+
+_TRACKED = (
+    (Task, _TASK_FIELDS, "owner_id", task_contribution),
+    (Notification, _NOTIFICATION_FIELDS, "user_id", notification_contribution),
+)
+
+
+def collect_deltas(session: Session) -> Dict[Tuple[int, str], int]:
+    """根据会话中待写入的变更计算计数器增量"""
+    deltas: Dict[Tuple[int, str], int] = defaultdict(int)
+
+    def add(values: Optional[Dict[str, Any]], owner_key: str, contribution, sign: int):
+        if not values or values.get(owner_key) is None:
+            return
+        for name, value in contribution(values).items():
+            deltas[(values[owner_key], name)] += sign * value
+
+    for model, fields, owner_key, contribution in _TRACKED:
+        for obj in session.new:
+            if isinstance(obj, model):
+                add(_current_values(obj, fields), owner_key, contribution, 1)
+
+        for obj in session.dirty:
+            if not isinstance(obj, model) or obj in session.deleted:
+                continue
+            previous = _previous_values(obj, fields)
+            if previous is None:
+                logger.warning(f"计数器增量无法计算，等待对账修复: {obj!r}")
+                continue
+            add(previous, owner_key, contribution, -1)
+            add(_current_values(obj, fields), owner_key, contribution, 1)
+
+        for obj in session.deleted:
+            if isinstance(obj, model):
+                add(_previous_values(obj, fields), owner_key, contribution, -1)
+
+    return {key: value for key, value in deltas.items() if value}
+
+
+def contribution_deltas(
+    contribution,
+    owner_key: str,
+    before: Iterable[Dict[str, Any]],
+    after: Iterable[Dict[str, Any]]
+) -> Dict[Tuple[int, str], int]:
+    """根据一组行变更前后的字段值计算计数器增量（用于绕过ORM的批量语句）"""
+    deltas: Dict[Tuple[int, str], int] = defaultdict(int)
+    for sign, rows in ((-1, before), (1, after)):
+        for values in rows:
+            for name, value in contribution(values).items():
+                deltas[(values[owner_key], name)] += sign * value
+    return {key: value for key, value in deltas.items() if value}
+
+
+def _delta_rows(deltas: Dict[Tuple[int, str], int]) -> List[Dict[str, Any]]:
+    # 固定加锁顺序，避免并发事务互相等待
+    return [
+        {"user_id": user_id, "counter": name, "value": value}
+        for (user_id, name), value in sorted(deltas.items())
+    ]
+
+
+def _upsert_statement(rows: List[Dict[str, Any]], absolute: bool = False):
+    stmt = insert(UserCounter).values(rows)
+    value = stmt.excluded.value if absolute else UserCounter.value + stmt.excluded.value
+    return stmt.on_conflict_do_update(
+        index_elements=[UserCounter.user_id, UserCounter.counter],
+        set_={"value": value, "updated_at": func.now()}
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_counter_deltas(session: Session, flush_context):
+    """将本次flush产生的计数器增量写入同一事务"""
+    deltas = collect_deltas(session)
+    if deltas:
+        session.connection().execute(_upsert_statement(_delta_rows(deltas)))
+
+
+class CounterService:
+    """用户计数器服务类"""
+
+    async def apply_deltas(self, db: AsyncSession, deltas: Dict[Tuple[int, str], int]) -> None:
+        """在当前事务中写入计数器增量"""
+        if deltas:
+            await db.execute(_upsert_statement(_delta_rows(deltas)))
+
+    async def get_counters(self, user_id: int, db: AsyncSession) -> Dict[str, int]:
+        """读取用户的全部计数器"""
+        result = await db.execute(
+            select(UserCounter.counter, UserCounter.value).where(UserCounter.user_id == user_id)
+        )
+        return {name: value for name, value in result.all()}
+
+    async def compute_counters(self, user_id: int, db: AsyncSession) -> Dict[str, int]:
+        """按实际数据重新计算用户的计数器"""
+        task_columns = task_count_columns()
+        task_row = (await db.execute(
+            select(*[expr.label(name) for name, expr in task_columns.items()])
+            .where(and_(Task.owner_id == user_id, Task.is_deleted == False))
+        )).one()
+
+        notification_columns = notification_count_columns()
+        notification_row = (await db.execute(
+            select(*[expr.label(name) for name, expr in notification_columns.items()])
+            .where(and_(Notification.user_id == user_id, Notification.is_deleted == False))
+        )).one()
+
+        return {**task_row._mapping, **notification_row._mapping}
+
+    async def reconcile_user(self, user_id: int, db: AsyncSession) -> Dict[str, int]:
+        """对账单个用户，返回被修复的计数项及其正确值"""
+        # 锁住已有计数行：并发写入的增量会等待对账提交后再叠加，不会被覆盖
+        stored_result = await db.execute(
+            select(UserCounter.counter, UserCounter.value)
+            .where(UserCounter.user_id == user_id)
+            .with_for_update()
+        )
+        stored = {name: value for name, value in stored_result.all()}
+        actual = await self.compute_counters(user_id, db)
+
+        drift = {
+            name: actual.get(name, 0)
+            for name in set(stored) | set(actual)
+            if stored.get(name, 0) != actual.get(name, 0)
+        }
+        if drift:
+            rows = [
+                {"user_id": user_id, "counter": name, "value": value}
+                for name, value in sorted(drift.items())
+            ]
+            await db.execute(_upsert_statement(rows, absolute=True))
+        return drift
+
+    async def reconcile(self, db: AsyncSession, user_ids: Optional[List[int]] = None) -> int:
+        """对账：检测并修复计数器漂移，返回修复的计数项数量
+
+        每个用户单独提交，避免长时间持有计数行锁。
+        """
+        if user_ids is None:
+            result = await db.execute(select(User.id).order_by(User.id))
+            user_ids = list(result.scalars().all())
+
+        repaired = 0
+        for user_id in user_ids:
+            try:
+                drift = await self.reconcile_user(user_id, db)
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"用户 {user_id} 计数器对账失败: {e}")
+                continue
+
+            if drift:
+                repaired += len(drift)
+                metrics.inc("counter_drift_total", len(drift))
+                logger.warning(f"修复用户 {user_id} 的计数器漂移: {drift}")
+                await cache_manager.delete_many([f"task_stats:{user_id}", f"notification_stats:{user_id}"])
+
+        metrics.inc("counter_reconcile_runs_total")
+        return repaired
+
+    async def run_reconciliation(self, session_factory, interval: int):
+        """定期对账（通过分布式锁保证同一时刻只有一个实例执行）"""
+        while True:
+            token = await cache_manager.acquire_lock("counter_reconcile", expire=max(interval, 60))
+            # Redis不可用时各实例各自执行，对账本身是幂等的
+            if token or not cache_manager.is_connected:
+                try:
+                    async with session_factory() as db:
+                        repaired = await self.reconcile(db)
+                    logger.info(f"计数器对账完成，修复 {repaired} 项")
+                except Exception as e:
+                    logger.error(f"计数器对账失败: {e}")
+            await asyncio.sleep(interval)
+
+
+# 全局计数器服务实例
+counter_service = CounterService()
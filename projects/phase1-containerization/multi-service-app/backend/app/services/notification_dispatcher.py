@@ -0,0 +1,266 @@
+"""
+通知投递工作池
+批量发送的通知先写入数据库，再按批次交给后台工作协程投递：
+
+- 每次发送对应一个发送任务（job），投递进度保存在Redis中，任意进程都可以查询
+- 队列有上限，写满时调用方等待（背压）
+- 未启动（同步模式，用于测试或脚本）时在调用方的会话中直接投递
+- 停止时投递完队列中的剩余批次，超时未投递的通知保持待发送状态
+- 发送失败需要重试的通知不在原地等待：提交后记入Redis有序集合 notification:retry
+  （分值为最早重试时间），工作池定期认领到期的通知重新投递；Redis不可用时暂存在本进程中
+"""
+
+import asyncio
+import heapq
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import LocalCache, cache_manager
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.utils.logger import setup_logger
+
+settings = get_settings()
+logger = setup_logger(__name__)
+
+# 停止信号（每个工作协程一个，排在队列末尾）
+_STOP = object()
+
+# 待重试的通知（成员为通知ID，分值为最早重试时间戳）
+RETRY_KEY = "notification:retry"
+
+# 投递函数：投递一批通知，返回（成功数, 失败数, 需要重试的通知 {通知ID: 延迟秒数}），
+# 调用方负责提交，提交后再安排重试
+DeliverFunc = Callable[[List[int], AsyncSession], Awaitable[Tuple[int, int, Dict[int, float]]]]
+
+
+def _job_key(job_id: str) -> str:
+    return f"notification_job:{job_id}"
+
+
+class NotificationDispatcher:
+    """通知投递工作池"""
+
+    def __init__(self, workers: int, max_queue_size: int, job_ttl: int, retry_poll_interval: float):
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.job_ttl = job_ttl
+        self.retry_poll_interval = retry_poll_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._retry_task: Optional[asyncio.Task] = None
+        self._session_factory: Optional[Callable[[], AsyncSession]] = None
+        self._stopping = False
+        # 重试时使用的投递函数（由通知服务注册）
+        self._retry_deliver: Optional[DeliverFunc] = None
+        # Redis不可用时本进程暂存的重试（最早重试时间, 通知ID）
+        self._delayed: List[Tuple[float, int]] = []
+        # 本进程创建的发送任务（Redis不可用时用于查询进度）
+        self._jobs = LocalCache(
+            max_items=10000,
+            max_bytes=16 * 1024 * 1024,
+            default_ttl=job_ttl,
+            tier="notification_jobs"
+        )
+
+        metrics.register_gauge("notification_delivery_queue_depth", self.queue_depth)
+        metrics.register_gauge("notification_retry_local_pending", lambda: len(self._delayed))
+
+    @property
+    def running(self) -> bool:
+        """是否由后台工作协程投递"""
+        return any(not task.done() for task in self._tasks) and not self._stopping
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def register_deliver(self, deliver: DeliverFunc) -> None:
+        """注册重试时使用的投递函数"""
+        self._retry_deliver = deliver
+
+    def start(self, session_factory: Callable[[], AsyncSession]) -> None:
+        """启动投递工作协程"""
+        if self.running or self.workers <= 0:
+            return
+        self._session_factory = session_factory
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._retry_task = asyncio.create_task(self._poll_retries())
+        logger.info(f"通知投递工作池已启动（{self.workers} 个工作协程）")
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """停止工作池并投递完队列中的剩余批次"""
+        if not self._tasks:
+            return
+        self._stopping = True
+        if self._retry_task is not None:
+            self._retry_task.cancel()
+            try:
+                await self._retry_task
+            except asyncio.CancelledError:
+                pass
+            self._retry_task = None
+        try:
+            for _ in self._tasks:
+                await self._queue.put(_STOP)
+            await asyncio.wait_for(asyncio.gather(*self._tasks), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"通知投递工作池停止超时，{self.queue_depth()} 个批次未投递")
+            for task in self._tasks:
+                task.cancel()
+        finally:
+            self._tasks = []
+        logger.info("通知投递工作池已停止")
+
+    async def create_job(self, created_by: int, accepted: int, queued: int) -> Dict[str, Any]:
+        """创建发送任务：accepted 为写入的通知数，queued 为需要立即投递的通知数"""
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "created_by": created_by,
+            "accepted_count": accepted,
+            "queued_count": queued,
+            "sent_count": 0,
+            "failed_count": 0,
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        self._jobs.set(job["job_id"], job)
+        await cache_manager.set(_job_key(job["job_id"]), job, expire=self.job_ttl)
+        return job
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询发送任务进度"""
+        key = _job_key(job_id)
+        cached = await cache_manager.get_many([key, f"{key}:sent", f"{key}:failed"])
+        job = cached.get(key)
+        if isinstance(job, dict):
+            job["sent_count"] = int(cached.get(f"{key}:sent") or 0)
+            job["failed_count"] = int(cached.get(f"{key}:failed") or 0)
+        else:
+            found, job = self._jobs.get(job_id)
+            if not found:
+                return None
+            job = dict(job)
+
+        done = job["sent_count"] + job["failed_count"]
+        job["status"] = "completed" if done >= job["queued_count"] else "running"
+        return job
+
+    async def _record(self, job_id: Optional[str], sent: int, failed: int) -> None:
+        """累加发送任务的投递结果（重试的批次不属于任何发送任务）"""
+        metrics.inc("notification_delivery_total", sent, outcome="sent")
+        metrics.inc("notification_delivery_total", failed, outcome="failed")
+        if job_id is None:
+            return
+
+        found, job = self._jobs.get(job_id)
+        if found:
+            job["sent_count"] += sent
+            job["failed_count"] += failed
+
+        key = _job_key(job_id)
+        async with cache_manager.pipeline() as pipe:
+            pipe.incr(f"{key}:sent", sent)
+            pipe.incr(f"{key}:failed", failed)
+            pipe.expire(f"{key}:sent", self.job_ttl)
+            pipe.expire(f"{key}:failed", self.job_ttl)
+
+    async def dispatch(self, job_id: str, notification_ids: List[int], db: AsyncSession,
+                       deliver: DeliverFunc) -> None:
+        """投递一批已提交的通知
+
+        工作池运行时放入队列（队列满时等待），由工作协程在新会话中调用 deliver；
+        同步模式下直接在 db 中投递并提交；需要重试的通知在提交后安排重试。
+        """
+        if self.running:
+            if self._queue.full():
+                metrics.inc("notification_delivery_backpressure_total")
+            await self._queue.put((job_id, notification_ids, deliver))
+            return
+
+        sent, failed, retries = await deliver(notification_ids, db)
+        await db.commit()
+        await self._record(job_id, sent, failed)
+        await self.schedule_retry(retries)
+
+    async def schedule_retry(self, retries: Dict[int, float]) -> None:
+        """安排通知在延迟（秒）之后重新投递（须在失败状态提交之后调用）"""
+        if not retries:
+            return
+        metrics.inc("notification_retry_scheduled_total", len(retries))
+        now = time.time()
+
+        if cache_manager.is_connected:
+            async with cache_manager.pipeline() as pipe:
+                pipe.zadd(RETRY_KEY, {str(notification_id): now + delay for notification_id, delay in retries.items()})
+            if pipe.results and all(result is not None for result in pipe.results):
+                return
+
+        # Redis不可用：暂存在本进程中（进程停止时丢失，通知保持失败状态）
+        for notification_id, delay in retries.items():
+            heapq.heappush(self._delayed, (now + delay, notification_id))
+
+    async def _claim_due_retries(self) -> List[int]:
+        """取出已到重试时间的通知"""
+        now = time.time()
+        due = []
+        while self._delayed and self._delayed[0][0] <= now:
+            due.append(heapq.heappop(self._delayed)[1])
+
+        members = await cache_manager.zrangebyscore(RETRY_KEY, "-inf", now)
+        if members:
+            # 多个进程同时轮询时，ZREM 返回1的进程认领该通知，每个通知只重试一次
+            async with cache_manager.pipeline() as pipe:
+                for member in members:
+                    pipe.zrem(RETRY_KEY, member)
+            due.extend(int(member) for member, removed in zip(members, pipe.results) if removed)
+        return due
+
+    async def _poll_retries(self) -> None:
+        """定期把到期的重试交给工作协程"""
+        batch_size = settings.NOTIFICATION_FANOUT_BATCH_SIZE
+        while True:
+            await asyncio.sleep(self.retry_poll_interval)
+            if self._retry_deliver is None:
+                continue
+            try:
+                due = await self._claim_due_retries()
+                for start in range(0, len(due), batch_size):
+                    await self._queue.put((None, due[start:start + batch_size], self._retry_deliver))
+            except Exception as e:
+                logger.error(f"认领待重试的通知失败: {e}")
+
+    async def _worker(self) -> None:
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+
+            job_id, notification_ids, deliver = item
+            retries = {}
+            try:
+                async with self._session_factory() as db:
+                    sent, failed, retries = await deliver(notification_ids, db)
+                    await db.commit()
+            except Exception as e:
+                logger.error(f"投递通知批次失败（任务 {job_id}，{len(notification_ids)} 条）: {e}")
+                sent, failed, retries = 0, len(notification_ids), {}
+
+            try:
+                await self._record(job_id, sent, failed)
+                await self.schedule_retry(retries)
+            except Exception as e:
+                logger.error(f"记录发送任务 {job_id} 进度失败: {e}")
+
+
+# 全局通知投递工作池
+notification_dispatcher = NotificationDispatcher(
+    workers=settings.NOTIFICATION_DELIVERY_WORKERS,
+    max_queue_size=settings.NOTIFICATION_DELIVERY_QUEUE_SIZE,
+    job_ttl=settings.NOTIFICATION_JOB_TTL,
+    retry_poll_interval=settings.NOTIFICATION_RETRY_POLL_INTERVAL
+)
@@ -3,20 +3,32 @@
 处理通知的创建、发送和管理
 """
 
+import asyncio
 import json
+import random
+import time
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func, desc, asc
+from sqlalchemy import select, insert, and_, or_, func, desc, asc
 from sqlalchemy.orm import selectinload
 
-from app.core.cache import cache_manager
+from app.core.cache import cache_manager, cached
+from app.core.config import get_settings
+from app.core.db_routing import read_replica
+from app.core.metrics import metrics
+from app.core.search import search_backend
+from app.core.websocket_hub import websocket_hub
 from app.models.user import User
 from app.models.notification import (
     Notification, NotificationTemplate, NotificationSetting,
     NotificationType, NotificationPriority, NotificationStatus
 )
+from app.services.counter_service import (
+    counter_service, contribution_deltas, notification_contribution, NOTIFICATION_COUNTERS
+)
+from app.services.notification_dispatcher import notification_dispatcher
 from app.schemas.notification import (
     NotificationCreate, NotificationUpdate, NotificationListParams,
     NotificationStats, NotificationTemplateCreate, NotificationTemplateUpdate,
@@ -24,13 +36,37 @@ from app.schemas.notification import (
     NotificationSendRequest
 )
 from app.utils.logger import setup_logger
+from app.utils.pagination import paginate, CursorError
 
+settings = get_settings()
 logger = setup_logger(__name__)
 
+# 发送渠道及其已发送标记字段
+_CHANNEL_SENT_FLAGS = {
+    "email": "email_sent",
+    "push": "push_sent",
+    "websocket": "websocket_sent",
+}
+
+# 批量写入时需要返回的列（通知ID和计数器相关字段）
+_INSERTED_COLUMNS = (
+    "id", "user_id", "status", "priority", "notification_type", "is_read", "is_archived", "is_deleted"
+)
+
+
+def _retry_delay(attempt: int) -> float:
+    """第 attempt 次重试前的等待时间（指数退避 + 全抖动）"""
+    ceiling = min(settings.NOTIFICATION_RETRY_MAX_DELAY, settings.NOTIFICATION_RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling)
+
 
 class NotificationService:
     """通知服务类"""
     
+    def __init__(self):
+        # 每个渠道的并发上限
+        self._channel_semaphores: Dict[str, asyncio.Semaphore] = {}
+    
     async def create_notification(self, notification_data: NotificationCreate, 
                                 current_user: User, db: AsyncSession) -> Notification:
         """创建通知"""
@@ -66,9 +102,11 @@ class NotificationService:
             await db.commit()
             await db.refresh(new_notification)
             
-            # 立即发送或安排发送
+            # 立即发送或安排发送（发送失败的渠道提交后交给投递工作池重试，不占用当前请求）
             if not notification_data.scheduled_at or notification_data.scheduled_at <= datetime.utcnow():
-                await self._send_notification(new_notification, db)
+                retries = await self._deliver([new_notification])
+                await db.commit()
+                await notification_dispatcher.schedule_retry(retries)
             
             # 清除相关缓存
             await self._clear_notification_cache(target_user_id)
@@ -116,6 +154,7 @@ class NotificationService:
                 detail="获取通知失败"
             )
     
+    @read_replica
     async def get_user_notifications(self, user: User, params: NotificationListParams, 
                                    db: AsyncSession) -> Dict[str, Any]:
         """获取用户通知列表"""
@@ -145,14 +184,12 @@ class NotificationService:
             if params.resource_type:
                 conditions.append(Notification.resource_type == params.resource_type)
             
+            # 搜索（子串匹配）
+            rank = None
             if params.search:
-                search_term = f"%{params.search}%"
-                conditions.append(
-                    or_(
-                        Notification.title.ilike(search_term),
-                        Notification.message.ilike(search_term)
-                    )
-                )
+                conditions.append(search_backend.condition(Notification, params.search))
+                if params.sort_by == "relevance":
+                    rank = search_backend.rank(Notification, params.search)
             
             # 构建查询
             query = select(Notification).where(and_(*conditions))
@@ -169,39 +206,36 @@ class NotificationService:
             else:
                 order_column = Notification.created_at
             
-            if params.sort_order == "asc":
-                query = query.order_by(asc(order_column))
-            else:
-                query = query.order_by(desc(order_column))
-            
-            # 获取总数
-            count_query = select(func.count()).select_from(
-                select(Notification).where(and_(*conditions)).subquery()
+            page = await paginate(
+                db,
+                query,
+                column=order_column,
+                id_column=Notification.id,
+                sort_key=order_column.key,
+                descending=params.sort_order != "asc",
+                page=params.page,
+                page_size=params.page_size,
+                cursor=params.cursor,
+                include_total=params.include_total,
+                rank=rank
             )
-            total_result = await db.execute(count_query)
-            total = total_result.scalar()
-            
-            # 分页
-            offset = (params.page - 1) * params.page_size
-            query = query.offset(offset).limit(params.page_size)
-            
-            # 执行查询
-            result = await db.execute(query)
-            notifications = result.scalars().all()
-            
-            # 计算分页信息
-            total_pages = (total + params.page_size - 1) // params.page_size
             
             return {
-                "notifications": notifications,
-                "total": total,
-                "page": params.page,
-                "page_size": params.page_size,
-                "total_pages": total_pages,
-                "has_next": params.page < total_pages,
-                "has_prev": params.page > 1
+                "notifications": page["items"],
+                "total": page["total"],
+                "page": page["page"],
+                "page_size": page["page_size"],
+                "total_pages": page["total_pages"],
+                "has_next": page["has_next"],
+                "has_prev": page["has_prev"],
+                "next_cursor": page["next_cursor"]
             }
             
+        except CursorError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
         except Exception as e:
             logger.error(f"获取通知列表失败: {e}")
             raise HTTPException(
@@ -316,116 +350,28 @@ class NotificationService:
                 detail="删除通知失败"
             )
     
+    @cached(
+        key=lambda self, user, db: f"notification_stats:{user.id}",
+        ttl=300,  # 5分钟缓存
+        stale_ttl=60,
+        early_refresh_beta=1.0,
+        dump=lambda stats: stats.model_dump(),
+        load=lambda data: NotificationStats(**data),
+    )
+    @read_replica
     async def get_notification_stats(self, user: User, db: AsyncSession) -> NotificationStats:
         """获取通知统计信息"""
         try:
-            # 缓存键
-            cache_key = f"notification_stats:{user.id}"
-            
-            # 尝试从缓存获取
-            cached_stats = await cache_manager.get_json(cache_key)
-            if cached_stats:
-                return NotificationStats(**cached_stats)
-            
-            # 从数据库统计
-            base_query = select(Notification).where(
-                and_(Notification.user_id == user.id, Notification.is_deleted == False)
-            )
-            
-            # 总通知数
-            total_result = await db.execute(select(func.count()).select_from(base_query.subquery()))
-            total_notifications = total_result.scalar()
-            
-            # 未读通知数
-            unread_result = await db.execute(
-                select(func.count()).select_from(
-                    base_query.where(Notification.is_read == False).subquery()
-                )
-            )
-            unread_notifications = unread_result.scalar()
-            
-            # 已读通知数
-            read_notifications = total_notifications - unread_notifications
-            
-            # 归档通知数
-            archived_result = await db.execute(
-                select(func.count()).select_from(
-                    base_query.where(Notification.is_archived == True).subquery()
-                )
-            )
-            archived_notifications = archived_result.scalar()
-            
-            # 按状态统计
-            status_stats = {}
-            for status in NotificationStatus:
-                status_result = await db.execute(
-                    select(func.count()).select_from(
-                        base_query.where(Notification.status == status).subquery()
-                    )
-                )
-                status_stats[f"{status.value}_notifications"] = status_result.scalar()
-            
-            # 按类型统计
-            task_types = [
-                NotificationType.TASK_CREATED,
-                NotificationType.TASK_UPDATED,
-                NotificationType.TASK_COMPLETED,
-                NotificationType.TASK_OVERDUE,
-                NotificationType.TASK_DUE_SOON
-            ]
-            
-            task_result = await db.execute(
-                select(func.count()).select_from(
-                    base_query.where(Notification.notification_type.in_(task_types)).subquery()
-                )
-            )
-            task_notifications = task_result.scalar()
-            
-            system_types = [
-                NotificationType.SYSTEM_MAINTENANCE,
-                NotificationType.SYSTEM_UPDATE
-            ]
-            
-            system_result = await db.execute(
-                select(func.count()).select_from(
-                    base_query.where(Notification.notification_type.in_(system_types)).subquery()
-                )
-            )
-            system_notifications = system_result.scalar()
+            # 直接读取增量维护的计数器
+            counters = await counter_service.get_counters(user.id, db)
+            values = {name: counters.get(name, 0) for name in NOTIFICATION_COUNTERS}
             
-            security_result = await db.execute(
-                select(func.count()).select_from(
-                    base_query.where(Notification.notification_type == NotificationType.SECURITY_ALERT).subquery()
-                )
-            )
-            security_notifications = security_result.scalar()
-            
-            # 按优先级统计
-            priority_stats = {}
-            for priority in NotificationPriority:
-                priority_result = await db.execute(
-                    select(func.count()).select_from(
-                        base_query.where(Notification.priority == priority).subquery()
-                    )
-                )
-                priority_stats[priority.value] = priority_result.scalar()
-            
-            # 构建统计结果
+            # 构建统计结果（已读数 = 总数 - 未读数）
             stats = NotificationStats(
-                total_notifications=total_notifications,
-                unread_notifications=unread_notifications,
-                read_notifications=read_notifications,
-                archived_notifications=archived_notifications,
-                task_notifications=task_notifications,
-                system_notifications=system_notifications,
-                security_notifications=security_notifications,
-                **status_stats,
-                **priority_stats
+                read_notifications=values["total_notifications"] - values["unread_notifications"],
+                **values
             )
             
-            # 缓存结果
-            await cache_manager.set_json(cache_key, stats.dict(), expire=300)  # 5分钟缓存
-            
             return stats
             
         except Exception as e:
@@ -437,10 +383,14 @@ class NotificationService:
     
     async def send_notification(self, send_request: NotificationSendRequest, 
                               current_user: User, db: AsyncSession) -> Dict[str, Any]:
-        """发送通知"""
+        """发送通知
+        
+        内容只渲染一次，按批次批量写入所有接收者的通知并提交，
+        需要立即发送的通知交给投递工作池，返回发送任务ID用于查询进度。
+        """
         try:
-            # 确定目标用户
-            target_user_ids = send_request.user_ids or [current_user.id]
+            # 确定目标用户（去重）
+            target_user_ids = list(dict.fromkeys(send_request.user_ids or [current_user.id]))
             
             # 获取模板（如果指定）
             template = None
@@ -461,66 +411,79 @@ class NotificationService:
                         detail="通知模板不存在"
                     )
             
-            sent_count = 0
-            failed_count = 0
-            
-            for user_id in target_user_ids:
-                try:
-                    # 渲染通知内容
-                    if template:
-                        rendered = template.render(send_request.context or {})
-                        title = send_request.title or rendered.get("title")
-                        message = send_request.message or rendered.get("message")
-                        notification_type = template.notification_type
-                        priority = send_request.priority or template.default_priority
-                        channels = send_request.channels or template.default_channels.split(",") if template.default_channels else None
-                    else:
-                        title = send_request.title
-                        message = send_request.message
-                        notification_type = NotificationType.REMINDER
-                        priority = send_request.priority or NotificationPriority.MEDIUM
-                        channels = send_request.channels
-                    
-                    # 创建通知
-                    notification = Notification(
-                        user_id=user_id,
-                        title=title,
-                        message=message,
-                        notification_type=notification_type,
-                        priority=priority,
-                        scheduled_at=send_request.scheduled_at,
-                        status=NotificationStatus.PENDING
-                    )
-                    
-                    if channels:
-                        notification.channel_list = channels
-                    
-                    db.add(notification)
-                    await db.flush()
-                    
-                    # 发送通知
-                    if not send_request.scheduled_at or send_request.scheduled_at <= datetime.utcnow():
-                        await self._send_notification(notification, db)
-                    
-                    sent_count += 1
-                    
-                except Exception as e:
-                    logger.error(f"发送通知给用户 {user_id} 失败: {e}")
-                    failed_count += 1
+            # 渲染通知内容（所有接收者相同）
+            if template:
+                rendered = template.render(send_request.context or {})
+                title = send_request.title or rendered.get("title")
+                message = send_request.message or rendered.get("message")
+                notification_type = template.notification_type
+                priority = send_request.priority or template.default_priority
+                channels = send_request.channels or (
+                    template.default_channels.split(",") if template.default_channels else None
+                )
+            else:
+                title = send_request.title
+                message = send_request.message
+                notification_type = NotificationType.REMINDER
+                priority = send_request.priority or NotificationPriority.MEDIUM
+                channels = send_request.channels
+            
+            values = {
+                "title": title,
+                "message": message,
+                "notification_type": notification_type,
+                "priority": priority,
+                "channels": ",".join(channels) if channels else None,
+                "scheduled_at": send_request.scheduled_at,
+                "status": NotificationStatus.PENDING,
+            }
             
+            # 绕过ORM批量写入
+            statement = (
+                insert(Notification.__table__)
+                .returning(*(Notification.__table__.c[name] for name in _INSERTED_COLUMNS))
+            )
+            inserted = []
+            for start in range(0, len(target_user_ids), settings.NOTIFICATION_FANOUT_BATCH_SIZE):
+                chunk = target_user_ids[start:start + settings.NOTIFICATION_FANOUT_BATCH_SIZE]
+                result = await db.execute(statement, [{**values, "user_id": user_id} for user_id in chunk])
+                inserted.extend(dict(row) for row in result.mappings())
+            
+            # 计数器增量需要显式写入
+            await counter_service.apply_deltas(
+                db, contribution_deltas(notification_contribution, "user_id", [], inserted)
+            )
             await db.commit()
             
+            notification_ids = [row["id"] for row in inserted]
+            search_backend.on_bulk_persisted(Notification, notification_ids, values)
+            
+            # 立即发送的通知按批次交给投递工作池
+            deliver_now = not send_request.scheduled_at or send_request.scheduled_at <= datetime.utcnow()
+            job = await notification_dispatcher.create_job(
+                current_user.id,
+                accepted=len(notification_ids),
+                queued=len(notification_ids) if deliver_now else 0
+            )
+            if deliver_now:
+                for start in range(0, len(notification_ids), settings.NOTIFICATION_FANOUT_BATCH_SIZE):
+                    await notification_dispatcher.dispatch(
+                        job["job_id"],
+                        notification_ids[start:start + settings.NOTIFICATION_FANOUT_BATCH_SIZE],
+                        db,
+                        self.deliver_notifications
+                    )
+            
             # 清除缓存
-            for user_id in target_user_ids:
-                await self._clear_notification_cache(user_id)
+            await self._clear_notification_cache(*target_user_ids)
             
-            logger.info(f"批量发送通知完成: 成功 {sent_count}, 失败 {failed_count}")
+            logger.info(f"批量发送通知已受理: 任务 {job['job_id']}, 通知 {len(notification_ids)} 条")
             
             return {
-                "sent_count": sent_count,
-                "failed_count": failed_count,
+                "job_id": job["job_id"],
+                "accepted_count": len(notification_ids),
                 "total_count": len(target_user_ids),
-                "message": f"成功发送 {sent_count} 条通知"
+                "message": f"已受理 {len(notification_ids)} 条通知"
             }
             
         except HTTPException:
@@ -533,58 +496,155 @@ class NotificationService:
                 detail="发送通知失败"
             )
     
-    async def _send_notification(self, notification: Notification, db: AsyncSession):
-        """实际发送通知"""
-        try:
-            # 这里实现具体的发送逻辑
-            # 可以根据渠道发送到不同的地方（邮件、推送、WebSocket等）
-            
-            channels = notification.channel_list
-            
-            for channel in channels:
-                if channel == "email":
-                    # 发送邮件通知
-                    await self._send_email_notification(notification)
-                    notification.email_sent = True
-                elif channel == "push":
-                    # 发送推送通知
-                    await self._send_push_notification(notification)
-                    notification.push_sent = True
-                elif channel == "websocket":
-                    # 发送WebSocket通知
-                    await self._send_websocket_notification(notification)
-                    notification.websocket_sent = True
-            
+    async def get_send_job(self, job_id: str, current_user: User) -> Dict[str, Any]:
+        """查询批量发送任务的进度"""
+        job = await notification_dispatcher.get_job(job_id)
+        if not job or (job["created_by"] != current_user.id and not current_user.is_superuser):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="发送任务不存在"
+            )
+        return job
+    
+    async def deliver_notifications(self, notification_ids: List[int],
+                                    db: AsyncSession) -> Tuple[int, int, Dict[int, float]]:
+        """投递一批已保存的通知（待发送的，以及失败但还可以重试的）
+
+        返回（成功数, 失败数, 需要重试的通知 {通知ID: 延迟秒数}），调用方负责提交并安排重试。
+        """
+        result = await db.execute(
+            select(Notification).where(
+                and_(
+                    Notification.id.in_(notification_ids),
+                    or_(
+                        Notification.status == NotificationStatus.PENDING,
+                        and_(
+                            Notification.status == NotificationStatus.FAILED,
+                            Notification.retry_count < Notification.max_retries
+                        )
+                    )
+                )
+            )
+        )
+        
+        notifications = result.scalars().all()
+        retries = await self._deliver(notifications)
+        
+        sent_count = sum(1 for notification in notifications if notification.status == NotificationStatus.SENT)
+        return sent_count, len(notifications) - sent_count, retries
+    
+    async def _deliver(self, notifications: List[Notification]) -> Dict[int, float]:
+        """发送通知并把结果写回通知对象，返回需要重试的通知 {通知ID: 延迟秒数}
+        
+        发送前先读出所需的字段，并发发送的各渠道只使用这些普通数据、不访问数据库会话
+        （同一会话不能被多个协程同时使用）；发送结果在全部完成后依次写回。
+        """
+        payloads = [self._delivery_payload(notification) for notification in notifications]
+        
+        # 同一批次的通知并发发送（各渠道的并发由信号量限制）
+        results = await asyncio.gather(*(self._send_payload(payload) for payload in payloads))
+        
+        retries = {}
+        for notification, errors in zip(notifications, results):
+            delay = self._apply_result(notification, errors)
+            if delay is not None:
+                retries[notification.id] = delay
+        return retries
+    
+    @staticmethod
+    def _delivery_payload(notification: Notification) -> Dict[str, Any]:
+        """发送所需的字段（只包含尚未发送成功的渠道）"""
+        channels = []
+        for channel in notification.channel_list:
+            if channel not in _CHANNEL_SENT_FLAGS:
+                logger.warning(f"未知的通知渠道: {channel}")
+            elif not getattr(notification, _CHANNEL_SENT_FLAGS[channel]):
+                channels.append(channel)
+        
+        return {
+            "id": notification.id,
+            "user_id": notification.user_id,
+            "title": notification.title,
+            "message": notification.message,
+            "channels": channels,
+            "data": notification.to_dict(),
+        }
+    
+    async def _send_payload(self, payload: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        """各渠道并发发送，返回 {渠道: 错误信息（成功为None）}"""
+        channels = payload["channels"]
+        errors = await asyncio.gather(*(self._send_channel(payload, channel) for channel in channels))
+        return dict(zip(channels, errors))
+    
+    @staticmethod
+    def _apply_result(notification: Notification, errors: Dict[str, Optional[str]]) -> Optional[float]:
+        """记录发送结果；有渠道失败且允许重试（can_retry）时返回重试前的等待时间，只重试失败的渠道"""
+        failed = {}
+        for channel, error in errors.items():
+            if error is None:
+                setattr(notification, _CHANNEL_SENT_FLAGS[channel], True)
+            else:
+                failed[channel] = error
+        
+        if not failed:
             # 标记为已发送
             notification.mark_as_sent()
-            
-        except Exception as e:
-            logger.error(f"发送通知失败: {e}")
-            notification.mark_as_failed(str(e))
+            return None
+        
+        notification.mark_as_failed("; ".join(f"{channel}: {error}" for channel, error in failed.items()))
+        if not notification.can_retry:
+            logger.error(f"发送通知 {notification.id} 失败: {notification.last_error}")
+            return None
+        return _retry_delay(notification.retry_count)
     
-    async def _send_email_notification(self, notification: Notification):
+    async def _send_channel(self, payload: Dict[str, Any], channel: str) -> Optional[str]:
+        """通过单个渠道发送通知，成功返回None，失败返回错误信息"""
+        sender = getattr(self, f"_send_{channel}_notification")
+        semaphore = self._channel_semaphores.get(channel)
+        if semaphore is None:
+            semaphore = self._channel_semaphores[channel] = asyncio.Semaphore(settings.NOTIFICATION_CHANNEL_CONCURRENCY)
+        
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(sender(payload), settings.NOTIFICATION_CHANNEL_TIMEOUT)
+                outcome, error = "sent", None
+            except asyncio.TimeoutError:
+                outcome, error = "timeout", f"发送超时（{settings.NOTIFICATION_CHANNEL_TIMEOUT}s）"
+            except Exception as e:
+                outcome, error = "failed", str(e) or type(e).__name__
+        
+        metrics.inc("notification_channel_total", channel=channel, outcome=outcome)
+        metrics.observe("notification_channel_seconds", time.perf_counter() - start, channel=channel, outcome=outcome)
+        return error
+    
+    async def _send_email_notification(self, payload: Dict[str, Any]):
         """发送邮件通知"""
         # TODO: 实现邮件发送逻辑
-        logger.info(f"模拟发送邮件通知: {notification.title}")
+        logger.info(f"模拟发送邮件通知: {payload['title']}")
     
-    async def _send_push_notification(self, notification: Notification):
+    async def _send_push_notification(self, payload: Dict[str, Any]):
         """发送推送通知"""
         # TODO: 实现推送通知逻辑
-        logger.info(f"模拟发送推送通知: {notification.title}")
+        logger.info(f"模拟发送推送通知: {payload['title']}")
     
-    async def _send_websocket_notification(self, notification: Notification):
-        """发送WebSocket通知"""
-        # TODO: 实现WebSocket通知逻辑
-        logger.info(f"模拟发送WebSocket通知: {notification.title}")
+    async def _send_websocket_notification(self, payload: Dict[str, Any]):
+        """发送WebSocket通知（经Redis发布给持有该用户连接的所有进程）"""
+        await websocket_hub.publish(payload["user_id"], {
+            "type": "notification",
+            "data": payload["data"],
+        })
     
-    async def _clear_notification_cache(self, user_id: int):
-        """清除通知相关缓存"""
+    async def _clear_notification_cache(self, *user_ids: int):
+        """清除通知相关缓存（多个用户合并为一次删除）"""
         try:
-            await cache_manager.delete(f"notification_stats:{user_id}")
-            # 可以添加更多缓存清理逻辑
+            await cache_manager.delete_many([f"notification_stats:{user_id}" for user_id in user_ids])
         except Exception as e:
             logger.error(f"清除通知缓存失败: {e}")
 
 
 # 全局通知服务实例
-notification_service = NotificationService()
\ No newline at end of file
+notification_service = NotificationService()
+
+# 投递工作池重试失败的通知时使用
+notification_dispatcher.register_deliver(notification_service.deliver_notifications)
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""
+用户会话服务
+登录会话保存在Redis中（session:{session_id}），并延迟批量写回 user_sessions 表：
+
+- 新建或变更的会话ID加入 session:dirty 集合
+- 后台任务定期取出待写回的会话，按 session_id 批量 upsert
+- Redis不可用时直接写入调用方的数据库会话
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import cache_manager, session_manager
+from app.core.config import get_settings
+from app.core.metrics import metrics
+from app.core.websocket_hub import websocket_hub
+from app.models.user import UserSession
+from app.utils.logger import setup_logger
+
+settings = get_settings()
+logger = setup_logger(__name__)
+
+# 待写回数据库的会话ID集合
+SESSION_DIRTY_KEY = "session:dirty"
+# 每批写回的最大会话数
+SESSION_FLUSH_BATCH_SIZE = 500
+# 会话中需要还原为 datetime 的字段
+SESSION_DATETIME_FIELDS = ("created_at", "expires_at", "last_activity")
+
+
+def _user_sessions_key(user_id: int) -> str:
+    return f"user_sessions:{user_id}"
+
+
+class SessionService:
+    """用户会话服务类"""
+
+    @property
+    def ttl(self) -> int:
+        """会话有效期（秒），与刷新令牌一致"""
+        return settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400
+
+    @staticmethod
+    def _to_row(data: Dict[str, Any]) -> Dict[str, Any]:
+        row = {key: data.get(key) for key in (
+            "session_id", "user_id", "ip_address", "user_agent", "is_active", *SESSION_DATETIME_FIELDS
+        )}
+        for name in SESSION_DATETIME_FIELDS:
+            if row[name]:
+                row[name] = datetime.fromisoformat(row[name])
+        return row
+
+    async def _store(self, sessions: List[Dict[str, Any]]) -> bool:
+        """写入Redis并标记为待写回"""
+        async with cache_manager.pipeline() as pipe:
+            for data in sessions:
+                ttl = int((datetime.fromisoformat(data["expires_at"]) - datetime.utcnow()).total_seconds())
+                pipe.set(f"{session_manager.prefix}{data['session_id']}", data, expire=max(ttl, 1))
+                pipe.sadd(_user_sessions_key(data["user_id"]), data["session_id"])
+                pipe.expire(_user_sessions_key(data["user_id"]), self.ttl)
+            pipe.sadd(SESSION_DIRTY_KEY, *(data["session_id"] for data in sessions))
+        return bool(pipe.results) and all(result is not None for result in pipe.results)
+
+    async def create_session(self, user_id: int, db: AsyncSession,
+                             ip_address: str = None, user_agent: str = None) -> Dict[str, Any]:
+        """创建登录会话"""
+        now = datetime.utcnow()
+        data = {
+            "session_id": f"session_{user_id}_{uuid.uuid4().hex}",
+            "user_id": user_id,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "created_at": now.isoformat(),
+            "expires_at": (now + timedelta(seconds=self.ttl)).isoformat(),
+            "last_activity": now.isoformat(),
+            "is_active": True,
+        }
+
+        if not cache_manager.is_connected or not await self._store([data]):
+            # Redis不可用，随调用方的事务写入数据库
+            db.add(UserSession(**self._to_row(data)))
+            metrics.inc("user_sessions_total", outcome="direct")
+        else:
+            metrics.inc("user_sessions_total", outcome="buffered")
+        return data
+
+    async def deactivate_user_sessions(self, user_id: int) -> int:
+        """禁用用户在Redis中的所有会话（随下一次写回同步到数据库）"""
+        session_ids = await cache_manager.smembers(_user_sessions_key(user_id))
+        if not session_ids:
+            return 0
+
+        cached = await cache_manager.get_many([f"{session_manager.prefix}{sid}" for sid in session_ids])
+        sessions = []
+        for data in cached.values():
+            if isinstance(data, dict) and data.get("is_active"):
+                data["is_active"] = False
+                data["last_activity"] = datetime.utcnow().isoformat()
+                sessions.append(data)
+
+        if sessions:
+            await self._store(sessions)
+        await cache_manager.delete(_user_sessions_key(user_id))
+        return len(sessions)
+
+    async def revoke_user_sessions(self, user_ids: List[int], db: AsyncSession) -> int:
+        """禁用一批用户的所有会话，返回数据库中被禁用的会话数
+
+        数据库中的会话通过一条UPDATE语句禁用，Redis中尚未写回的会话随下一次写回同步，
+        这些用户在所有进程中的WebSocket连接随之关闭。调用方负责提交事务。
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        for user_id in user_ids:
+            await self.deactivate_user_sessions(user_id)
+        await websocket_hub.revoke_users(user_ids)
+
+        result = await db.execute(
+            update(UserSession)
+            .where(
+                and_(
+                    UserSession.user_id.in_(user_ids),
+                    UserSession.is_active == True
+                )
+            )
+            .values(is_active=False)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    async def flush(self, session_factory) -> int:
+        """把待写回的会话批量写入数据库"""
+        flushed = 0
+        while True:
+            session_ids = await cache_manager.spop(SESSION_DIRTY_KEY, SESSION_FLUSH_BATCH_SIZE)
+            if not session_ids:
+                return flushed
+
+            cached = await cache_manager.get_many([f"{session_manager.prefix}{sid}" for sid in session_ids])
+            rows = [self._to_row(data) for data in cached.values() if isinstance(data, dict)]
+            if not rows:
+                continue
+
+            try:
+                statement = insert(UserSession).values(rows)
+                statement = statement.on_conflict_do_update(
+                    index_elements=[UserSession.session_id],
+                    set_={
+                        "is_active": statement.excluded.is_active,
+                        "expires_at": statement.excluded.expires_at,
+                        "last_activity": statement.excluded.last_activity,
+                    }
+                )
+                async with session_factory() as db:
+                    await db.execute(statement)
+                    await db.commit()
+            except Exception:
+                # 写回失败，放回待写回集合等待下次重试
+                async with cache_manager.pipeline() as pipe:
+                    pipe.sadd(SESSION_DIRTY_KEY, *session_ids)
+                raise
+
+            flushed += len(rows)
+            metrics.inc("user_sessions_flushed_total", len(rows))
+
+    async def run_write_behind(self, session_factory, interval: int):
+        """定期把Redis中的会话写回数据库"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                flushed = await self.flush(session_factory)
+                if flushed:
+                    logger.debug(f"写回 {flushed} 个用户会话")
+            except Exception as e:
+                logger.error(f"会话写回失败: {e}")
+
+
+# 全局会话服务实例
+session_service = SessionService()
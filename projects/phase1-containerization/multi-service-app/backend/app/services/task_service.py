@@ -3,24 +3,58 @@
 处理任务CRUD操作和业务逻辑
 """
 
+import hashlib
+import json
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func, desc, asc
+from sqlalchemy import select, update, delete, insert, and_, or_, func, desc, asc, bindparam
 from sqlalchemy.orm import selectinload
 
-from app.core.cache import cache_manager
+from app.core.buffered_writer import BufferedWriter
+from app.core.cache import cache_manager, cached, filling_cache
+from app.core.config import get_settings
+from app.core.db_routing import read_replica
+from app.core.search import search_backend
+from app.core.metrics import metrics
 from app.models.user import User
 from app.models.task import Task, TaskComment, TaskActivity, TaskStatus, TaskPriority
+from app.services.counter_service import counter_service, contribution_deltas, task_contribution, TASK_COUNTERS
 from app.schemas.task import (
     TaskCreate, TaskUpdate, TaskListParams, TaskStats,
     TaskCommentCreate, TaskBatchUpdate, TaskBatchDelete
 )
 from app.utils.logger import setup_logger
+from app.utils.pagination import paginate, CursorError
 
+settings = get_settings()
 logger = setup_logger(__name__)
 
+# 任务活动记录写入器（由应用生命周期启动；未启动时同步写入）
+activity_writer = BufferedWriter(
+    "task_activity",
+    TaskActivity,
+    batch_size=settings.ACTIVITY_LOG_BATCH_SIZE,
+    flush_interval=settings.ACTIVITY_LOG_FLUSH_INTERVAL,
+    max_queue_size=settings.ACTIVITY_LOG_QUEUE_SIZE
+)
+
+# 任务列表查询结果缓存时间（秒），is_overdue 等按时间计算的字段最多滞后这么久
+TASK_LIST_CACHE_TTL = 60
+# 列表缓存代数键的存活时间，需远大于列表缓存本身的存活时间
+TASK_LIST_GEN_TTL = 86400
+
+
+def _task_list_hit_ratio() -> float:
+    hits = metrics.get_counter("query_cache_total", cache="task_list", outcome="hit")
+    misses = metrics.get_counter("query_cache_total", cache="task_list", outcome="miss")
+    total = hits + misses
+    return round(hits / total, 4) if total else 0.0
+
+
+metrics.register_gauge("query_cache_hit_ratio", _task_list_hit_ratio, cache="task_list")
+
 
 class TaskService:
     """任务服务类"""
@@ -115,8 +149,31 @@ class TaskService:
                 detail="获取任务失败"
             )
     
+    @read_replica
     async def get_user_tasks(self, user: User, params: TaskListParams, db: AsyncSession) -> Dict[str, Any]:
-        """获取用户任务列表"""
+        """获取用户任务列表（查询结果按用户缓存，任务变更时通过代数失效）"""
+        cache_key = await self._task_list_cache_key(user.id, params)
+        
+        cached_result = await cache_manager.get_json(cache_key)
+        if cached_result is not None:
+            metrics.inc("query_cache_total", cache="task_list", outcome="hit")
+            return cached_result
+        metrics.inc("query_cache_total", cache="task_list", outcome="miss")
+        
+        with filling_cache():
+            result = await self._query_user_tasks(user, params, db)
+        await cache_manager.set_json(cache_key, result, expire=TASK_LIST_CACHE_TTL)
+        return result
+    
+    async def _task_list_cache_key(self, user_id: int, params: TaskListParams) -> str:
+        """生成任务列表缓存键：用户 + 当前代数 + 规范化查询参数的哈希"""
+        generation = await cache_manager.get(f"task_list_gen:{user_id}") or 0
+        canonical = json.dumps(params.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+        digest = hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+        return f"task_list:{user_id}:{generation}:{digest}"
+    
+    async def _query_user_tasks(self, user: User, params: TaskListParams, db: AsyncSession) -> Dict[str, Any]:
+        """从数据库查询用户任务列表"""
         try:
             # 构建查询条件
             conditions = [
@@ -148,15 +205,12 @@ class TaskService:
                     )
                 )
             
+            # 搜索（子串匹配）
+            rank = None
             if params.search:
-                search_term = f"%{params.search}%"
-                conditions.append(
-                    or_(
-                        Task.title.ilike(search_term),
-                        Task.description.ilike(search_term),
-                        Task.notes.ilike(search_term)
-                    )
-                )
+                conditions.append(search_backend.condition(Task, params.search))
+                if params.sort_by == "relevance":
+                    rank = search_backend.rank(Task, params.search)
             
             # 构建查询
             query = select(Task).where(and_(*conditions))
@@ -175,39 +229,36 @@ class TaskService:
             else:
                 order_column = Task.created_at
             
-            if params.sort_order == "asc":
-                query = query.order_by(asc(order_column))
-            else:
-                query = query.order_by(desc(order_column))
-            
-            # 获取总数
-            count_query = select(func.count()).select_from(
-                select(Task).where(and_(*conditions)).subquery()
+            page = await paginate(
+                db,
+                query,
+                column=order_column,
+                id_column=Task.id,
+                sort_key=order_column.key,
+                descending=params.sort_order != "asc",
+                page=params.page,
+                page_size=params.page_size,
+                cursor=params.cursor,
+                include_total=params.include_total,
+                rank=rank
             )
-            total_result = await db.execute(count_query)
-            total = total_result.scalar()
-            
-            # 分页
-            offset = (params.page - 1) * params.page_size
-            query = query.offset(offset).limit(params.page_size)
-            
-            # 执行查询
-            result = await db.execute(query)
-            tasks = result.scalars().all()
-            
-            # 计算分页信息
-            total_pages = (total + params.page_size - 1) // params.page_size
             
             return {
-                "tasks": tasks,
-                "total": total,
-                "page": params.page,
-                "page_size": params.page_size,
-                "total_pages": total_pages,
-                "has_next": params.page < total_pages,
-                "has_prev": params.page > 1
+                "tasks": [task.to_dict(include_owner=False) for task in page["items"]],
+                "total": page["total"],
+                "page": page["page"],
+                "page_size": page["page_size"],
+                "total_pages": page["total_pages"],
+                "has_next": page["has_next"],
+                "has_prev": page["has_prev"],
+                "next_cursor": page["next_cursor"]
             }
             
+        except CursorError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
         except Exception as e:
             logger.error(f"获取任务列表失败: {e}")
             raise HTTPException(
@@ -301,8 +352,7 @@ class TaskService:
                 )
             
             # 清除缓存
-            await cache_manager.delete(f"task:{task_id}")
-            await self._clear_task_cache(user.id)
+            await self._clear_task_cache(user.id, task_ids=[task_id])
             
             logger.info(f"用户 {user.username} 更新任务: {task.title}")
             
@@ -345,8 +395,7 @@ class TaskService:
             )
             
             # 清除缓存
-            await cache_manager.delete(f"task:{task_id}")
-            await self._clear_task_cache(user.id)
+            await self._clear_task_cache(user.id, task_ids=[task_id])
             
             logger.info(f"用户 {user.username} {action}任务: {task.title}")
             
@@ -362,103 +411,46 @@ class TaskService:
                 detail="删除任务失败"
             )
     
+    @cached(
+        key=lambda self, user, db: f"task_stats:{user.id}",
+        ttl=300,  # 5分钟缓存
+        stale_ttl=60,
+        early_refresh_beta=1.0,
+        dump=lambda stats: stats.model_dump(),
+        load=lambda data: TaskStats(**data),
+    )
+    @read_replica
     async def get_task_stats(self, user: User, db: AsyncSession) -> TaskStats:
         """获取任务统计信息"""
         try:
-            # 缓存键
-            cache_key = f"task_stats:{user.id}"
-            
-            # 尝试从缓存获取
-            cached_stats = await cache_manager.get_json(cache_key)
-            if cached_stats:
-                return TaskStats(**cached_stats)
-            
-            # 从数据库统计
-            base_query = select(Task).where(
-                and_(Task.owner_id == user.id, Task.is_deleted == False)
-            )
-            
-            # 总任务数
-            total_result = await db.execute(select(func.count()).select_from(base_query.subquery()))
-            total_tasks = total_result.scalar()
-            
-            # 按状态统计
-            status_stats = {}
-            for status in TaskStatus:
-                status_result = await db.execute(
-                    select(func.count()).select_from(
-                        base_query.where(Task.status == status).subquery()
-                    )
-                )
-                status_stats[f"{status.value}_tasks"] = status_result.scalar()
-            
-            # 按优先级统计
-            priority_stats = {}
-            for priority in TaskPriority:
-                priority_result = await db.execute(
-                    select(func.count()).select_from(
-                        base_query.where(Task.priority == priority).subquery()
-                    )
-                )
-                priority_stats[f"{priority.value}_priority_tasks"] = priority_result.scalar()
-            
-            # 过期任务
-            overdue_result = await db.execute(
-                select(func.count()).select_from(
-                    base_query.where(
-                        and_(
-                            Task.due_date < datetime.utcnow(),
-                            Task.status.notin_([TaskStatus.COMPLETED, TaskStatus.CANCELLED, TaskStatus.ARCHIVED])
-                        )
-                    ).subquery()
+            # 计数类统计直接读取增量维护的计数器
+            counters = await counter_service.get_counters(user.id, db)
+            
+            # 依赖当前时间的统计在查询时计算
+            now = datetime.utcnow()
+            closed_statuses = [TaskStatus.COMPLETED, TaskStatus.CANCELLED, TaskStatus.ARCHIVED]
+            due_query = select(
+                func.count().filter(Task.due_date < now).label("overdue_tasks"),
+                func.count().filter(
+                    and_(Task.due_date <= now + timedelta(days=1), Task.due_date >= now)
+                ).label("due_soon_tasks")
+            ).where(
+                and_(
+                    Task.owner_id == user.id,
+                    Task.is_deleted == False,
+                    Task.due_date.isnot(None),
+                    Task.status.notin_(closed_statuses)
                 )
             )
-            overdue_tasks = overdue_result.scalar()
-            
-            # 即将到期任务
-            due_soon_result = await db.execute(
-                select(func.count()).select_from(
-                    base_query.where(
-                        and_(
-                            Task.due_date <= datetime.utcnow() + timedelta(days=1),
-                            Task.due_date >= datetime.utcnow(),
-                            Task.status.notin_([TaskStatus.COMPLETED, TaskStatus.CANCELLED, TaskStatus.ARCHIVED])
-                        )
-                    ).subquery()
-                )
-            )
-            due_soon_tasks = due_soon_result.scalar()
-            
-            # 标星任务
-            starred_result = await db.execute(
-                select(func.count()).select_from(
-                    base_query.where(Task.is_starred == True).subquery()
-                )
-            )
-            starred_tasks = starred_result.scalar()
-            
-            # 归档任务
-            archived_result = await db.execute(
-                select(func.count()).select_from(
-                    base_query.where(Task.is_archived == True).subquery()
-                )
-            )
-            archived_tasks = archived_result.scalar()
+            row = (await db.execute(due_query)).one()
             
             # 构建统计结果
             stats = TaskStats(
-                total_tasks=total_tasks,
-                overdue_tasks=overdue_tasks,
-                due_soon_tasks=due_soon_tasks,
-                starred_tasks=starred_tasks,
-                archived_tasks=archived_tasks,
-                **status_stats,
-                **priority_stats
+                overdue_tasks=row.overdue_tasks,
+                due_soon_tasks=row.due_soon_tasks,
+                **{name: counters.get(name, 0) for name in TASK_COUNTERS}
             )
             
-            # 缓存结果
-            await cache_manager.set_json(cache_key, stats.dict(), expire=300)  # 5分钟缓存
-            
             return stats
             
         except Exception as e:
@@ -469,19 +461,10 @@ class TaskService:
             )
     
     async def batch_update_tasks(self, batch_data: TaskBatchUpdate, user: User, db: AsyncSession) -> Dict[str, Any]:
-        """批量更新任务"""
+        """批量更新任务（一条UPDATE语句 + 一次批量写入活动记录，单个事务提交）"""
         try:
-            # 获取任务
-            tasks_query = await db.execute(
-                select(Task).where(
-                    and_(
-                        Task.id.in_(batch_data.task_ids),
-                        Task.owner_id == user.id,
-                        Task.is_deleted == False
-                    )
-                )
-            )
-            tasks = tasks_query.scalars().all()
+            # 锁定并读取变更前的字段值（用于活动描述和计数器增量）
+            tasks = await self._lock_tasks_for_batch(batch_data.task_ids, user, db)
             
             if not tasks:
                 raise HTTPException(
@@ -489,58 +472,79 @@ class TaskService:
                     detail="没有找到可更新的任务"
                 )
             
-            updated_count = 0
+            now = datetime.utcnow()
+            values: Dict[str, Any] = {}
+            if batch_data.status is not None:
+                values["status"] = batch_data.status
+                # 状态变更的特殊处理
+                if batch_data.status == TaskStatus.IN_PROGRESS:
+                    values["started_at"] = func.coalesce(Task.started_at, now)
+                elif batch_data.status == TaskStatus.COMPLETED:
+                    values["completed_at"] = now
+                    values["progress"] = 100
+            if batch_data.priority is not None:
+                values["priority"] = batch_data.priority
+            if batch_data.category is not None:
+                values["category"] = batch_data.category
+            if batch_data.is_starred is not None:
+                values["is_starred"] = batch_data.is_starred
+            if batch_data.is_archived is not None:
+                values["is_archived"] = batch_data.is_archived
+            
+            updated_rows = []
+            if values:
+                values["updated_at"] = now
+                result = await db.execute(
+                    update(Task)
+                    .where(self._id_in([task["id"] for task in tasks]))
+                    .values(**values)
+                    .returning(*self._BATCH_COLUMNS)
+                    .execution_options(synchronize_session=False)
+                )
+                updated_rows = [dict(row._mapping) for row in result]
             
-            for task in tasks:
-                changes = []
-                
-                if batch_data.status is not None:
-                    old_status = task.status
-                    task.status = batch_data.status
-                    changes.append(f"状态: {old_status.value} -> {batch_data.status.value}")
-                    
-                    # 状态变更的特殊处理
-                    if batch_data.status == TaskStatus.IN_PROGRESS and not task.started_at:
-                        task.started_at = datetime.utcnow()
-                    elif batch_data.status == TaskStatus.COMPLETED:
-                        task.completed_at = datetime.utcnow()
-                        task.progress = 100
-                
-                if batch_data.priority is not None:
-                    old_priority = task.priority
-                    task.priority = batch_data.priority
-                    changes.append(f"优先级: {old_priority.value} -> {batch_data.priority.value}")
-                
-                if batch_data.category is not None:
-                    task.category = batch_data.category
-                    changes.append(f"分类: {batch_data.category}")
-                
-                if batch_data.is_starred is not None:
-                    task.is_starred = batch_data.is_starred
-                    changes.append(f"{'添加' if batch_data.is_starred else '取消'}标星")
-                
-                if batch_data.is_archived is not None:
-                    task.is_archived = batch_data.is_archived
-                    changes.append(f"{'归档' if batch_data.is_archived else '取消归档'}")
-                
-                if changes:
-                    task.updated_at = datetime.utcnow()
-                    updated_count += 1
-                    
-                    # 记录活动
-                    await self._create_activity(
-                        task_id=task.id,
-                        user_id=user.id,
-                        activity_type="task_batch_updated",
-                        description=f"批量更新: {'; '.join(changes)}",
-                        db=db
-                    )
+            # 批量写入活动记录
+            changes = []
+            if batch_data.status is not None:
+                changes.append(lambda old: f"状态: {old['status'].value} -> {batch_data.status.value}")
+            if batch_data.priority is not None:
+                changes.append(lambda old: f"优先级: {old['priority'].value} -> {batch_data.priority.value}")
+            if batch_data.category is not None:
+                changes.append(lambda old: f"分类: {batch_data.category}")
+            if batch_data.is_starred is not None:
+                changes.append(lambda old: f"{'添加' if batch_data.is_starred else '取消'}标星")
+            if batch_data.is_archived is not None:
+                changes.append(lambda old: f"{'归档' if batch_data.is_archived else '取消归档'}")
+            
+            old_by_id = {task["id"]: task for task in tasks}
+            await self._bulk_create_activities(
+                [
+                    {
+                        "task_id": row["id"],
+                        "user_id": user.id,
+                        "activity_type": "task_batch_updated",
+                        "description": f"批量更新: {'; '.join(change(old_by_id[row['id']]) for change in changes)}",
+                    }
+                    for row in updated_rows
+                ],
+                db
+            )
+            
+            # 绕过了ORM，计数器增量需要显式写入
+            await counter_service.apply_deltas(
+                db,
+                contribution_deltas(
+                    task_contribution, "owner_id",
+                    [old_by_id[row["id"]] for row in updated_rows], updated_rows
+                )
+            )
             
             await db.commit()
             
             # 清除缓存
-            await self._clear_task_cache(user.id)
+            await self._clear_task_cache(user.id, task_ids=[task["id"] for task in tasks])
             
+            updated_count = len(updated_rows)
             logger.info(f"用户 {user.username} 批量更新了 {updated_count} 个任务")
             
             return {
@@ -560,19 +564,10 @@ class TaskService:
             )
     
     async def batch_delete_tasks(self, batch_data: TaskBatchDelete, user: User, db: AsyncSession) -> Dict[str, Any]:
-        """批量删除任务"""
+        """批量删除任务（一条DELETE/UPDATE语句 + 一次批量写入活动记录，单个事务提交）"""
         try:
-            # 获取任务
-            tasks_query = await db.execute(
-                select(Task).where(
-                    and_(
-                        Task.id.in_(batch_data.task_ids),
-                        Task.owner_id == user.id,
-                        Task.is_deleted == False
-                    )
-                )
-            )
-            tasks = tasks_query.scalars().all()
+            # 锁定并读取删除前的字段值
+            tasks = await self._lock_tasks_for_batch(batch_data.task_ids, user, db)
             
             if not tasks:
                 raise HTTPException(
@@ -580,32 +575,55 @@ class TaskService:
                     detail="没有找到可删除的任务"
                 )
             
-            deleted_count = 0
-            
-            for task in tasks:
-                if batch_data.permanent:
-                    # 永久删除
-                    await db.delete(task)
-                else:
-                    # 软删除
-                    task.is_deleted = True
-                
-                deleted_count += 1
+            ids = [task["id"] for task in tasks]
+            if batch_data.permanent:
+                # 永久删除（活动记录随任务级联删除，不再写入）
+                result = await db.execute(
+                    delete(Task)
+                    .where(self._id_in(ids))
+                    .returning(Task.id)
+                    .execution_options(synchronize_session=False)
+                )
+                deleted_ids = set(result.scalars().all())
+            else:
+                # 软删除
+                result = await db.execute(
+                    update(Task)
+                    .where(self._id_in(ids))
+                    .values(is_deleted=True, updated_at=datetime.utcnow())
+                    .returning(Task.id)
+                    .execution_options(synchronize_session=False)
+                )
+                deleted_ids = set(result.scalars().all())
                 
-                # 记录活动
-                await self._create_activity(
-                    task_id=task.id,
-                    user_id=user.id,
-                    activity_type="task_batch_deleted",
-                    description=f"批量{'永久删除' if batch_data.permanent else '删除'}任务 '{task.title}'",
-                    db=db
+                await self._bulk_create_activities(
+                    [
+                        {
+                            "task_id": task["id"],
+                            "user_id": user.id,
+                            "activity_type": "task_batch_deleted",
+                            "description": f"批量删除任务 '{task['title']}'",
+                        }
+                        for task in tasks if task["id"] in deleted_ids
+                    ],
+                    db
                 )
             
+            # 绕过了ORM，计数器增量需要显式写入
+            await counter_service.apply_deltas(
+                db,
+                contribution_deltas(
+                    task_contribution, "owner_id",
+                    [task for task in tasks if task["id"] in deleted_ids], []
+                )
+            )
+            
             await db.commit()
             
             # 清除缓存
-            await self._clear_task_cache(user.id)
+            await self._clear_task_cache(user.id, task_ids=[task["id"] for task in tasks])
             
+            deleted_count = len(deleted_ids)
             logger.info(f"用户 {user.username} 批量删除了 {deleted_count} 个任务")
             
             return {
@@ -624,28 +642,70 @@ class TaskService:
                 detail="批量删除任务失败"
             )
     
+    # 批量操作读取和返回的列（包含计数器所需的字段）
+    _BATCH_COLUMNS = (
+        Task.id, Task.title, Task.owner_id, Task.status, Task.priority,
+        Task.is_starred, Task.is_archived, Task.is_deleted
+    )
+    
+    @staticmethod
+    def _id_in(task_ids: List[int]):
+        """id IN (...) 条件（expanding 参数：语句结构固定可缓存，执行时按列表长度展开，各方言通用）"""
+        return Task.id.in_(bindparam("task_ids", task_ids, expanding=True))
+    
+    async def _lock_tasks_for_batch(self, task_ids: List[int], user: User, db: AsyncSession) -> List[Dict[str, Any]]:
+        """锁定属于用户的未删除任务，返回变更前的字段值"""
+        result = await db.execute(
+            select(*self._BATCH_COLUMNS)
+            .where(
+                and_(
+                    self._id_in(list(task_ids)),
+                    Task.owner_id == user.id,
+                    Task.is_deleted == False
+                )
+            )
+            .order_by(Task.id)
+            .with_for_update()
+        )
+        return [dict(row._mapping) for row in result]
+    
+    async def _bulk_create_activities(self, activities: List[Dict[str, Any]], db: AsyncSession):
+        """批量写入活动记录（随调用方的事务提交）"""
+        if activities:
+            await db.execute(insert(TaskActivity), activities)
+    
     async def _create_activity(self, task_id: int, user_id: int, activity_type: str, 
                              description: str, db: AsyncSession, metadata: Dict = None):
-        """创建任务活动记录"""
+        """创建任务活动记录（缓冲模式下由后台批量写入）"""
         try:
-            activity = TaskActivity(
-                task_id=task_id,
-                user_id=user_id,
-                activity_type=activity_type,
-                description=description,
-                meta_data=str(metadata) if metadata else None
+            await activity_writer.write(
+                {
+                    "task_id": task_id,
+                    "user_id": user_id,
+                    "activity_type": activity_type,
+                    "description": description,
+                    "meta_data": str(metadata) if metadata else None
+                },
+                db=db
             )
-            db.add(activity)
-            await db.commit()
             
         except Exception as e:
             logger.error(f"创建活动记录失败: {e}")
     
-    async def _clear_task_cache(self, user_id: int):
-        """清除任务相关缓存"""
+    async def _clear_task_cache(self, user_id: int, task_ids: Optional[List[int]] = None):
+        """清除任务相关缓存
+        
+        统计缓存和单个任务缓存合并为一次删除；列表缓存通过递增用户的代数失效，
+        旧代数下的缓存不再被读取，随TTL自然过期。
+        """
         try:
-            await cache_manager.delete(f"task_stats:{user_id}")
-            # 可以添加更多缓存清理逻辑
+            keys = [f"task_stats:{user_id}"]
+            keys.extend(f"task:{task_id}" for task_id in task_ids or [])
+            generation_key = f"task_list_gen:{user_id}"
+            async with cache_manager.pipeline() as pipe:
+                pipe.delete(*keys)
+                pipe.incr(generation_key)
+                pipe.expire(generation_key, TASK_LIST_GEN_TTL)
         except Exception as e:
             logger.error(f"清除任务缓存失败: {e}")
 
@@ -0,0 +1,154 @@
+"""
+分页工具
+支持页码分页（OFFSET/LIMIT）和游标分页（keyset）
+
+游标分页按 (排序列, id) 定位上一页最后一行，查询只需从索引中的该位置继续读取，
+深度翻页时不再扫描并丢弃前面的所有行。排序列可为空时，空值按PostgreSQL的默认位置排列：
+升序时排在最后、降序时排在最前，与普通升序索引 (过滤列, 排序列, id) 正向/反向扫描的顺序一致，
+两个方向都能直接使用同一个索引。
+"""
+
+import base64
+import enum
+import json
+import math
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, literal, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+
+class CursorError(ValueError):
+    """游标无效或与当前排序不匹配"""
+
+
+def _dump_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def _load_value(column, value: Any) -> Any:
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if issubclass(python_type, datetime):
+        return datetime.fromisoformat(value)
+    if issubclass(python_type, enum.Enum):
+        return python_type(value)
+    return value
+
+
+def encode_cursor(sort_key: str, descending: bool, value: Any, last_id: int) -> str:
+    """生成不透明游标（排序字段、方向、排序列值和id）"""
+    payload = {"s": sort_key, "d": int(descending), "v": _dump_value(value), "i": last_id}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, sort_key: str, descending: bool, column) -> Tuple[Any, int]:
+    """解析游标，返回 (排序列值, id)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        if payload["s"] != sort_key or bool(payload["d"]) != descending:
+            raise CursorError("游标与当前排序方式不匹配")
+        return _load_value(column, payload["v"]), int(payload["i"])
+    except CursorError:
+        raise
+    except Exception as e:
+        raise CursorError("无效的游标") from e
+
+
+def keyset_order_by(column, id_column, descending: bool) -> list:
+    """游标分页的排序：排序列 + id 作为唯一的决胜列，空值升序时排在最后、降序时排在最前"""
+    if descending:
+        return [column.desc().nulls_first(), id_column.desc()]
+    return [column.asc().nulls_last(), id_column.asc()]
+
+
+def keyset_condition(column, id_column, descending: bool, value: Any, last_id: int):
+    """定位到游标之后的行"""
+    nullable = column.expression.nullable
+
+    if value is None:
+        if descending:
+            # 降序时空值区间在最前：先按id继续读完空值，再进入非空值
+            return or_(and_(column.is_(None), id_column < last_id), column.isnot(None))
+        # 升序时空值区间在最后，只按id继续
+        return and_(column.is_(None), id_column > last_id)
+
+    # 按列类型绑定游标值（枚举等类型需要经过列的类型转换）
+    row = tuple_(column, id_column)
+    bound = tuple_(literal(value, type_=column.type), last_id)
+    if descending:
+        # 空值已在前面读过，比较结果为空的行自然被排除
+        return row < bound
+    after = row > bound
+    if nullable:
+        return or_(after, column.is_(None))
+    return after
+
+
+async def paginate(
+    db: AsyncSession,
+    query: Select,
+    column,
+    id_column,
+    sort_key: str,
+    descending: bool,
+    page: int = 1,
+    page_size: int = 20,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    rank=None
+) -> Dict[str, Any]:
+    """执行分页查询
+
+    传入 cursor 时使用游标分页并忽略 page；include_total 为 False 时跳过 COUNT 查询。
+    两种模式都会返回 next_cursor，客户端可以随时切换到游标分页。
+    传入 rank（相关度表达式）时按相关度降序排列，只支持页码分页。
+    """
+    total = None
+    if include_total:
+        count_query = select(func.count()).select_from(query.order_by(None).subquery())
+        total = (await db.execute(count_query)).scalar()
+
+    if rank is not None:
+        if cursor:
+            raise CursorError("相关度排序不支持游标分页")
+        query = query.order_by(rank.desc(), id_column.desc())
+    else:
+        query = query.order_by(*keyset_order_by(column, id_column, descending))
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_key, descending, column)
+        query = query.where(keyset_condition(column, id_column, descending, value, last_id))
+    else:
+        query = query.offset((page - 1) * page_size)
+
+    # 多取一行判断是否还有下一页
+    result = await db.execute(query.limit(page_size + 1))
+    items: List[Any] = list(result.scalars().all())
+    has_next = len(items) > page_size
+    items = items[:page_size]
+
+    next_cursor = None
+    if has_next and rank is None:
+        last = items[-1]
+        next_cursor = encode_cursor(sort_key, descending, getattr(last, column.key), last.id)
+
+    return {
+        "items": items,
+        "total": total,
+        "page": None if cursor else page,
+        "page_size": page_size,
+        "total_pages": math.ceil(total / page_size) if total is not None else None,
+        "has_next": has_next,
+        "has_prev": bool(cursor) or page > 1,
+        "next_cursor": next_cursor
+    }
@@ -0,0 +1,15 @@
+"""
+性能基准
+
+用法（在 backend 目录下）：
+
+    python -m benchmarks            # 运行全部基准
+    python -m benchmarks codec      # 只运行 bench_codec.py
+
+基准使用SQLite内存数据库和fakeredis，不依赖外部服务，
+结果只用于比较同一环境下不同实现的相对开销。
+"""
+
+import os
+
+os.environ.setdefault("ENVIRONMENT", "testing")
@@ -0,0 +1,40 @@
+"""运行 benchmarks/bench_*.py 中的基准"""
+
+import asyncio
+import importlib
+import inspect
+import logging
+import pkgutil
+import sys
+
+import benchmarks
+
+
+def available() -> list:
+    return sorted(
+        module.name[len("bench_"):]
+        for module in pkgutil.iter_modules(benchmarks.__path__)
+        if module.name.startswith("bench_")
+    )
+
+
+def main(names: list) -> int:
+    names = names or available()
+    unknown = [name for name in names if name not in available()]
+    if unknown:
+        print(f"未知的基准: {', '.join(unknown)}（可用: {', '.join(available())}）")
+        return 2
+
+    # 只输出警告和错误，避免业务日志淹没结果
+    logging.disable(logging.INFO)
+    for name in names:
+        module = importlib.import_module(f"benchmarks.bench_{name}")
+        print(f"\n== {name}: {module.__doc__.strip().splitlines()[0]}")
+        result = module.main()
+        if inspect.isawaitable(result):
+            asyncio.run(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,49 @@
+"""基准公共工具"""
+
+import time
+from typing import Callable, List, Sequence
+
+
+def per_call(func: Callable[[], object], number: int) -> float:
+    """执行 number 次，返回每次调用的平均耗时（秒）"""
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - start) / number
+
+
+def print_table(headers: Sequence[str], rows: List[Sequence[object]]) -> None:
+    """按列对齐输出结果表"""
+    cells = [[str(h) for h in headers]] + [[str(c) for c in row] for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(headers))]
+    for index, row in enumerate(cells):
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
+        if index == 0:
+            print("  ".join("-" * width for width in widths))
+
+
+async def create_sqlite_engine():
+    """SQLite内存数据库（单连接），建好所有表"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import StaticPool
+
+    import app.models  # noqa: F401  注册所有模型
+    from app.core.database import Base
+
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine
+
+
+def use_fakeredis():
+    """缓存管理器改用fakeredis（进程内，无网络开销）"""
+    import fakeredis
+
+    from app.core.cache import cache_manager
+
+    client = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=False)
+    cache_manager._redis = client
+    cache_manager._connected = True
+    cache_manager._gcra_script = None
+    return client
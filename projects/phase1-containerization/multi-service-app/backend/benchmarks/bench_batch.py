@@ -0,0 +1,60 @@
+"""批量任务操作：逐个更新（每个任务一次 update_task）与一次 batch_update_tasks 的耗时和语句数"""
+
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import _register_query_events
+from app.core.query_stats import track_request
+from app.models import Task, TaskPriority, User
+from app.schemas.task import TaskBatchUpdate, TaskUpdate
+from app.services import task_service
+from benchmarks._common import create_sqlite_engine, print_table, use_fakeredis
+
+SIZES = (10, 100, 1000)
+
+
+async def _create_tasks(db: AsyncSession, user: User, count: int) -> list:
+    tasks = [Task(owner_id=user.id, title=f"任务 {i}") for i in range(count)]
+    db.add_all(tasks)
+    await db.commit()
+    return [task.id for task in tasks]
+
+
+async def _per_row(db: AsyncSession, user: User, ids: list) -> None:
+    for task_id in ids:
+        await task_service.update_task(task_id, TaskUpdate(priority=TaskPriority.HIGH), user, db)
+
+
+async def _batch(db: AsyncSession, user: User, ids: list) -> None:
+    await task_service.batch_update_tasks(TaskBatchUpdate(task_ids=ids, priority=TaskPriority.HIGH), user, db)
+
+
+async def main() -> None:
+    use_fakeredis()
+    engine = await create_sqlite_engine()
+    _register_query_events(engine)
+    try:
+        rows = []
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            user = User(username="bench", email="bench@example.com", hashed_password="x")
+            db.add(user)
+            await db.commit()
+
+            for size in SIZES:
+                results = []
+                for operation in (_per_row, _batch):
+                    ids = await _create_tasks(db, user, size)
+                    with track_request("PUT", "/tasks") as stats:
+                        start = time.perf_counter()
+                        await operation(db, user, ids)
+                        elapsed = time.perf_counter() - start
+                    results.append((elapsed, stats.count))
+                    db.expunge_all()
+
+                (row_seconds, row_queries), (batch_seconds, batch_queries) = results
+                rows.append((size, f"{row_seconds * 1000:.1f}", row_queries, f"{batch_seconds * 1000:.1f}",
+                             batch_queries, f"{row_seconds / batch_seconds:.1f}x"))
+        print_table(("任务数", "逐个ms", "逐个语句数", "批量ms", "批量语句数", "倍数"), rows)
+    finally:
+        await engine.dispose()
@@ -0,0 +1,46 @@
+"""缓存值编解码：各编码器和压缩算法的编码/解码耗时与体积"""
+
+from datetime import datetime
+
+from app.core.codec import ValueCodec, _CODECS, _COMPRESSORS
+from benchmarks._common import per_call, print_table
+
+
+def _task(i: int) -> dict:
+    return {
+        "id": i,
+        "title": f"完成第 {i} 季度项目报告",
+        "description": "整理本季度的进度、风险和下季度计划，提交给项目委员会审阅。" * 3,
+        "status": "in_progress",
+        "priority": "high",
+        "owner_id": 42,
+        "tags": ["工作", "报告", "季度"],
+        "due_date": datetime(2026, 12, 31).isoformat(),
+        "created_at": datetime(2026, 1, 1).isoformat(),
+        "updated_at": datetime(2026, 6, 1).isoformat(),
+    }
+
+
+PAYLOADS = {
+    "单个任务": _task(1),
+    "任务列表(20条)": {"items": [_task(i) for i in range(20)], "total": 500, "page": 1, "size": 20},
+    "任务列表(100条)": {"items": [_task(i) for i in range(100)], "total": 500, "page": 1, "size": 100},
+}
+
+
+def main(number: int = 2000) -> None:
+    codecs = ["legacy"] + [codec.name for codec in _CODECS.values()]
+    compressions = [compressor.name for compressor in _COMPRESSORS.values()]
+
+    for label, payload in PAYLOADS.items():
+        rows = []
+        for codec_name in codecs:
+            for compression in (["none"] if codec_name == "legacy" else compressions):
+                codec = ValueCodec(codec=codec_name, compression=compression, compression_threshold=1024)
+                raw = codec.encode(payload)
+                encode = per_call(lambda: codec.encode(payload), number)
+                decode = per_call(lambda: codec.decode(raw), number)
+                rows.append((codec_name, compression, len(raw), f"{encode * 1e6:.1f}", f"{decode * 1e6:.1f}"))
+
+        print(f"\n{label}（每次调用，{number} 次平均）")
+        print_table(("编码", "压缩", "字节", "编码µs", "解码µs"), rows)
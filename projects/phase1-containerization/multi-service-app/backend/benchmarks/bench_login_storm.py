@@ -0,0 +1,82 @@
+"""登录风暴：并发校验密码时事件循环的响应延迟（在事件循环中直接计算 vs 专用线程池）
+
+探测协程每隔 PROBE_INTERVAL 秒唤醒一次，记录实际唤醒时间比预期晚多少，
+代表登录风暴期间其他接口（不需要计算哈希的请求）额外等待的时间。
+"""
+
+import asyncio
+import math
+import os
+import time
+from typing import List
+
+from app.core.config import get_settings
+from app.core.security import PasswordHasher, pwd_context
+from benchmarks._common import print_table
+
+settings = get_settings()
+
+LOGINS = int(os.environ.get("BENCH_LOGINS", "32"))
+PROBE_INTERVAL = 0.005
+
+
+async def _probe(lags: List[float], stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def _inline_verify(password: str, hashed: str) -> bool:
+    return pwd_context.verify(password, hashed)
+
+
+async def _storm(verify) -> tuple:
+    hashed = pwd_context.hash("password123")
+    lags: List[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe(lags, stop))
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(verify("password123", hashed) for _ in range(LOGINS)))
+    elapsed = time.perf_counter() - start
+    assert all(results)
+
+    stop.set()
+    await probe
+    return elapsed, lags
+
+
+def _percentile(values: List[float], percent: int) -> float:
+    """最近秩百分位数（阻塞严重时样本很少，不做插值）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * percent / 100) - 1)]
+
+
+async def main() -> None:
+    hasher = PasswordHasher(workers=settings.PASSWORD_HASH_WORKERS, max_pending=LOGINS)
+    modes = {
+        "事件循环中直接计算": _inline_verify,
+        f"线程池（{hasher.workers} 个线程）": hasher.verify,
+    }
+
+    rows = []
+    try:
+        for label, verify in modes.items():
+            elapsed, lags = await _storm(verify)
+            rows.append((
+                label,
+                f"{elapsed:.2f}",
+                f"{_percentile(lags, 50) * 1000:.1f}",
+                f"{_percentile(lags, 99) * 1000:.1f}",
+                f"{max(lags, default=0.0) * 1000:.1f}",
+            ))
+    finally:
+        hasher.shutdown()
+
+    print(f"{LOGINS} 个并发登录（bcrypt校验），事件循环延迟探测间隔 {PROBE_INTERVAL * 1000:.0f} ms")
+    print_table(("模式", "总耗时 s", "延迟 p50 ms", "延迟 p99 ms", "最大延迟 ms"), rows)
@@ -0,0 +1,92 @@
+"""分页：百万行任务表上页码分页（OFFSET）与游标分页（keyset）的深翻页耗时"""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Task, TaskPriority, TaskStatus
+from app.utils.pagination import encode_cursor, keyset_order_by, paginate
+from benchmarks._common import create_sqlite_engine, print_table
+
+ROWS = int(os.getenv("BENCH_ROWS", "1000000"))
+PAGE_SIZE = 20
+REPEAT = 5
+OWNER_ID = 1
+
+
+async def _seed(engine) -> None:
+    start = datetime(2026, 1, 1)
+    batch = []
+    async with engine.begin() as conn:
+        # 与 idx_tasks_owner_created 的列相同（模型中的部分索引只在PostgreSQL中创建）
+        await conn.execute(text("CREATE INDEX bench_owner_created ON tasks (owner_id, created_at, id)"))
+        for i in range(ROWS):
+            created = start + timedelta(seconds=i)
+            batch.append({
+                "title": f"任务 {i}",
+                "status": TaskStatus.PENDING,
+                "priority": TaskPriority.MEDIUM,
+                "owner_id": OWNER_ID,
+                "progress": 0,
+                "is_starred": False,
+                "is_archived": False,
+                "is_deleted": False,
+                "created_at": created,
+                "updated_at": created,
+            })
+            if len(batch) == 50000:
+                await conn.execute(Task.__table__.insert(), batch)
+                batch = []
+        if batch:
+            await conn.execute(Task.__table__.insert(), batch)
+
+
+async def _timed_page(db: AsyncSession, **kwargs) -> float:
+    query = select(Task).where(Task.owner_id == OWNER_ID, Task.is_deleted == False)  # noqa: E712
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        page = await paginate(db, query, Task.created_at, Task.id, "created_at", True,
+                              page_size=PAGE_SIZE, include_total=False, **kwargs)
+        best = min(best, time.perf_counter() - start)
+        assert len(page["items"]) == PAGE_SIZE
+        db.expunge_all()
+    return best
+
+
+async def _cursor_at(db: AsyncSession, offset: int) -> str:
+    """游标定位到第 offset 行之前（与页码分页读取同一页）"""
+    if offset == 0:
+        return None
+    query = (select(Task.created_at, Task.id)
+             .where(Task.owner_id == OWNER_ID, Task.is_deleted == False)  # noqa: E712
+             .order_by(*keyset_order_by(Task.created_at, Task.id, True))
+             .offset(offset - 1).limit(1))
+    created_at, task_id = (await db.execute(query)).one()
+    return encode_cursor("created_at", True, created_at, task_id)
+
+
+async def main() -> None:
+    engine = await create_sqlite_engine()
+    try:
+        start = time.perf_counter()
+        await _seed(engine)
+        print(f"写入 {ROWS} 行用时 {time.perf_counter() - start:.1f}s，每页 {PAGE_SIZE} 行，取 {REPEAT} 次最小值")
+
+        rows = []
+        async with AsyncSession(engine) as db:
+            for page in (1, 10, 100, 1000, 10000, ROWS // PAGE_SIZE):
+                offset = (page - 1) * PAGE_SIZE
+                if offset + PAGE_SIZE > ROWS:
+                    continue
+                offset_seconds = await _timed_page(db, page=page)
+                cursor = await _cursor_at(db, offset)
+                keyset_seconds = await _timed_page(db, cursor=cursor) if cursor else offset_seconds
+                rows.append((page, offset, f"{offset_seconds * 1000:.2f}", f"{keyset_seconds * 1000:.2f}",
+                             f"{offset_seconds / keyset_seconds:.1f}x"))
+        print_table(("页码", "OFFSET", "页码分页ms", "游标分页ms", "倍数"), rows)
+    finally:
+        await engine.dispose()
@@ -0,0 +1,128 @@
+"""统计接口：逐项COUNT（每个状态/优先级一条语句）与计数器 + 单条聚合查询的语句数和耗时"""
+
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import _register_query_events
+from app.core.query_stats import track_request
+from app.models import Notification, NotificationPriority, NotificationStatus, NotificationType, Task, TaskPriority, \
+    TaskStatus, User
+from app.services import notification_service, task_service
+from benchmarks._common import create_sqlite_engine, print_table
+
+SIZES = (100, 1000, 10000)
+REPEAT = 5
+
+TASK_TYPES = [NotificationType.TASK_CREATED, NotificationType.TASK_UPDATED, NotificationType.TASK_COMPLETED,
+              NotificationType.TASK_OVERDUE, NotificationType.TASK_DUE_SOON]
+SYSTEM_TYPES = [NotificationType.SYSTEM_MAINTENANCE, NotificationType.SYSTEM_UPDATE]
+
+
+async def _count(db: AsyncSession, query) -> int:
+    return (await db.execute(select(func.count()).select_from(query.subquery()))).scalar()
+
+
+async def legacy_task_stats(db: AsyncSession, user_id: int) -> dict:
+    """改造前的 get_task_stats：总数、每个状态、每个优先级和四项条件各一条COUNT"""
+    base = select(Task).where(and_(Task.owner_id == user_id, Task.is_deleted == False))  # noqa: E712
+    now = datetime.utcnow()
+    open_statuses = Task.status.notin_([TaskStatus.COMPLETED, TaskStatus.CANCELLED, TaskStatus.ARCHIVED])
+    stats = {"total_tasks": await _count(db, base)}
+    for status in TaskStatus:
+        stats[f"{status.value}_tasks"] = await _count(db, base.where(Task.status == status))
+    for priority in TaskPriority:
+        stats[f"{priority.value}_priority_tasks"] = await _count(db, base.where(Task.priority == priority))
+    stats["overdue_tasks"] = await _count(db, base.where(and_(Task.due_date < now, open_statuses)))
+    stats["due_soon_tasks"] = await _count(db, base.where(
+        and_(Task.due_date <= now + timedelta(days=1), Task.due_date >= now, open_statuses)
+    ))
+    stats["starred_tasks"] = await _count(db, base.where(Task.is_starred == True))  # noqa: E712
+    stats["archived_tasks"] = await _count(db, base.where(Task.is_archived == True))  # noqa: E712
+    return stats
+
+
+async def legacy_notification_stats(db: AsyncSession, user_id: int) -> dict:
+    """改造前的 get_notification_stats：每个状态、类型分组和优先级各一条COUNT"""
+    base = select(Notification).where(
+        and_(Notification.user_id == user_id, Notification.is_deleted == False)  # noqa: E712
+    )
+    stats = {
+        "total_notifications": await _count(db, base),
+        "unread_notifications": await _count(db, base.where(Notification.is_read == False)),  # noqa: E712
+        "archived_notifications": await _count(db, base.where(Notification.is_archived == True)),  # noqa: E712
+    }
+    for status in NotificationStatus:
+        stats[f"{status.value}_notifications"] = await _count(db, base.where(Notification.status == status))
+    # 与 READ 状态的键同名，以已读标记为准
+    stats["read_notifications"] = stats["total_notifications"] - stats["unread_notifications"]
+    stats["task_notifications"] = await _count(db, base.where(Notification.notification_type.in_(TASK_TYPES)))
+    stats["system_notifications"] = await _count(db, base.where(Notification.notification_type.in_(SYSTEM_TYPES)))
+    stats["security_notifications"] = await _count(
+        db, base.where(Notification.notification_type == NotificationType.SECURITY_ALERT)
+    )
+    for priority in NotificationPriority:
+        stats[priority.value] = await _count(db, base.where(Notification.priority == priority))
+    return stats
+
+
+async def measure(call, repeat: int = REPEAT) -> tuple:
+    """返回 (最小耗时秒数, 语句数)"""
+    best, count = float("inf"), 0
+    for _ in range(repeat):
+        with track_request("GET", "/stats") as stats:
+            start = time.perf_counter()
+            await call()
+            best = min(best, time.perf_counter() - start)
+        count = stats.count
+    return best, count
+
+
+async def _seed(db: AsyncSession, user: User, count: int) -> None:
+    statuses, priorities = list(TaskStatus), list(TaskPriority)
+    now = datetime.utcnow()
+    db.add_all(
+        Task(owner_id=user.id, title=f"任务 {i}", status=statuses[i % len(statuses)],
+             priority=priorities[i % len(priorities)], is_starred=i % 3 == 0,
+             due_date=now + timedelta(hours=12) if i % 4 == 0 else None)
+        for i in range(count)
+    )
+    db.add_all(
+        Notification(user_id=user.id, title=f"通知 {i}", message="内容",
+                     notification_type=NotificationType.REMINDER, is_read=i % 2 == 0)
+        for i in range(count)
+    )
+    await db.commit()
+
+
+async def main() -> None:
+    engine = await create_sqlite_engine()
+    _register_query_events(engine)
+    # 直接调用被缓存装饰的方法内部的实现，每次都查询数据库
+    task_stats = task_service.get_task_stats.__wrapped__
+    notification_stats = notification_service.get_notification_stats.__wrapped__
+    try:
+        rows = []
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            for size in SIZES:
+                user = User(username=f"bench{size}", email=f"bench{size}@example.com", hashed_password="x")
+                db.add(user)
+                await db.commit()
+                await _seed(db, user, size)
+
+                cases = (
+                    ("任务", lambda: legacy_task_stats(db, user.id), lambda: task_stats(task_service, user, db)),
+                    ("通知", lambda: legacy_notification_stats(db, user.id),
+                     lambda: notification_stats(notification_service, user, db)),
+                )
+                for name, legacy, current in cases:
+                    (legacy_seconds, legacy_queries), (current_seconds, current_queries) = \
+                        await measure(legacy), await measure(current)
+                    rows.append((name, size, legacy_queries, f"{legacy_seconds * 1000:.2f}", current_queries,
+                                 f"{current_seconds * 1000:.2f}", f"{legacy_seconds / current_seconds:.1f}x"))
+        print(f"取 {REPEAT} 次最小值")
+        print_table(("统计", "行数", "逐项语句数", "逐项ms", "当前语句数", "当前ms", "倍数"), rows)
+    finally:
+        await engine.dispose()
@@ -0,0 +1,48 @@
+"""JWT解码缓存：令牌校验及认证热路径（get_current_user 命中认证缓存）在有无解码缓存时的耗时"""
+
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import User
+from app.services.auth_service import AuthService
+from benchmarks._common import create_sqlite_engine, per_call, print_table, use_fakeredis
+
+NUMBER = 20000
+
+
+def _services():
+    cached = AuthService()
+    uncached = AuthService()
+    uncached._token_cache = None
+    return {"无缓存": uncached, "解码缓存命中": cached}
+
+
+async def main() -> None:
+    use_fakeredis()
+    engine = await create_sqlite_engine()
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            user = User(username="bench", email="bench@example.com", hashed_password="x")
+            db.add(user)
+            await db.commit()
+
+            rows = []
+            for label, service in _services().items():
+                token = service.create_access_token({"sub": str(user.id)})
+                # 预热：写入解码缓存和认证缓存
+                await service.get_current_user(token, db)
+
+                verify = per_call(lambda: service.verify_token(token), NUMBER)
+
+                start = time.perf_counter()
+                for _ in range(NUMBER // 10):
+                    await service.get_current_user(token, db)
+                current_user = (time.perf_counter() - start) / (NUMBER // 10)
+
+                rows.append((label, f"{verify * 1e6:.1f}", f"{current_user * 1e6:.1f}"))
+
+        print(f"verify_token {NUMBER} 次、get_current_user {NUMBER // 10} 次的平均耗时（认证缓存使用fakeredis）")
+        print_table(("模式", "verify_token µs", "get_current_user µs"), rows)
+    finally:
+        await engine.dispose()
@@ -0,0 +1,122 @@
+"""
+测试公共配置
+
+测试默认使用SQLite内存数据库（aiosqlite）和fakeredis，不依赖外部服务；
+标记为 postgres 的测试需要环境变量 DATABASE_URL 指向可用的PostgreSQL数据库。
+"""
+
+import os
+
+# 必须在导入应用模块之前设置（配置在首次导入时加载）
+os.environ.setdefault("ENVIRONMENT", "testing")
+
+import sys
+import uuid
+
+import fakeredis
+import pytest
+from sqlalchemy import make_url, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401  注册所有模型
+import app.services  # noqa: F401
+from app.core.cache import cache_manager
+from app.core.database import Base, _register_query_events
+from app.core.db_routing import RoutingAsyncSession
+from app.models import User
+
+# 标记为 postgres 的测试使用的数据库
+POSTGRES_URL = os.environ.get("DATABASE_URL", "")
+
+
+def pytest_collection_modifyitems(config, items):
+    if POSTGRES_URL.startswith("postgresql"):
+        return
+    skip = pytest.mark.skip(reason="DATABASE_URL 未指向PostgreSQL")
+    for item in items:
+        if item.get_closest_marker("postgres"):
+            item.add_marker(skip)
+
+
+@pytest.fixture
+async def redis():
+    """用fakeredis替换缓存管理器的Redis连接"""
+    client = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=False)
+    cache_manager._redis = client
+    cache_manager._connected = True
+    cache_manager._gcra_script = None
+    if cache_manager._local is not None:
+        cache_manager._local.clear()
+    try:
+        yield client
+    finally:
+        cache_manager._redis = None
+        cache_manager._connected = False
+        cache_manager._gcra_script = None
+        if cache_manager._local is not None:
+            cache_manager._local.clear()
+        await client.aclose()
+
+
+@pytest.fixture
+async def engine(monkeypatch):
+    """SQLite内存数据库引擎（单连接），已建好所有表并注册了语句统计事件"""
+    # 计数器和会话的 upsert 使用PostgreSQL方言的 insert，SQLite 中换成等价的 SQLite insert
+    for module in ("app.services.counter_service", "app.services.session_service"):
+        monkeypatch.setattr(sys.modules[module], "insert", sqlite_insert)
+
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    _register_query_events(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        yield engine
+    finally:
+        await engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    """与 db_manager 相同配置的会话工厂"""
+    return async_sessionmaker(bind=engine, class_=RoutingAsyncSession, expire_on_commit=False)
+
+
+@pytest.fixture
+async def db(session_factory):
+    async with session_factory() as session:
+        yield session
+
+
+@pytest.fixture
+def create_user(db):
+    """创建测试用户"""
+    async def create(username: str = "alice", **fields) -> User:
+        user = User(username=username, email=f"{username}@example.com", hashed_password="x", **fields)
+        db.add(user)
+        await db.commit()
+        return user
+    return create
+
+
+@pytest.fixture
+async def pg_engine():
+    """PostgreSQL中的临时schema（测试结束后删除），已建好所有表和索引"""
+    url = make_url(POSTGRES_URL).set(drivername="postgresql+asyncpg")
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    admin = create_async_engine(url)
+    async with admin.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await conn.execute(text(f"CREATE SCHEMA {schema}"))
+
+    engine = create_async_engine(url, connect_args={"server_settings": {"search_path": f"{schema},public"}})
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        yield engine
+    finally:
+        await engine.dispose()
+        async with admin.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        await admin.dispose()
@@ -0,0 +1,95 @@
+"""认证缓存测试：有效令牌不查询数据库，用户版本号递增后重新加载"""
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+
+from app.core.query_stats import track_request
+from app.models import User
+from app.services import auth_service
+
+
+@pytest.fixture
+def redis_calls(redis, monkeypatch):
+    """记录发往Redis的命令（流水线按一次往返计）"""
+    calls = []
+    execute_command = redis.execute_command
+
+    async def counting(*args, **kwargs):
+        calls.append(args[0])
+        return await execute_command(*args, **kwargs)
+    monkeypatch.setattr(redis, "execute_command", counting)
+    return calls
+
+
+def _token(user: User) -> str:
+    return auth_service.create_access_token({"sub": str(user.id), "username": user.username})
+
+
+async def _authenticate(token: str, db):
+    with track_request("GET", "/auth/me") as stats:
+        user = await auth_service.get_current_user(token, db)
+    return user, stats.count
+
+
+async def test_cached_principal_costs_no_statements(redis_calls, db, create_user):
+    user = await create_user()
+    token = _token(user)
+
+    _, statements = await _authenticate(token, db)
+    assert statements == 1
+
+    redis_calls.clear()
+    cached, statements = await _authenticate(token, db)
+    assert statements == 0
+    # 认证缓存、版本号（和可能需要确认的吊销记录）一次MGET读取
+    assert redis_calls == ["MGET"]
+    assert (cached.id, cached.username, cached.is_active) == (user.id, user.username, True)
+
+
+async def test_profile_change_reloads_the_principal(redis, db, create_user):
+    user = await create_user()
+    token = _token(user)
+    await _authenticate(token, db)
+
+    await db.execute(update(User).where(User.id == user.id).values(full_name="Alice Liddell"))
+    await db.commit()
+    # 版本号递增之前仍返回缓存的认证信息
+    cached, statements = await _authenticate(token, db)
+    assert statements == 0 and cached.full_name is None
+
+    await auth_service.invalidate_principal(user.id)
+    reloaded, statements = await _authenticate(token, db)
+    assert statements == 1 and reloaded.full_name == "Alice Liddell"
+    _, statements = await _authenticate(token, db)
+    assert statements == 0
+
+
+async def test_deactivated_user_is_rejected_after_version_bump(redis, db, create_user):
+    user = await create_user()
+    token = _token(user)
+    await _authenticate(token, db)
+
+    await db.execute(update(User).where(User.id == user.id).values(is_active=False))
+    await db.commit()
+    await auth_service.invalidate_principal(user.id)
+
+    with pytest.raises(HTTPException) as error:
+        await auth_service.get_current_user(token, db)
+    assert error.value.status_code == 401
+
+
+async def test_logout_invalidates_the_cached_principal(redis, db, create_user):
+    user = await create_user()
+    token, other_token = _token(user), _token(user)
+    await _authenticate(token, db)
+    await _authenticate(other_token, db)
+
+    assert await auth_service.logout_user(token, db)
+
+    with pytest.raises(HTTPException) as error:
+        await auth_service.get_current_user(token, db)
+    assert error.value.status_code == 401
+    # 同一用户的其他令牌仍然有效，但需要重新加载认证信息
+    _, statements = await _authenticate(other_token, db)
+    assert statements == 1
@@ -0,0 +1,126 @@
+"""缓存装饰器测试：并发未命中合并加载、过期后返回旧值、XFetch提前刷新以及加载失败时的等待者"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.core import cache
+from app.core.cache import cache_manager, cached, single_flight
+
+TTL = 60
+KEY = "cached_test:1"
+
+
+class Loader:
+    """记录调用次数的加载函数，gate 未设置时阻塞"""
+
+    def __init__(self):
+        self.calls = 0
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.error = None
+
+    @cached(key=lambda self, user_id: f"cached_test:{user_id}", ttl=TTL, stale_ttl=TTL, early_refresh_beta=1.0)
+    async def load(self, user_id: int) -> dict:
+        self.calls += 1
+        call = self.calls
+        await self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        return {"user_id": user_id, "call": call}
+
+
+async def _seed(age: float, duration: float = 0.01) -> None:
+    """写入 age 秒前计算的缓存值"""
+    await cache_manager.set_json(KEY, {"v": {"user_id": 1, "call": 0}, "t": time.time() - age, "d": duration},
+                                 expire=TTL * 2)
+
+
+async def _wait_in_flight() -> None:
+    while not single_flight.in_flight(KEY):
+        await asyncio.sleep(0)
+
+
+async def test_concurrent_misses_run_one_compute(redis):
+    loader = Loader()
+    loader.gate.clear()
+    pending = [asyncio.create_task(loader.load(1)) for _ in range(20)]
+    await _wait_in_flight()
+    loader.gate.set()
+
+    results = await asyncio.gather(*pending)
+    assert loader.calls == 1
+    assert results == [{"user_id": 1, "call": 1}] * 20
+    assert (await cache_manager.get_json(KEY))["v"] == {"user_id": 1, "call": 1}
+
+
+async def test_stale_value_is_served_while_one_coroutine_refreshes(redis):
+    await _seed(age=TTL + 1)
+    loader = Loader()
+    loader.gate.clear()
+    refresher = asyncio.create_task(loader.load(1))
+    await _wait_in_flight()
+
+    # 刷新期间其他请求立即得到旧值
+    for _ in range(5):
+        assert await loader.load(1) == {"user_id": 1, "call": 0}
+    loader.gate.set()
+    assert await refresher == {"user_id": 1, "call": 1}
+    assert loader.calls == 1
+    assert await loader.load(1) == {"user_id": 1, "call": 1}
+
+
+async def test_stale_value_is_returned_when_refresh_fails(redis):
+    await _seed(age=TTL + 1)
+    loader = Loader()
+    loader.error = RuntimeError("数据库不可用")
+    assert await loader.load(1) == {"user_id": 1, "call": 0}
+
+
+@pytest.mark.parametrize("draw, refreshed", [(0.0, False), (1 - 1e-9, True)])
+async def test_xfetch_refreshes_before_expiry(redis, monkeypatch, draw, refreshed):
+    # 还有5秒过期，上次计算耗时1秒
+    await _seed(age=TTL - 5, duration=1.0)
+    monkeypatch.setattr(cache.random, "random", lambda: draw)
+    loader = Loader()
+
+    result = await loader.load(1)
+    assert loader.calls == int(refreshed)
+    assert result["call"] == int(refreshed)
+
+
+async def test_cancelled_leader_does_not_cancel_waiters(redis):
+    loader = Loader()
+    loader.gate.clear()
+    leader = asyncio.create_task(loader.load(1))
+    await _wait_in_flight()
+    waiters = [asyncio.create_task(loader.load(1)) for _ in range(5)]
+    await asyncio.sleep(0.01)
+
+    # 加载者的客户端断开
+    leader.cancel()
+    await asyncio.gather(leader, return_exceptions=True)
+    loader.gate.set()
+
+    # 等待者中的一个重新加载，其余等待者共享结果
+    results = await asyncio.wait_for(asyncio.gather(*waiters), timeout=1)
+    assert results == [{"user_id": 1, "call": 2}] * 5
+    assert loader.calls == 2
+
+
+async def test_failing_leader_raises_a_regular_exception_in_waiters(redis):
+    loader = Loader()
+    loader.gate.clear()
+    loader.error = RuntimeError("数据库不可用")
+    pending = [asyncio.create_task(loader.load(1)) for _ in range(5)]
+    await _wait_in_flight()
+    loader.gate.set()
+
+    results = await asyncio.gather(*pending, return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert loader.calls == 1
+
+    # 失败不会留下进行中的加载
+    loader.error = None
+    assert await loader.load(1) == {"user_id": 1, "call": 2}
@@ -0,0 +1,50 @@
+"""缓存值编解码测试"""
+
+import json
+
+import pytest
+
+from app.core.codec import ValueCodec, lz4_frame, orjson
+
+
+TASKS = [
+    {"id": i, "title": f"完成项目报告 {i}", "status": "todo", "priority": "high", "tags": ["工作", "季度"]}
+    for i in range(100)
+]
+
+
+def test_legacy_codec_writes_old_format():
+    codec = ValueCodec(codec="legacy", compression="zlib", compression_threshold=0)
+    raw = codec.encode(TASKS)
+
+    # 旧版本按UTF-8文本读取后 json.loads
+    assert not ValueCodec.is_encoded(raw)
+    assert json.loads(raw.decode("utf-8")) == TASKS
+    assert codec.decode(raw) == TASKS
+
+
+def test_marked_values_round_trip_and_compress():
+    codec = ValueCodec(codec="orjson" if orjson else "json", compression="zlib", compression_threshold=1024)
+    raw = codec.encode(TASKS)
+
+    assert ValueCodec.is_encoded(raw)
+    assert len(raw) < len(json.dumps(TASKS, ensure_ascii=False).encode("utf-8"))
+    assert codec.decode(raw) == TASKS
+    # 新格式的读取端也能读取旧格式
+    assert codec.decode(json.dumps(TASKS).encode("utf-8")) == TASKS
+
+
+@pytest.mark.skipif(lz4_frame is None, reason="未安装lz4")
+def test_lz4_round_trip():
+    codec = ValueCodec(codec="json", compression="lz4", compression_threshold=0)
+    assert codec.decode(codec.encode(TASKS)) == TASKS
+
+
+def test_unmarked_plain_values_stay_text():
+    codec = ValueCodec()
+
+    assert codec.decode(b"42") == "42"
+    assert codec.decode("任务".encode("utf-8")) == "任务"
+    assert codec.decode(b"{not json") == "{not json"
+    assert codec.decode(codec.encode({})) == {}
+    assert codec.decode(codec.encode([])) == []
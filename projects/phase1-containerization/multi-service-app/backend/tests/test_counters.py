@@ -0,0 +1,119 @@
+"""计数器测试：对账修复漂移，迁移按现有数据回填"""
+
+import asyncio
+import importlib.util
+from pathlib import Path
+
+import pytest
+from sqlalchemy import delete, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import cache_manager
+from app.core.metrics import metrics
+from app.models import Notification, NotificationType, Task, TaskPriority, TaskStatus, User
+from app.models.counter import UserCounter
+from app.services.counter_service import counter_service
+
+MIGRATION = Path(__file__).resolve().parents[1] / "alembic" / "versions" / "0001_add_user_counters.py"
+
+
+def _task_rows(owner_id: int, count: int) -> list:
+    statuses, priorities = list(TaskStatus), list(TaskPriority)
+    return [
+        {"owner_id": owner_id, "title": f"任务 {i}", "status": statuses[i % len(statuses)],
+         "priority": priorities[i % len(priorities)], "is_starred": i % 3 == 0, "is_archived": i % 5 == 0,
+         "is_deleted": i % 7 == 0}
+        for i in range(count)
+    ]
+
+
+def _notification_rows(user_id: int, count: int) -> list:
+    types = list(NotificationType)
+    return [
+        {"user_id": user_id, "title": f"通知 {i}", "message": "内容", "notification_type": types[i % len(types)],
+         "is_read": i % 2 == 0, "is_deleted": i % 9 == 0}
+        for i in range(count)
+    ]
+
+
+def _nonzero(counters: dict) -> dict:
+    return {name: value for name, value in counters.items() if value}
+
+
+async def _stored(db, user_id: int) -> dict:
+    return _nonzero(await counter_service.get_counters(user_id, db))
+
+
+async def _actual(db, user_id: int) -> dict:
+    return _nonzero(await counter_service.compute_counters(user_id, db))
+
+
+async def test_reconcile_repairs_and_reports_drift(redis, db, create_user):
+    user = await create_user()
+    db.add_all(Task(**row) for row in _task_rows(user.id, 30))
+    db.add_all(Notification(**row) for row in _notification_rows(user.id, 30))
+    await db.commit()
+    expected = await _actual(db, user.id)
+    assert await _stored(db, user.id) == expected
+
+    # 异常写入路径导致的漂移：一项数值错误，一项丢失
+    await db.execute(update(UserCounter).where(
+        UserCounter.user_id == user.id, UserCounter.counter == "total_tasks").values(value=999))
+    await db.execute(delete(UserCounter).where(
+        UserCounter.user_id == user.id, UserCounter.counter == "unread_notifications"))
+    await db.commit()
+    await cache_manager.set_json(f"task_stats:{user.id}", {"v": {}, "t": 0})
+    metrics.reset()
+
+    assert await counter_service.reconcile(db) == 2
+    assert await _stored(db, user.id) == expected
+    assert metrics.get_counter("counter_drift_total") == 2
+    # 修复后丢弃缓存的统计结果
+    assert await cache_manager.get_json(f"task_stats:{user.id}") is None
+
+    assert await counter_service.reconcile(db) == 0
+    assert metrics.get_counter("counter_reconcile_runs_total") == 2
+
+
+async def test_reconciliation_job_repairs_drift(redis, session_factory, db, create_user):
+    user = await create_user()
+    db.add_all(Task(**row) for row in _task_rows(user.id, 10))
+    await db.commit()
+    await db.execute(delete(UserCounter))
+    await db.commit()
+    metrics.reset()
+
+    job = asyncio.create_task(counter_service.run_reconciliation(session_factory, interval=3600))
+    try:
+        while not metrics.get_counter("counter_reconcile_runs_total"):
+            await asyncio.sleep(0.01)
+    finally:
+        job.cancel()
+        await asyncio.gather(job, return_exceptions=True)
+
+    assert await _stored(db, user.id) == await _actual(db, user.id)
+
+
+@pytest.mark.postgres
+async def test_migration_backfills_counters_from_existing_rows(pg_engine):
+    spec = importlib.util.spec_from_file_location("migration_0001", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    async with AsyncSession(pg_engine) as db:
+        await db.execute(insert(User), [
+            {"username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": "x"} for i in range(3)
+        ])
+        user_ids = list((await db.scalars(select(User.id).order_by(User.id))).all())
+        # 核心层的批量写入不经过flush事件，相当于计数器表出现之前就已存在的数据
+        await db.execute(insert(Task), _task_rows(user_ids[0], 40) + _task_rows(user_ids[1], 7))
+        await db.execute(insert(Notification), _notification_rows(user_ids[0], 25))
+        await db.commit()
+        assert await counter_service.get_counters(user_ids[0], db) == {}
+
+        await db.execute(text(migration._backfill_sql("tasks", "owner_id", migration.TASK_COUNTERS)))
+        await db.execute(text(migration._backfill_sql("notifications", "user_id", migration.NOTIFICATION_COUNTERS)))
+        await db.commit()
+
+        for user_id in user_ids:
+            assert await _stored(db, user_id) == await _actual(db, user_id)
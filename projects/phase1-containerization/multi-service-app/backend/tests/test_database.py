@@ -0,0 +1,31 @@
+"""连接池指标测试"""
+
+import pytest
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.database import TimedQueuePool, _average_pool_wait
+from app.core.metrics import metrics
+
+
+async def test_pool_timeouts_are_not_counted_as_checkouts(tmp_path):
+    metrics.reset()
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05
+    )
+    try:
+        async with engine.connect():
+            with pytest.raises(exc.TimeoutError):
+                await engine.connect()
+
+        async with engine.connect():
+            pass
+    finally:
+        await engine.dispose()
+
+    assert metrics.get_counter("db_pool_checkouts_total", outcome="ok") == 2
+    assert metrics.get_counter("db_pool_checkouts_total", outcome="timeout") == 1
+    assert metrics.get_counter("db_pool_wait_seconds_total", outcome="timeout") >= 0.05
+    # 平均等待时间只统计成功获取的连接
+    assert _average_pool_wait() < 0.05
@@ -0,0 +1,86 @@
+"""读写分离路由测试：缓存填充和刚写入数据的用户读主库"""
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.core.cache import cache_manager, filling_cache
+from app.core.database import Base
+from app.core.db_routing import read_replica, replica_set, set_request_user, settings
+from app.core.metrics import metrics
+from app.models import Task
+from app.services import task_service
+
+
+@pytest.fixture
+async def replica():
+    """空的只读副本（尚未同步主库中的数据）"""
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    replica_set.add(engine)
+    try:
+        yield engine
+    finally:
+        set_request_user(None)
+        await replica_set.dispose()
+        replica_set._sticky.clear()
+
+
+@read_replica
+async def _count_tasks(db) -> int:
+    return await db.scalar(select(func.count()).select_from(Task))
+
+
+async def _create_task(db, user) -> None:
+    db.add(Task(owner_id=user.id, title="写报告"))
+    await db.commit()
+
+
+async def test_cache_fills_use_replicas_only_without_lag(redis, replica, db, create_user, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_REPLICA_CACHE_FILL_MAX_LAG", 0.5)
+    user = await create_user()
+    await _create_task(db, user)
+    metrics.reset()
+
+    # 副本已追上主库（SQLite副本的延迟为0）：缓存填充也可以读副本
+    assert await _count_tasks(db) == 0
+    with filling_cache():
+        assert await _count_tasks(db) == 0
+    assert metrics.get_counter("db_replica_routing_total", outcome="cache_fill_replica") == 1
+
+    # 副本有延迟时普通读取仍走副本，缓存填充读主库
+    replica_set.replicas[0].lag = 1.0
+    assert await _count_tasks(db) == 0
+    with filling_cache():
+        assert await _count_tasks(db) == 1
+    assert metrics.get_counter("db_replica_routing_total", outcome="cache_fill") == 1
+
+    # 统计接口的结果会缓存，计算时读主库
+    stats = await task_service.get_task_stats(user, db)
+    assert stats.total_tasks == 1
+
+
+async def test_cache_fills_for_sticky_users_read_from_primary(redis, replica, db, create_user):
+    user = await create_user()
+    set_request_user(user.id)
+    await _create_task(db, user)
+
+    with filling_cache():
+        assert await _count_tasks(db) == 1
+    assert (await task_service.get_task_stats(user, db)).total_tasks == 1
+
+
+async def test_read_your_writes_is_shared_across_processes(redis, replica, db, create_user):
+    user = await create_user()
+    set_request_user(user.id)
+    await _create_task(db, user)
+
+    assert await cache_manager.exists(replica_set.sticky_key(user.id))
+    # 其他进程没有本地粘滞记录，从Redis中的标记得知需要读主库
+    replica_set._sticky.clear()
+    assert await _count_tasks(db) == 1
+
+    await cache_manager.delete(replica_set.sticky_key(user.id))
+    assert await _count_tasks(db) == 0
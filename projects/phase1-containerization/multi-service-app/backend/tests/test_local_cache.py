@@ -0,0 +1,149 @@
+"""本地缓存层测试：条目数和内存上限、淘汰计数，以及跨副本的失效广播"""
+
+import asyncio
+import importlib
+import time
+
+import fakeredis
+import pytest
+
+from app.core.cache import CacheManager, LocalCache, cache_manager
+from app.core.metrics import metrics
+from app.services import task_service
+
+notification_service = importlib.import_module("app.services.notification_service").notification_service
+
+
+def _evictions(reason: str, tier: str = "test") -> int:
+    return metrics.get_counter("cache_evictions_total", tier=tier, reason=reason)
+
+
+def test_item_cap_evicts_the_least_recently_used_entry():
+    metrics.reset()
+    local = LocalCache(max_items=3, max_bytes=1024 * 1024, default_ttl=60, tier="test")
+    for key in ("a", "b", "c"):
+        local.set(key, key)
+    assert local.get("a") == (True, "a")
+
+    local.set("d", "d")
+    assert len(local) == 3
+    assert local.get("b") == (False, None)
+    assert all(local.get(key)[0] for key in ("a", "c", "d"))
+    assert _evictions("capacity") == 1
+
+
+def test_memory_cap_bounds_the_estimated_size():
+    metrics.reset()
+    value = "x" * 1000
+    entry = LocalCache._estimate_size("k0", value)
+    local = LocalCache(max_items=100, max_bytes=entry * 3, default_ttl=60, tier="test")
+    for i in range(5):
+        local.set(f"k{i}", value)
+
+    assert len(local) == 3
+    assert local.size_bytes <= local.max_bytes
+    assert [local.get(f"k{i}")[0] for i in range(5)] == [False, False, True, True, True]
+    assert _evictions("capacity") == 2
+
+    # 单个值超过内存上限时不进入本地层，也不挤掉已有条目
+    local.set("huge", "x" * entry * 3)
+    assert local.get("huge") == (False, None)
+    assert len(local) == 3
+
+    local.clear()
+    assert len(local) == 0 and local.size_bytes == 0
+
+
+def test_entries_expire_after_the_local_ttl():
+    metrics.reset()
+    local = LocalCache(max_items=10, max_bytes=1024 * 1024, default_ttl=60, tier="test")
+    local.set("expired", 1, ttl=0)
+    local.set("capped", 1, ttl=3600)
+
+    assert local.get("expired") == (False, None)
+    assert _evictions("expired") == 1
+    # 本地副本的存活时间不超过 default_ttl
+    assert local._data["capped"][1] <= time.monotonic() + 60
+
+
+async def _start_listener(manager: CacheManager) -> asyncio.Task:
+    return asyncio.create_task(manager._listen())
+
+
+async def _stop_listener(manager: CacheManager, task: asyncio.Task) -> None:
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    if manager._pubsub is not None:
+        await manager._pubsub.aclose()
+        manager._pubsub = None
+
+
+async def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not await condition():
+        assert time.monotonic() < deadline, "等待超时"
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+async def other_replica(redis, monkeypatch):
+    """连接同一Redis的另一个副本，两个副本都在监听失效广播"""
+    if cache_manager._local is None:
+        pytest.skip("本地缓存层未启用")
+    # 不替换全局缓存管理器注册的仪表盘指标
+    monkeypatch.setattr(metrics, "register_gauge", lambda *args, **kwargs: None)
+    other = CacheManager()
+    other._redis = fakeredis.aioredis.FakeRedis(server=redis.connection_pool.connection_kwargs["server"])
+    other._connected = True
+
+    # 监听循环订阅成功后会清空本地层，以此判断两个副本都已订阅
+    managers = (cache_manager, other)
+    for manager in managers:
+        manager._local.set("subscribed_probe", True)
+    tasks = [await _start_listener(manager) for manager in managers]
+
+    async def subscribed():
+        return not any(manager._local.get("subscribed_probe")[0] for manager in managers)
+    await _wait_for(subscribed)
+    try:
+        yield other
+    finally:
+        await _stop_listener(cache_manager, tasks[0])
+        await _stop_listener(other, tasks[1])
+        await other._redis.aclose()
+
+
+async def _cache_in_other(other: CacheManager, key: str) -> None:
+    """在另一个副本中写入并读取，使其本地层持有该键"""
+    # 由本副本写入时广播的失效消息会清除另一个副本刚读取的本地副本，因此由另一个副本自己写入
+    await other.set_json(key, {"total": 1})
+    assert await other.get_json(key) == {"total": 1}
+    assert other._local.get(key)[0]
+
+
+async def test_clearing_task_cache_evicts_other_replicas(other_replica):
+    await _cache_in_other(other_replica, "task_stats:1")
+    await _cache_in_other(other_replica, "task:5")
+    metrics.reset()
+
+    await task_service._clear_task_cache(1, task_ids=[5])
+
+    async def evicted():
+        return not other_replica._local.get("task_stats:1")[0] and not other_replica._local.get("task:5")[0]
+    await _wait_for(evicted)
+    assert _evictions("invalidated", tier="local") == 2
+    assert await other_replica.get_json("task_stats:1") is None
+
+
+async def test_clearing_notification_cache_evicts_other_replicas(other_replica):
+    await _cache_in_other(other_replica, "notification_stats:1")
+    await _cache_in_other(other_replica, "notification_stats:2")
+    await _cache_in_other(other_replica, "notification_stats:3")
+
+    await notification_service._clear_notification_cache(1, 2)
+
+    async def evicted():
+        return not any(other_replica._local.get(f"notification_stats:{user_id}")[0] for user_id in (1, 2))
+    await _wait_for(evicted)
+    # 没有变更的用户不受影响
+    assert other_replica._local.get("notification_stats:3")[0]
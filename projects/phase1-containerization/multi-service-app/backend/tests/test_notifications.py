@@ -0,0 +1,109 @@
+"""通知投递测试：失败的渠道交给投递工作池延迟重试，不在原地等待"""
+
+import asyncio
+import importlib
+import time
+
+import pytest
+from sqlalchemy import select
+
+from app.core.cache import cache_manager
+from app.core.metrics import metrics
+from app.models import Notification, NotificationStatus, NotificationType
+from app.schemas.notification import NotificationCreate
+from app.services.notification_dispatcher import RETRY_KEY, NotificationDispatcher
+
+notification_module = importlib.import_module("app.services.notification_service")
+notification_service = notification_module.notification_service
+
+
+@pytest.fixture
+def flaky_push(monkeypatch):
+    """推送渠道的前 failures 次发送失败"""
+    state = {"failures": 1, "calls": 0}
+
+    async def send(payload):
+        state["calls"] += 1
+        if state["calls"] <= state["failures"]:
+            raise RuntimeError("推送服务不可用")
+    monkeypatch.setattr(notification_service, "_send_push_notification", send)
+    return state
+
+
+async def _create(db, user, count: int) -> list:
+    notifications = [
+        Notification(user_id=user.id, title=f"通知 {i}", message="内容",
+                     notification_type=NotificationType.REMINDER, channels="email,push")
+        for i in range(count)
+    ]
+    db.add_all(notifications)
+    await db.commit()
+    return [notification.id for notification in notifications]
+
+
+async def test_failed_channels_are_scheduled_instead_of_sleeping(redis, db, create_user, flaky_push, monkeypatch):
+    monkeypatch.setattr(notification_module.settings, "NOTIFICATION_RETRY_BASE_DELAY", 60.0)
+    monkeypatch.setattr(notification_module.settings, "NOTIFICATION_RETRY_MAX_DELAY", 60.0)
+    flaky_push["failures"] = 2
+    user = await create_user()
+    ids = await _create(db, user, 3)
+
+    start = time.monotonic()
+    sent, failed, retries = await notification_service.deliver_notifications(ids, db)
+    await db.commit()
+    assert time.monotonic() - start < 1
+
+    assert (sent, failed) == (1, 2)
+    assert len(retries) == 2 and all(0 <= delay <= 60 for delay in retries.values())
+    failures = (await db.execute(select(Notification).where(Notification.id.in_(list(retries))))).scalars().all()
+    for notification in failures:
+        # 邮件已发送成功，重试时只需要发送推送
+        assert notification.status == NotificationStatus.FAILED
+        assert notification.retry_count == 1
+        assert notification.email_sent and not notification.push_sent
+
+    dispatcher = NotificationDispatcher(workers=1, max_queue_size=10, job_ttl=60, retry_poll_interval=1)
+    await dispatcher.schedule_retry({notification_id: 0 for notification_id in retries})
+    assert sorted(int(member) for member in await cache_manager.zrangebyscore(RETRY_KEY, "-inf", "+inf")) \
+        == sorted(retries)
+    # 到期的重试只能被认领一次
+    assert sorted(await dispatcher._claim_due_retries()) == sorted(retries)
+    assert await dispatcher._claim_due_retries() == []
+
+
+async def test_create_notification_does_not_wait_for_retries(redis, db, create_user, flaky_push):
+    user = await create_user()
+    notification = await notification_service.create_notification(
+        NotificationCreate(title="提醒", message="内容", notification_type=NotificationType.REMINDER,
+                           channels=["email", "push"]), user, db
+    )
+
+    assert notification.status == NotificationStatus.FAILED
+    assert await cache_manager.zrangebyscore(RETRY_KEY, "-inf", "+inf") == [str(notification.id)]
+
+
+async def test_dispatcher_redelivers_due_retries(redis, session_factory, create_user, flaky_push):
+    user = await create_user()
+    async with session_factory() as db:
+        ids = await _create(db, user, 5)
+
+    metrics.reset()
+    dispatcher = NotificationDispatcher(workers=1, max_queue_size=10, job_ttl=60, retry_poll_interval=0.05)
+    dispatcher.register_deliver(notification_service.deliver_notifications)
+    dispatcher.start(session_factory)
+    try:
+        async with session_factory() as db:
+            job = await dispatcher.create_job(user.id, accepted=len(ids), queued=len(ids))
+            await dispatcher.dispatch(job["job_id"], ids, db, notification_service.deliver_notifications)
+
+        deadline = time.monotonic() + 5
+        while metrics.get_counter("notification_channel_total", channel="push", outcome="sent") < len(ids):
+            assert time.monotonic() < deadline, "等待重试超时"
+            await asyncio.sleep(0.05)
+    finally:
+        await dispatcher.stop()
+
+    async with session_factory() as db:
+        notifications = (await db.execute(select(Notification).where(Notification.id.in_(ids)))).scalars().all()
+    assert all(notification.status == NotificationStatus.SENT for notification in notifications)
+    assert sorted(notification.retry_count for notification in notifications) == [0, 0, 0, 0, 1]
@@ -0,0 +1,183 @@
+"""分页测试：游标分页的顺序（含空值）以及列表、统计和搜索查询使用的索引"""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import _register_query_events
+from app.core.query_stats import capture_statements
+from app.models import Notification, NotificationType, Task, TaskPriority, User
+from app.schemas.notification import NotificationListParams
+from app.schemas.task import TaskListParams
+from app.services import notification_service, task_service
+from app.utils.pagination import keyset_condition, keyset_order_by, paginate
+
+BASE = datetime(2026, 1, 1)
+
+
+def _due_date(i: int):
+    # 约三分之一没有截止时间，其余有重复值（测试按id决胜）
+    return None if i % 3 == 0 else BASE + timedelta(days=i % 5)
+
+
+def _expected(tasks, descending: bool) -> list:
+    dated = sorted((t for t in tasks if t.due_date is not None), key=lambda t: (t.due_date, t.id))
+    undated = sorted((t for t in tasks if t.due_date is None), key=lambda t: t.id)
+    if descending:
+        # 降序时空值排在最前
+        return [t.id for t in reversed(undated)] + [t.id for t in reversed(dated)]
+    return [t.id for t in dated] + [t.id for t in undated]
+
+
+@pytest.mark.parametrize("descending", [True, False])
+async def test_cursor_pages_follow_the_offset_order(db, create_user, descending):
+    user = await create_user()
+    tasks = [Task(owner_id=user.id, title=f"任务 {i}", due_date=_due_date(i)) for i in range(40)]
+    db.add_all(tasks)
+    await db.commit()
+    query = select(Task).where(Task.owner_id == user.id, Task.is_deleted == False)
+
+    async def page(**kwargs):
+        return await paginate(db, query, column=Task.due_date, id_column=Task.id, sort_key="due_date",
+                              descending=descending, page_size=7, **kwargs)
+
+    first = await page(page=1)
+    by_offset = [task.id for task in first["items"]]
+    for number in range(2, 7):
+        by_offset += [task.id for task in (await page(page=number))["items"]]
+
+    by_cursor, result = [], first
+    while True:
+        by_cursor += [task.id for task in result["items"]]
+        if not result["next_cursor"]:
+            break
+        result = await page(cursor=result["next_cursor"])
+
+    assert by_offset == by_cursor == _expected(tasks, descending)
+
+
+# (列表, 过滤条件, 排序列, 应使用的索引)
+LIST_QUERIES = [
+    (Task, [Task.owner_id == 1], Task.created_at, "idx_tasks_owner_created"),
+    (Task, [Task.owner_id == 1], Task.updated_at, "idx_tasks_owner_updated"),
+    (Task, [Task.owner_id == 1], Task.due_date, "idx_tasks_owner_due_date_active"),
+    (Task, [Task.owner_id == 1], Task.priority, "idx_tasks_owner_priority"),
+    (Notification, [Notification.user_id == 1], Notification.created_at, "idx_notifications_user_created"),
+    (Notification, [Notification.user_id == 1, Notification.is_read == False], Notification.created_at,
+     "idx_notifications_user_unread"),
+]
+
+CURSOR_VALUES = {
+    "created_at": BASE, "updated_at": BASE, "due_date": BASE, "priority": TaskPriority.MEDIUM,
+}
+
+
+def _plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from _plan_nodes(child)
+
+
+async def _seed(engine) -> None:
+    async with AsyncSession(engine) as db:
+        await db.execute(insert(User), [
+            {"username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": "x"}
+            for i in range(1, 21)
+        ])
+        await db.execute(insert(Task), [
+            {"owner_id": i % 20 + 1, "title": f"任务 {i}", "due_date": _due_date(i),
+             "priority": list(TaskPriority)[i % len(TaskPriority)], "is_deleted": i % 10 == 0,
+             "created_at": BASE + timedelta(minutes=i), "updated_at": BASE + timedelta(minutes=i)}
+            for i in range(20000)
+        ])
+        await db.execute(insert(Notification), [
+            {"user_id": i % 20 + 1, "title": f"通知 {i}", "message": "内容",
+             "notification_type": NotificationType.REMINDER, "is_read": i % 2 == 0,
+             "created_at": BASE + timedelta(minutes=i)}
+            for i in range(20000)
+        ])
+        await db.commit()
+    async with engine.connect() as conn:
+        await conn.execute(text("ANALYZE"))
+
+
+@pytest.mark.postgres
+async def test_list_queries_scan_the_matching_index_without_sorting(pg_engine):
+    await _seed(pg_engine)
+
+    async with pg_engine.connect() as conn:
+        # 表较小时规划器可能选择顺序扫描，这里只关心索引的顺序能否满足排序
+        await conn.execute(text("SET enable_seqscan = off"))
+        await conn.execute(text("SET enable_bitmapscan = off"))
+        for model, filters, column, index in LIST_QUERIES:
+            for descending in (True, False):
+                for cursor in (None, CURSOR_VALUES[column.key]):
+                    query = select(model.id).where(model.is_deleted == False, *filters)
+                    if cursor is not None:
+                        query = query.where(keyset_condition(column, model.id, descending, cursor, 100))
+                    query = query.order_by(*keyset_order_by(column, model.id, descending)).limit(21)
+                    sql = str(query.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+
+                    explain = (await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()
+                    plan = (json.loads(explain) if isinstance(explain, str) else explain)[0]["Plan"]
+                    nodes = list(_plan_nodes(plan))
+                    case = f"{column}, descending={descending}, cursor={cursor!r}"
+                    assert any(node.get("Index Name") == index for node in nodes), case
+                    assert not any(node["Node Type"] in ("Sort", "Incremental Sort") for node in nodes), case
+
+
+def _task_lists():
+    for sort_by in ("created_at", "updated_at", "due_date", "priority"):
+        for sort_order in ("desc", "asc"):
+            yield TaskListParams(sort_by=sort_by, sort_order=sort_order)
+    yield TaskListParams(is_starred=True)
+    yield TaskListParams(search="任务 12")
+
+
+def _notification_lists():
+    for sort_order in ("desc", "asc"):
+        yield NotificationListParams(sort_order=sort_order)
+        yield NotificationListParams(sort_order=sort_order, is_read=False)
+    yield NotificationListParams(search="通知 12")
+
+
+async def _service_statements(engine) -> list:
+    """执行各服务方法（列表的首页和下一页、统计、搜索），返回实际发出的SELECT语句及参数"""
+    statements = []
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        user = await db.get(User, 1)
+        with capture_statements() as captured:
+            for params in _task_lists():
+                first = await task_service.get_user_tasks(user, params, db)
+                if first["next_cursor"]:
+                    params.cursor = first["next_cursor"]
+                    await task_service.get_user_tasks(user, params, db)
+            for params in _notification_lists():
+                first = await notification_service.get_user_notifications(user, params, db)
+                if first["next_cursor"]:
+                    params.cursor = first["next_cursor"]
+                    await notification_service.get_user_notifications(user, params, db)
+            await task_service.get_task_stats(user, db)
+            await notification_service.get_notification_stats(user, db)
+        statements += [(sql, parameters) for sql, parameters in captured if sql.lstrip().upper().startswith("SELECT")]
+    return statements
+
+
+@pytest.mark.postgres
+async def test_service_queries_do_not_scan_tables_sequentially(pg_engine):
+    await _seed(pg_engine)
+    _register_query_events(pg_engine)
+    statements = await _service_statements(pg_engine)
+    assert len(statements) > 20
+
+    async with pg_engine.connect() as conn:
+        # 没有可用索引时规划器仍只能顺序扫描，关闭后出现 Seq Scan 即说明缺少索引
+        await conn.exec_driver_sql("SET enable_seqscan = off")
+        for sql, parameters in statements:
+            explain = (await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}", parameters)).scalar()
+            plan = (json.loads(explain) if isinstance(explain, str) else explain)[0]["Plan"]
+            scans = [node["Relation Name"] for node in _plan_nodes(plan) if node["Node Type"] == "Seq Scan"]
+            assert not scans, f"{scans} 顺序扫描: {sql}"
@@ -0,0 +1,85 @@
+"""SQL查询统计测试：请求级语句数和耗时、SQL归一化以及N+1告警"""
+
+import time
+
+import pytest
+from sqlalchemy import select
+
+from app.core import query_stats
+from app.core.metrics import metrics
+from app.core.query_stats import normalize_sql, record_query, track_request
+from app.models import Task
+
+
+@pytest.fixture
+def warnings(monkeypatch):
+    """记录查询统计模块输出的告警"""
+    messages = []
+    monkeypatch.setattr(query_stats.logger, "warning", messages.append)
+    return messages
+
+
+async def test_request_counts_statements_and_time(db, create_user):
+    user = await create_user()
+    start = time.perf_counter()
+    with track_request("GET", "/tasks") as stats:
+        for _ in range(3):
+            await db.execute(select(Task).where(Task.owner_id == user.id))
+    elapsed = time.perf_counter() - start
+
+    assert stats.count == 3
+    assert 0 < stats.duration <= elapsed
+    assert list(stats.statements.values()) == [3]
+    # 请求之外的语句不计入
+    await db.execute(select(Task))
+    assert stats.count == 3
+
+
+def test_slow_statements_are_kept_per_request(monkeypatch, warnings):
+    monkeypatch.setattr(query_stats.settings, "DATABASE_SLOW_QUERY_THRESHOLD", 0.1)
+    metrics.reset()
+    with track_request("GET", "/tasks") as stats:
+        record_query("SELECT * FROM tasks WHERE id = 1", 0.05)
+        record_query("SELECT * FROM tasks WHERE id = 2", 0.3)
+
+    assert stats.slow == [("SELECT * FROM tasks WHERE id = ?", 0.3)]
+    assert metrics.get_counter("db_slow_queries_total") == 1
+    # 请求中的慢查询随请求日志输出，不单独告警
+    assert warnings == []
+
+
+@pytest.mark.parametrize("statement, normalized", [
+    ("SELECT * FROM tasks WHERE id = 42 AND progress > -1.5", "SELECT * FROM tasks WHERE id = ? AND progress > ?"),
+    ("SELECT * FROM users WHERE name = 'O''Brien' AND email = 'a@b.c'",
+     "SELECT * FROM users WHERE name = ? AND email = ?"),
+    ("SELECT * FROM tasks WHERE id = $1 AND owner_id = %(owner_id_1)s AND title = :title OR x = %s OR y = ?",
+     "SELECT * FROM tasks WHERE id = ? AND owner_id = ? AND title = ? OR x = ? OR y = ?"),
+    ("SELECT * FROM tasks WHERE id IN ($1, $2, $3)", "SELECT * FROM tasks WHERE id IN (?)"),
+    ("SELECT * FROM tasks WHERE id IN (1,2)", "SELECT * FROM tasks WHERE id IN (?)"),
+    ("SELECT status::text FROM tasks2\n   WHERE  id = 7", "SELECT status::text FROM tasks2 WHERE id = ?"),
+])
+def test_normalize_sql(statement, normalized):
+    assert normalize_sql(statement) == normalized
+
+
+def test_in_lists_of_any_length_normalize_to_the_same_statement():
+    statements = {normalize_sql(f"SELECT * FROM tasks WHERE id IN ({', '.join(['?'] * n)})") for n in (1, 2, 50)}
+    assert statements == {"SELECT * FROM tasks WHERE id IN (?)"}
+
+
+@pytest.mark.parametrize("executions, warned", [(5, False), (6, True)])
+def test_n_plus_one_warning_fires_above_the_threshold(monkeypatch, warnings, executions, warned):
+    monkeypatch.setattr(query_stats.settings, "DATABASE_N_PLUS_ONE_THRESHOLD", 5)
+    metrics.reset()
+    with track_request("GET", "/tasks"):
+        for task_id in range(executions):
+            record_query(f"SELECT * FROM task_activities WHERE task_id = {task_id}", 0.001)
+        # 不同的语句分别计数
+        for _ in range(executions - 1):
+            record_query("SELECT * FROM users WHERE id = 1", 0.001)
+
+    assert metrics.get_counter("db_n_plus_one_total") == int(warned)
+    assert len(warnings) == int(warned)
+    if warned:
+        assert "GET /tasks" in warnings[0] and f"{executions} 次" in warnings[0]
+        assert "task_activities WHERE task_id = ?" in warnings[0]
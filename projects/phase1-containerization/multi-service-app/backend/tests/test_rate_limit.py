@@ -0,0 +1,62 @@
+"""速率限制测试"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Response
+from starlette.requests import Request
+
+from app.core.dependencies import RateLimit
+
+
+def _request(path: str = "/api/v1/auth/login") -> Request:
+    return Request({"type": "http", "method": "POST", "path": path, "headers": [], "query_string": b""})
+
+
+async def _fire(limiters, calls: int):
+    """并发调用限流依赖，返回（允许次数, 拒绝的异常列表）"""
+    async def call(index: int):
+        limiter = limiters[index % len(limiters)]
+        return await limiter(_request(), Response(), client_ip="10.0.0.1")
+
+    results = await asyncio.gather(*(call(i) for i in range(calls)), return_exceptions=True)
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert all(r is True or isinstance(r, HTTPException) for r in results)
+    return sum(1 for r in results if r is True), rejected
+
+
+@pytest.mark.parametrize("replicas", [1, 3])
+async def test_concurrent_calls_allow_exactly_limit(redis, replicas):
+    # 多个实例模拟多个副本共享同一个Redis
+    limiters = [RateLimit(requests=50, window=60) for _ in range(replicas)]
+
+    allowed, rejected = await _fire(limiters, 1000)
+
+    assert allowed == 50
+    assert len(rejected) == 950
+    for error in rejected:
+        assert error.status_code == 429
+        assert int(error.headers["Retry-After"]) >= 1
+
+
+async def test_rejected_client_is_blocked_locally(redis):
+    limiter = RateLimit(requests=5, window=60)
+    await _fire([limiter], 5)
+
+    with pytest.raises(HTTPException):
+        await limiter(_request(), Response(), client_ip="10.0.0.1")
+
+    # 等待期内由本地记录直接拒绝，不再访问Redis
+    await redis.delete("rate_limit:10.0.0.1:/api/v1/auth/login")
+    with pytest.raises(HTTPException) as second:
+        await limiter(_request(), Response(), client_ip="10.0.0.1")
+    assert second.value.status_code == 429
+
+    # 其他客户端不受影响
+    assert await limiter(_request(), Response(), client_ip="10.0.0.2") is True
+
+
+async def test_limiter_fails_open_without_redis():
+    limiter = RateLimit(requests=1, window=60)
+    allowed, rejected = await _fire([limiter], 10)
+    assert allowed == 10 and not rejected
@@ -0,0 +1,58 @@
+"""令牌吊销列表测试"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.core.cache import cache_manager
+from app.core.revocation import TokenRevocationList
+
+
+@pytest.fixture
+async def listener(redis):
+    """启动缓存管理器的 pub/sub 监听循环"""
+    task = asyncio.create_task(cache_manager._listen())
+    try:
+        yield task
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        if cache_manager._pubsub is not None:
+            await cache_manager._pubsub.aclose()
+            cache_manager._pubsub = None
+
+
+async def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        await asyncio.sleep(0.05)
+
+
+async def test_revocations_missed_while_disconnected_are_loaded_on_reconnect(listener, monkeypatch):
+    revocations = TokenRevocationList()
+    other_process = TokenRevocationList()
+    await revocations.start()
+    try:
+        await _wait_for(lambda: cache_manager._pubsub is not None)
+        assert revocations.check_key("before") is None
+
+        # 模拟 pub/sub 连接断开：断线期间其他进程广播的吊销消息会丢失
+        pubsub = cache_manager._pubsub
+
+        async def broken(**kwargs):
+            raise ConnectionError("连接已断开")
+        monkeypatch.setattr(pubsub, "get_message", broken)
+        await _wait_for(lambda: cache_manager._pubsub is not pubsub)
+        await other_process.revoke("missed", time.time() + 3600)
+
+        # 重连后由钩子重建过滤器
+        await _wait_for(lambda: cache_manager._pubsub is not None and revocations.check_key("missed") is not None)
+        assert revocations.check_key("before") is None
+
+        # 恢复订阅后的广播照常接收
+        await other_process.revoke("after", time.time() + 3600)
+        await _wait_for(lambda: revocations.check_key("after") is not None)
+    finally:
+        await revocations.stop()
@@ -0,0 +1,70 @@
+"""搜索测试：两种后端的匹配语义（ILIKE 子串匹配）和相关度一致"""
+
+import pytest
+from sqlalchemy import select
+
+from app.core import search
+from app.models import Task
+
+
+TASKS = [
+    {"title": "完成项目报告", "description": None, "notes": None},
+    {"title": "Quarterly REPORT", "description": "整理季度数据", "notes": None},
+    {"title": "周会", "description": "准备项目报告的提纲", "notes": "100% 完成"},
+    {"title": "买菜", "description": None, "notes": "报表"},
+]
+
+
+@pytest.fixture(params=["postgres", "memory"])
+def backend(request, monkeypatch):
+    backend = (search.PostgresSearchBackend() if request.param == "postgres"
+               else search.TrigramIndexSearchBackend())
+    monkeypatch.setattr(search, "search_backend", backend)
+    return backend
+
+
+@pytest.fixture
+async def tasks(backend, db, create_user):
+    user = await create_user()
+    rows = [Task(owner_id=user.id, **fields) for fields in TASKS]
+    db.add_all(rows)
+    await db.commit()
+    return rows
+
+
+async def _search(db, backend, term):
+    query = (select(Task.title, backend.rank(Task, term).label("rank"))
+             .where(backend.condition(Task, term))
+             .order_by(backend.rank(Task, term).desc(), Task.id))
+    return [(title, round(rank, 2)) for title, rank in (await db.execute(query)).all()]
+
+
+@pytest.mark.parametrize("term, expected", [
+    # 中文按子串匹配（'simple' tsvector 会把"完成项目报告"当作一个词）
+    ("报告", [("完成项目报告", 1.0), ("周会", 0.4)]),
+    ("项目报告", [("完成项目报告", 1.0), ("周会", 0.4)]),
+    # 不区分大小写，英文也按子串匹配
+    ("report", [("Quarterly REPORT", 1.0)]),
+    ("uarter", [("Quarterly REPORT", 1.0)]),
+    # % 和 _ 按字面匹配
+    ("100%", [("周会", 0.2)]),
+    ("_", []),
+    ("报", [("完成项目报告", 1.0), ("周会", 0.4), ("买菜", 0.2)]),
+])
+async def test_substring_match_and_rank(backend, tasks, db, term, expected):
+    assert await _search(db, backend, term) == expected
+
+
+async def test_memory_index_follows_updates_and_deletes(tasks, db):
+    backend = search.TrigramIndexSearchBackend()
+    for task in tasks:
+        backend.on_persisted(Task, task)
+
+    tasks[0].title = "完成年度总结"
+    backend.on_persisted(Task, tasks[0])
+    assert set(backend.search(Task, "项目报告")) == {tasks[2].id}
+
+    tasks[2].is_deleted = True
+    backend.on_persisted(Task, tasks[2])
+    assert backend.search(Task, "项目报告") == {}
+    assert set(backend.search(Task, "年度")) == {tasks[0].id}
@@ -0,0 +1,72 @@
+"""会话吊销测试：语句数不随会话数量增长"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app.core.cache import cache_manager, session_manager
+from app.core.query_stats import track_request
+from app.models.user import UserSession
+from app.services import auth_service
+from app.services.session_service import session_service
+
+
+async def _seed_sessions(db, user, count: int) -> None:
+    now = datetime.utcnow()
+    db.add_all(
+        UserSession(
+            session_id=f"session_{user.id}_{i}",
+            user_id=user.id,
+            expires_at=now + timedelta(days=1),
+            is_active=True,
+        )
+        for i in range(count)
+    )
+    await db.commit()
+
+
+async def _active_sessions(db, user_id: int) -> int:
+    return await db.scalar(
+        select(func.count()).select_from(UserSession).where(
+            UserSession.user_id == user_id, UserSession.is_active == True
+        )
+    )
+
+
+@pytest.mark.parametrize("count", [1, 20, 200])
+async def test_revoke_user_sessions_issues_one_statement(db, create_user, count):
+    alice = await create_user("alice")
+    bob = await create_user("bob")
+    carol = await create_user("carol")
+    for user in (alice, bob, carol):
+        await _seed_sessions(db, user, count)
+
+    with track_request("POST", "/admin/sessions/revoke") as stats:
+        revoked = await session_service.revoke_user_sessions([alice.id, bob.id, alice.id], db)
+    await db.commit()
+
+    # 一条UPDATE禁用所有用户的会话
+    assert stats.count == 1
+    assert revoked == count * 2
+    assert await _active_sessions(db, alice.id) == 0
+    assert await _active_sessions(db, bob.id) == 0
+    assert await _active_sessions(db, carol.id) == count
+
+
+@pytest.mark.parametrize("count", [1, 20, 200])
+async def test_logout_statement_count_is_constant(redis, db, create_user, count):
+    user = await create_user()
+    await _seed_sessions(db, user, count)
+    # 还有一个保存在Redis中、尚未写回数据库的会话
+    buffered = await session_service.create_session(user.id, db)
+    token = auth_service.create_access_token({"sub": str(user.id), "username": user.username})
+
+    with track_request("POST", "/auth/logout") as stats:
+        assert await auth_service.logout_user(token, db)
+
+    # 读取用户 + 禁用会话的UPDATE
+    assert stats.count == 2
+    assert await _active_sessions(db, user.id) == 0
+    cached = await cache_manager.get(f"{session_manager.prefix}{buffered['session_id']}")
+    assert cached["is_active"] is False
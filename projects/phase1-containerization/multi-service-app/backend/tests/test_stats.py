@@ -0,0 +1,101 @@
+"""统计接口测试：语句数不随任务/通知数量增长"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.query_stats import track_request
+from app.models import Notification, NotificationType, Task, TaskPriority, TaskStatus
+from app.services import notification_service, task_service
+from benchmarks.bench_stats import legacy_notification_stats, legacy_task_stats, measure
+
+STATUSES = list(TaskStatus)
+PRIORITIES = list(TaskPriority)
+
+
+async def _seed(db, user, count: int) -> None:
+    now = datetime.utcnow()
+    db.add_all(
+        Task(
+            owner_id=user.id,
+            title=f"任务 {i}",
+            status=STATUSES[i % len(STATUSES)],
+            priority=PRIORITIES[i % len(PRIORITIES)],
+            is_starred=i % 3 == 0,
+            due_date=now + timedelta(hours=12) if i % 4 == 0 else now - timedelta(days=1) if i % 4 == 1 else None,
+        )
+        for i in range(count)
+    )
+    db.add_all(
+        Notification(
+            user_id=user.id,
+            title=f"通知 {i}",
+            message="内容",
+            notification_type=NotificationType.REMINDER,
+            is_read=i % 2 == 0,
+        )
+        for i in range(count)
+    )
+    await db.commit()
+
+
+async def _measure(call):
+    with track_request("GET", "/stats") as stats:
+        result = await call()
+    return result, stats.count
+
+
+@pytest.mark.parametrize("count", [3, 60, 300])
+async def test_stats_statement_count_is_constant(db, create_user, count):
+    user = await create_user()
+    await _seed(db, user, count)
+
+    task_stats, task_queries = await _measure(lambda: task_service.get_task_stats(user, db))
+    notification_stats, notification_queries = await _measure(
+        lambda: notification_service.get_notification_stats(user, db)
+    )
+
+    # 任务统计：读取计数器 + 一条按时间计算过期/即将到期的聚合查询；通知统计：只读取计数器
+    assert task_queries == 2
+    assert notification_queries == 1
+
+    assert task_stats.total_tasks == count
+    assert task_stats.pending_tasks == len(range(0, count, len(STATUSES)))
+    assert task_stats.starred_tasks == len(range(0, count, 3))
+    closed = (TaskStatus.COMPLETED, TaskStatus.CANCELLED, TaskStatus.ARCHIVED)
+    assert task_stats.overdue_tasks == sum(
+        1 for i in range(count) if i % 4 == 1 and STATUSES[i % len(STATUSES)] not in closed
+    )
+    assert task_stats.due_soon_tasks == sum(
+        1 for i in range(count) if i % 4 == 0 and STATUSES[i % len(STATUSES)] not in closed
+    )
+    assert notification_stats.total_notifications == count
+    assert notification_stats.unread_notifications == count // 2
+    assert notification_stats.read_notifications == count - count // 2
+
+
+async def test_stats_compared_with_per_count_queries(db, create_user, record_property):
+    user = await create_user()
+    await _seed(db, user, 300)
+
+    # 改造前每个状态/优先级一条COUNT；统计方法本身（不经过缓存）与之对比
+    task_stats = task_service.get_task_stats.__wrapped__
+    notification_stats = notification_service.get_notification_stats.__wrapped__
+    cases = {
+        "task": (lambda: legacy_task_stats(db, user.id), lambda: task_stats(task_service, user, db), 14, 2),
+        "notification": (lambda: legacy_notification_stats(db, user.id),
+                         lambda: notification_stats(notification_service, user, db), 16, 1),
+    }
+    for name, (legacy, current, legacy_count, current_count) in cases.items():
+        (legacy_seconds, legacy_queries), (current_seconds, current_queries) = \
+            await measure(legacy), await measure(current)
+        record_property(f"{name}_stats_ms", {"legacy": round(legacy_seconds * 1000, 2),
+                                             "current": round(current_seconds * 1000, 2)})
+
+        assert (legacy_queries, current_queries) == (legacy_count, current_count)
+        assert current_seconds < legacy_seconds
+
+        expected = await legacy()
+        result = (await current()).model_dump()
+        assert {key: result[key] for key in expected if key in result} == \
+            {key: value for key, value in expected.items() if key in result}
@@ -0,0 +1,57 @@
+"""批量任务操作测试（SQLite：ID列表以 expanding IN 参数绑定）"""
+
+import pytest
+from sqlalchemy import func, select
+
+from app.core.query_stats import track_request
+from app.models import Task, TaskStatus
+from app.schemas.task import TaskBatchDelete, TaskBatchUpdate, TaskStats
+from app.services import task_service
+
+
+async def _create_tasks(db, user, count: int):
+    tasks = [Task(owner_id=user.id, title=f"任务 {i}") for i in range(count)]
+    db.add_all(tasks)
+    await db.commit()
+    return [task.id for task in tasks]
+
+
+@pytest.mark.parametrize("count", [5, 100])
+async def test_batch_update_uses_constant_statements(db, create_user, count):
+    user = await create_user()
+    other = await create_user("bob")
+    ids = await _create_tasks(db, user, count)
+    foreign_ids = await _create_tasks(db, other, 2)
+
+    with track_request("PUT", "/tasks/batch") as stats:
+        result = await task_service.batch_update_tasks(
+            TaskBatchUpdate(task_ids=ids + foreign_ids + [10 ** 6], status=TaskStatus.COMPLETED, is_starred=True),
+            user, db
+        )
+
+    assert result["updated_count"] == count
+    # 锁定读取 + UPDATE + 批量活动记录 + 计数器增量（与任务数量无关）
+    assert stats.count == 4
+    completed = await db.scalar(
+        select(func.count()).where(Task.owner_id == user.id, Task.status == TaskStatus.COMPLETED)
+    )
+    assert completed == count
+    # 其他用户的任务不受影响
+    assert await db.scalar(select(func.count()).where(Task.id.in_(foreign_ids), Task.is_starred)) == 0
+
+    stats = await task_service.get_task_stats(user, db)
+    assert isinstance(stats, TaskStats)
+    assert stats.completed_tasks == count and stats.starred_tasks == count
+
+
+@pytest.mark.parametrize("permanent", [False, True])
+async def test_batch_delete(db, create_user, permanent):
+    user = await create_user()
+    ids = await _create_tasks(db, user, 20)
+
+    result = await task_service.batch_delete_tasks(TaskBatchDelete(task_ids=ids[:15], permanent=permanent), user, db)
+
+    assert result["deleted_count"] == 15
+    remaining = await db.scalar(select(func.count()).where(Task.owner_id == user.id, Task.is_deleted == False))  # noqa: E712
+    assert remaining == 5
+    assert (await task_service.get_task_stats(user, db)).total_tasks == 5
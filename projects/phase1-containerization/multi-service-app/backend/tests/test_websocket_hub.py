@@ -0,0 +1,155 @@
+"""WebSocket连接中心测试：空闲连接的内存占用、吊销后关闭连接以及频道订阅的串行化"""
+
+import asyncio
+import time
+import tracemalloc
+
+import pytest
+from fastapi import WebSocketDisconnect, status
+
+from app.core.cache import cache_manager
+from app.core.revocation import token_revocation
+from app.core.websocket_hub import WebSocketHub, settings
+
+# 每个空闲连接（连接对象、发送队列和三个任务）允许占用的内存
+CONNECTION_BUDGET = 16 * 1024
+
+
+class FakeWebSocket:
+    """不发送任何消息的客户端，disconnect 事件触发后断开"""
+
+    def __init__(self, disconnect: asyncio.Event):
+        self.disconnect = disconnect
+        self.sent = []
+        self.close_code = None
+
+    async def accept(self):
+        pass
+
+    async def receive_text(self) -> str:
+        await self.disconnect.wait()
+        raise WebSocketDisconnect()
+
+    async def send_text(self, message: str):
+        self.sent.append(message)
+
+    async def close(self, code: int = status.WS_1000_NORMAL_CLOSURE):
+        self.close_code = code
+
+
+@pytest.fixture
+async def hub(redis):
+    hub = WebSocketHub()
+    await hub.start()
+    try:
+        yield hub
+    finally:
+        await hub.stop()
+
+
+async def _wait_for(condition, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        await asyncio.sleep(0.01)
+
+
+def _user_channels() -> list:
+    return [channel for channel in cache_manager._subscriptions
+            if channel.startswith(settings.WEBSOCKET_CHANNEL_PREFIX)]
+
+
+async def test_idle_connections_stay_within_memory_budget(hub, monkeypatch):
+    count = 10_000
+    monkeypatch.setattr(settings, "WEBSOCKET_MAX_CONNECTIONS", count)
+    disconnect = asyncio.Event()
+    sockets = [FakeWebSocket(disconnect) for _ in range(count)]
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tasks = [asyncio.create_task(hub.serve(websocket, user_id)) for user_id, websocket in enumerate(sockets, 1)]
+        await _wait_for(lambda: hub.connection_count == count)
+        await asyncio.sleep(0.1)
+        per_connection = (tracemalloc.get_traced_memory()[0] - before) / count
+    finally:
+        tracemalloc.stop()
+    assert per_connection <= CONNECTION_BUDGET, f"每个连接占用 {per_connection:.0f} 字节"
+    assert len(_user_channels()) == count
+
+    disconnect.set()
+    await asyncio.gather(*tasks)
+    assert hub.connection_count == 0
+    assert _user_channels() == []
+    assert not hub._subscription_locks
+
+
+async def test_revoked_token_closes_its_connections(hub):
+    disconnect = asyncio.Event()
+    revoked, other = FakeWebSocket(disconnect), FakeWebSocket(disconnect)
+    tasks = [asyncio.create_task(hub.serve(revoked, 1, "jti-revoked")),
+             asyncio.create_task(hub.serve(other, 1, "jti-other"))]
+    await _wait_for(lambda: hub.connection_count == 2)
+
+    await token_revocation.revoke("jti-revoked", time.time() + 3600)
+    await tasks[0]
+    assert revoked.close_code == status.WS_1008_POLICY_VIOLATION
+    assert hub.connection_count == 1 and other.close_code is None
+
+    disconnect.set()
+    await tasks[1]
+
+
+async def test_revoked_users_are_disconnected_in_every_process(hub):
+    disconnect = asyncio.Event()
+    sockets = {user_id: FakeWebSocket(disconnect) for user_id in (1, 2, 3)}
+    tasks = {user_id: asyncio.create_task(hub.serve(websocket, user_id)) for user_id, websocket in sockets.items()}
+    await _wait_for(lambda: hub.connection_count == 3)
+
+    # 本进程禁用会话
+    await hub.revoke_users([1])
+    await tasks[1]
+    # 其他进程的广播
+    hub._handle_users_revoked("2")
+    await tasks[2]
+
+    assert sockets[1].close_code == sockets[2].close_code == status.WS_1008_POLICY_VIOLATION
+    assert sockets[3].close_code is None and hub.connection_count == 1
+    disconnect.set()
+    await tasks[3]
+
+
+async def test_reconnect_during_unsubscribe_keeps_the_subscription(hub, monkeypatch):
+    subscribe, unsubscribe = cache_manager.subscribe, cache_manager.unsubscribe
+
+    # Redis往返较慢时，取消订阅可能晚于随后的重新订阅完成
+    async def slow_subscribe(channel, handler):
+        await asyncio.sleep(0.02)
+        await subscribe(channel, handler)
+
+    async def slow_unsubscribe(channel):
+        await asyncio.sleep(0.05)
+        await unsubscribe(channel)
+    monkeypatch.setattr(cache_manager, "subscribe", slow_subscribe)
+    monkeypatch.setattr(cache_manager, "unsubscribe", slow_unsubscribe)
+
+    first_disconnect, second_disconnect = asyncio.Event(), asyncio.Event()
+    first = asyncio.create_task(hub.serve(FakeWebSocket(first_disconnect), 1))
+    await _wait_for(lambda: hub.channel(1) in cache_manager._subscriptions)
+
+    first_disconnect.set()
+    await _wait_for(lambda: hub.connection_count == 0)
+    second_websocket = FakeWebSocket(second_disconnect)
+    second = asyncio.create_task(hub.serve(second_websocket, 1))
+    await first
+    await _wait_for(lambda: not hub._subscription_locks)
+
+    assert hub.connection_count == 1
+    assert hub.channel(1) in cache_manager._subscriptions and 1 in hub._subscribed
+    # 频道消息投递给新连接
+    cache_manager._subscriptions[hub.channel(1)]('{"type": "notification"}')
+    await _wait_for(lambda: second_websocket.sent)
+
+    second_disconnect.set()
+    await second
+    assert hub.channel(1) not in cache_manager._subscriptions
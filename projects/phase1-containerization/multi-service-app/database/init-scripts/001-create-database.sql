@@ -192,8 +192,14 @@ CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_is_deleted ON tasks(is_deleted
 CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_owner_status ON tasks(owner_id, status);
 CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_owner_due_date ON tasks(owner_id, due_date);
 
--- 全文搜索索引
-CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_search ON tasks USING gin(to_tsvector('simple', title || ' ' || COALESCE(description, '')));
+-- 列表查询的部分索引（与 keyset 分页的排序一致）
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_owner_created ON tasks(owner_id, created_at, id) WHERE is_deleted = false;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_owner_updated ON tasks(owner_id, updated_at, id) WHERE is_deleted = false;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_owner_due_date_active ON tasks(owner_id, due_date, id) WHERE is_deleted = false;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_owner_priority ON tasks(owner_id, priority, id) WHERE is_deleted = false;
+
+-- 搜索索引（ILIKE 子串匹配，pg_trgm 三元组）
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tasks_search_trgm ON tasks USING gin(title gin_trgm_ops, description gin_trgm_ops, notes gin_trgm_ops);
 
 -- 通知表索引
 CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_user_id ON notifications(user_id);
@@ -201,6 +207,9 @@ CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_type ON notifications(
 CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_status ON notifications(status);
 CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_created_at ON notifications(created_at);
 CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_is_read ON notifications(is_read);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_user_created ON notifications(user_id, created_at, id) WHERE is_deleted = false;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_user_unread ON notifications(user_id, created_at, id) WHERE is_deleted = false AND is_read = false;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_search_trgm ON notifications USING gin(title gin_trgm_ops, message gin_trgm_ops);
 */
 
 -- 创建视图